@@ -0,0 +1,251 @@
+"""
+Engine admission control – global concurrency budget for Stockfish work.
+
+Every request that runs the engine (anonymous landing-page analysis,
+logged-in `/api/analysis/run`) takes a ticket before starting Stockfish and
+releases it when done. At most `engine_max_concurrency` tickets are active
+per process; the rest wait in a queue ordered by:
+
+    1. priority class  – paid < logged-in < anonymous
+    2. fairness        – round-robin between clients (IP / user id): a
+                         client's n-th outstanding request waits behind
+                         every other client's first
+    3. arrival order
+
+Anonymous requests are shed up-front (429) when the anonymous queue is full
+or a single IP already holds too many tickets. Logged-in users are never shed,
+only queued.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import ipaddress
+import itertools
+from collections import Counter
+from functools import lru_cache
+from typing import AsyncIterator
+
+from app.config import get_settings
+
+PRIORITY_PAID = 0
+PRIORITY_USER = 1
+PRIORITY_ANONYMOUS = 2
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of queued."""
+
+    def __init__(self, message: str, retry_after: int = 30):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class EngineTicket:
+    """A queued or running claim on one unit of engine concurrency."""
+
+    def __init__(self, controller: EngineAdmission, priority: int, client_key: str, seq: int):
+        self.controller = controller
+        self.priority = priority
+        self.client_key = client_key
+        self.seq = seq
+        self.admitted = False
+        self.released = False
+        self._changed = asyncio.Event()
+
+    async def wait(self, heartbeat: float = 15.0) -> AsyncIterator[int]:
+        """
+        Wait for admission, yielding the 1-based queue position whenever it
+        changes (and at least every `heartbeat` seconds, so SSE streams stay
+        alive). Returns once the ticket is admitted (or released).
+        """
+        last_position = None
+        while not self.admitted and not self.released:
+            position = self.controller.position(self)
+            if position != last_position:
+                last_position = position
+                yield position
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                last_position = None
+
+    def release(self) -> None:
+        """Give the slot back (or leave the queue). Safe to call twice."""
+        self.controller.release(self)
+
+    def _notify(self) -> None:
+        self._changed.set()
+
+
+class EngineAdmission:
+    """
+    In-process admission controller. Not shared between worker processes;
+    size `engine_max_concurrency` per process accordingly.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        anonymous_queue_limit: int,
+        anonymous_per_client_limit: int,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.anonymous_queue_limit = anonymous_queue_limit
+        self.anonymous_per_client_limit = anonymous_per_client_limit
+        self._seq = itertools.count()
+        self._waiting: list[EngineTicket] = []
+        self._active: set[EngineTicket] = set()
+        self._active_per_client: Counter[str] = Counter()
+        self._waiting_per_client: Counter[str] = Counter()
+        self._waiting_anonymous = 0
+        self._turns: dict[EngineTicket, int] = {}
+
+    # ── Introspection ──
+
+    @property
+    def active_count(self) -> int:
+        return len(self._active)
+
+    @property
+    def waiting_count(self) -> int:
+        return len(self._waiting)
+
+    def _sort_key(self, ticket: EngineTicket) -> tuple[int, int, int]:
+        # turn = the client's active tickets + its own tickets queued ahead of this one
+        turn = self._active_per_client[ticket.client_key] + self._turns[ticket]
+        return (ticket.priority, turn, ticket.seq)
+
+    def _remove_waiting(self, ticket: EngineTicket) -> None:
+        """Take `ticket` off the queue; the client's later tickets move up one turn."""
+        self._waiting.remove(ticket)
+        del self._turns[ticket]
+        for t in self._waiting:
+            if t.client_key == ticket.client_key and t.seq > ticket.seq:
+                self._turns[t] -= 1
+        self._waiting_per_client[ticket.client_key] -= 1
+        if self._waiting_per_client[ticket.client_key] <= 0:
+            del self._waiting_per_client[ticket.client_key]
+        if ticket.priority >= PRIORITY_ANONYMOUS:
+            self._waiting_anonymous -= 1
+
+    def position(self, ticket: EngineTicket) -> int:
+        """1-based position in the queue (0 once admitted)."""
+        if ticket.admitted:
+            return 0
+        key = self._sort_key(ticket)
+        return 1 + sum(1 for t in self._waiting if self._sort_key(t) < key)
+
+    # ── Queueing ──
+
+    def check(self, priority: int, client_key: str) -> None:
+        """
+        Raise AdmissionRejected if a request would be shed right now. Routes
+        call this before opening an SSE stream so overload is a real 429.
+        """
+        if priority >= PRIORITY_ANONYMOUS:
+            held = self._active_per_client[client_key] + self._waiting_per_client[client_key]
+            if held >= self.anonymous_per_client_limit:
+                raise AdmissionRejected(
+                    "Too many analyses in progress from this address. "
+                    "Wait for them to finish or sign in.",
+                    retry_after=60,
+                )
+            if self._waiting_anonymous >= self.anonymous_queue_limit:
+                raise AdmissionRejected(
+                    "The analysis queue is full. Please try again shortly, or sign in "
+                    "for priority access.",
+                )
+
+    def enqueue(self, priority: int, client_key: str) -> EngineTicket:
+        """
+        Create a ticket for `client_key` and admit it immediately if there is
+        spare capacity. Raises AdmissionRejected for excess anonymous load.
+        """
+        self.check(priority, client_key)
+        ticket = EngineTicket(self, priority, client_key, next(self._seq))
+        self._waiting.append(ticket)
+        self._turns[ticket] = self._waiting_per_client[client_key]
+        self._waiting_per_client[client_key] += 1
+        if priority >= PRIORITY_ANONYMOUS:
+            self._waiting_anonymous += 1
+        self._dispatch()
+        return ticket
+
+    def release(self, ticket: EngineTicket) -> None:
+        if ticket.released:
+            return
+        ticket.released = True
+        if ticket in self._active:
+            self._active.discard(ticket)
+            self._active_per_client[ticket.client_key] -= 1
+            if self._active_per_client[ticket.client_key] <= 0:
+                del self._active_per_client[ticket.client_key]
+        elif ticket in self._turns:
+            self._remove_waiting(ticket)
+            ticket._notify()
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Admit waiters while there is capacity, then wake everyone still queued."""
+        while self._waiting and len(self._active) < self.max_concurrency:
+            ticket = min(self._waiting, key=self._sort_key)
+            self._remove_waiting(ticket)
+            ticket.admitted = True
+            self._active.add(ticket)
+            self._active_per_client[ticket.client_key] += 1
+            ticket._notify()
+        for ticket in self._waiting:
+            ticket._notify()
+
+
+@lru_cache()
+def get_engine_admission() -> EngineAdmission:
+    settings = get_settings()
+    return EngineAdmission(
+        max_concurrency=settings.engine_max_concurrency,
+        anonymous_queue_limit=settings.anonymous_queue_limit,
+        anonymous_per_client_limit=settings.anonymous_per_client_limit,
+    )
+
+
+def user_priority(user) -> int:
+    """Priority class for an authenticated user."""
+    return PRIORITY_PAID if getattr(user, "subscription_tier", None) == "pro" else PRIORITY_USER
+
+
+@lru_cache()
+def _trusted_proxies() -> tuple:
+    return tuple(
+        ipaddress.ip_network(net.strip(), strict=False)
+        for net in get_settings().trusted_proxies.split(",") if net.strip()
+    )
+
+
+def _is_trusted_proxy(host: str) -> bool:
+    try:
+        addr = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(addr in net for net in _trusted_proxies())
+
+
+def client_ip(request) -> str:
+    """
+    Client address for per-client limits. Forwarding headers are only
+    believed when the peer is a trusted proxy, and then only the parts the
+    proxy itself wrote: X-Real-IP (nginx sets it to $remote_addr), else the
+    rightmost X-Forwarded-For hop – earlier hops are whatever the client sent.
+    """
+    peer = request.client.host if request.client else "unknown"
+    if not _is_trusted_proxy(peer):
+        return peer
+    real_ip = request.headers.get("x-real-ip", "").strip()
+    if real_ip:
+        return real_ip
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded:
+        return forwarded.split(",")[-1].strip() or peer
+    return peer
+
@@ -119,6 +119,79 @@ def _get_elo_band(player_elo: int | None) -> dict:
         return ELO_THRESHOLDS["advanced"]
 
 
+class LegalMoveSummary:
+    """
+    Legal-move statistics for one position, generated lazily and at most
+    once: `count` / `captures` / `promotions` come from a single cheap pass;
+    `checks` (gives_check is expensive in python-chess) is only computed if
+    asked for, and `has_checks(n)` stops as soon as n checks are found.
+    Shared by the is_only_legal checks and classify_move.
+    """
+
+    __slots__ = ("board", "_count", "_captures", "_promotions", "_checks")
+
+    def __init__(self, board: chess.Board):
+        self.board = board
+        self._count: int | None = None
+        self._captures = 0
+        self._promotions = 0
+        self._checks: int | None = None
+
+    def _scan(self) -> None:
+        board = self.board
+        count = captures = promotions = 0
+        for move in board.generate_legal_moves():
+            count += 1
+            if board.is_capture(move):
+                captures += 1
+            if move.promotion:
+                promotions += 1
+        self._count, self._captures, self._promotions = count, captures, promotions
+
+    @property
+    def count(self) -> int:
+        if self._count is None:
+            self._scan()
+        return self._count
+
+    @property
+    def captures(self) -> int:
+        if self._count is None:
+            self._scan()
+        return self._captures
+
+    @property
+    def promotions(self) -> int:
+        if self._count is None:
+            self._scan()
+        return self._promotions
+
+    @property
+    def checks(self) -> int:
+        if self._checks is None:
+            board = self.board
+            self._checks = sum(1 for m in board.generate_legal_moves() if board.gives_check(m))
+        return self._checks
+
+    def has_checks(self, n: int) -> bool:
+        """True if at least `n` legal moves give check."""
+        if self._checks is not None:
+            return self._checks >= n
+        board = self.board
+        found = 0
+        for move in board.generate_legal_moves():
+            if board.gives_check(move):
+                found += 1
+                if found >= n:
+                    return True
+        self._checks = found
+        return False
+
+    @property
+    def is_only_legal(self) -> bool:
+        return self.count == 1
+
+
 def classify_move(
     *,
     cp_loss: int,
@@ -136,10 +209,12 @@ def classify_move(
     mate_before: int | None,
     mate_after: int | None,
     player_elo: int | None = None,
+    legal_moves: LegalMoveSummary | None = None,
 ) -> str:
     """
     Classify a move using chess.com-style categories.
     Thresholds are ELO-relative: lower-rated players get wider bands.
+    Pass the position's `legal_moves` summary to reuse it across callers.
 
     Returns one of:
         Brilliant, Great, Best, Excellent, Good,
@@ -185,10 +260,11 @@ def classify_move(
             # Check for Great: best move in a sharp position with many alternatives
             # that would be significantly worse. Approximation: position is complex
             # (many legal moves) and the second-best move would lose significantly.
-            legal_count = board_before.legal_moves.count()
-            if legal_count >= 8 and wp_loss <= 0 and player_wp_before >= 0.4:
+            if legal_moves is None:
+                legal_moves = LegalMoveSummary(board_before)
+            if wp_loss <= 0 and player_wp_before >= 0.4 and legal_moves.count >= 8:
                 # The position was sharp and the player found the only strong move
-                if _is_tactical_position(board_before):
+                if _is_tactical_position(legal_moves):
                     return "Great"
 
             return "Best"
@@ -221,16 +297,11 @@ def _is_sacrifice(board: chess.Board, move: chess.Move, color: str) -> bool:
     and the piece is worth more than what it captures (or it's a non-capture to
     an attacked square).
     """
-    moving_piece = board.piece_at(move.from_square)
-    if not moving_piece:
+    moving_type = board.piece_type_at(move.from_square)
+    if not moving_type:
         return False
 
-    piece_values = {
-        chess.PAWN: 1, chess.KNIGHT: 3, chess.BISHOP: 3,
-        chess.ROOK: 5, chess.QUEEN: 9, chess.KING: 0
-    }
-
-    moving_value = piece_values.get(moving_piece.piece_type, 0)
+    moving_value = PIECE_VALUES_MAP.get(moving_type, 0)
 
     # Not a sacrifice if it's a pawn or king move
     if moving_value <= 1:
@@ -242,21 +313,20 @@ def _is_sacrifice(board: chess.Board, move: chess.Move, color: str) -> bool:
         return False
 
     # If it's a capture, check if we're giving up more than we get
-    captured = board.piece_at(move.to_square)
-    captured_value = piece_values.get(captured.piece_type, 0) if captured else 0
+    captured_type = board.piece_type_at(move.to_square)
+    captured_value = PIECE_VALUES_MAP.get(captured_type, 0) if captured_type else 0
 
     # It's a sacrifice if we're losing material (piece value > captured value)
     return moving_value > captured_value + 1  # +1 margin for approximate equality
 
 
-def _is_tactical_position(board: chess.Board) -> bool:
+def _is_tactical_position(legal_moves: LegalMoveSummary) -> bool:
     """
     Heuristic check for whether a position is tactically sharp.
     Looks for: checks available, hanging pieces, pins, multiple captures.
+    Checks are only counted when the (cheap) capture count isn't enough.
     """
-    captures = sum(1 for m in board.legal_moves if board.is_capture(m))
-    checks = sum(1 for m in board.legal_moves if board.gives_check(m))
-    return captures >= 3 or checks >= 2
+    return legal_moves.captures >= 3 or legal_moves.has_checks(2)
 
 
 # ═══════════════════════════════════════════════════════════
@@ -437,12 +507,14 @@ async def compute_solution_line(
     engine: "chess.engine.UciProtocol",
     depth: int = 12,
     max_moves: int = 6,
+    game: object = None,
 ) -> list[str]:
     """
     Compute a multi-move solution line from a puzzle position using Stockfish.
     Returns a list of UCI move strings: [userMove, opponentReply, userMove2, ...].
     The line alternates: puzzle solver's move, then opponent's forced reply, etc.
     Stops when the position becomes clearly won/lost or max_moves reached.
+    `game` is passed through to engine.analyse (same key = warm hash table).
     """
     board = chess.Board(fen)
     line: list[str] = []
@@ -451,7 +523,7 @@ async def compute_solution_line(
         if board.is_game_over():
             break
 
-        info = await engine.analyse(board, chess.engine.Limit(depth=depth))
+        info = await engine.analyse(board, chess.engine.Limit(depth=depth), game=game)
         pv = info.get("pv")
         if not pv or len(pv) == 0:
             break
@@ -598,6 +670,92 @@ def parse_clock_comment(comment: str | None) -> float | None:
     return hours * 3600 + minutes * 60 + seconds
 
 
+# ═══════════════════════════════════════════════════════════
+# Eval Annotation Parsing
+# ═══════════════════════════════════════════════════════════
+
+_EVAL_RE = re.compile(r'\[%eval\s+(#)?([+-]?\d+(?:\.\d+)?)')
+
+
+def parse_eval_comment(comment: str | None) -> tuple[int, int | None] | None:
+    """
+    Parse [%eval 0.35] / [%eval #-3] from a PGN node comment (Lichess format,
+    White POV, pawns). Returns (score_cp, mate_in) clamped the same way as
+    engine scores, or None if not found.
+    """
+    if not comment:
+        return None
+    m = _EVAL_RE.search(comment)
+    if not m:
+        return None
+    if m.group(1):
+        mate_in = int(float(m.group(2)))
+        return (1500 if mate_in > 0 else -1500), mate_in
+    return max(-1500, min(1500, round(float(m.group(2)) * 100))), None
+
+
+def annotated_evals(pgn_game) -> list[tuple[int, int | None] | None] | None:
+    """
+    Per-ply evals embedded in the PGN, or None unless the annotations are
+    complete. The final ply may be missing (Lichess leaves the mating move
+    unannotated); everything before it must carry an [%eval].
+    """
+    evals = [parse_eval_comment(node.comment) for node in pgn_game.mainline()]
+    if not evals or any(e is None for e in evals[:-1]):
+        return None
+    return evals
+
+
+# ═══════════════════════════════════════════════════════════
+# Game Fingerprints
+# ═══════════════════════════════════════════════════════════
+
+
+def movetext_hash(pgn_game, include_clocks: bool = False, include_evals: bool = False) -> str:
+    """
+    Content hash of a game's mainline, independent of headers, comments,
+    move numbering and whitespace. Two imports of the same game produce the
+    same hash. With include_clocks=True, [%clk] values are part of the hash
+    (needed when the cached result contains move-time data); likewise
+    include_evals=True for embedded [%eval] annotations.
+    """
+    parts = [pgn_game.board().fen()]
+    for node in pgn_game.mainline():
+        token = node.move.uci()
+        if include_clocks:
+            clk = parse_clock_comment(node.comment) if node.comment else None
+            if clk is not None:
+                token += f"@{clk:g}"
+        if include_evals:
+            ev = parse_eval_comment(node.comment)
+            if ev is not None:
+                token += f"={ev[0]}" if ev[1] is None else f"=#{ev[1]}"
+        parts.append(token)
+    return hashlib.sha256(" ".join(parts).encode()).hexdigest()
+
+
+class Mainline:
+    """
+    The part of a parsed game the engine stage reads – start position,
+    mainline moves and the embedded [%eval]s – small enough to build in the
+    CPU pool and send back, so the event loop never parses PGN. Stands in
+    for a chess.pgn.Game wherever evaluate_game / new_plies take one.
+    """
+
+    __slots__ = ("root", "moves", "evals")
+
+    def __init__(self, pgn_game):
+        self.root = pgn_game.board()
+        self.moves = list(pgn_game.mainline_moves())
+        self.evals = annotated_evals(pgn_game)
+
+    def board(self) -> chess.Board:
+        return self.root.copy(stack=False)
+
+    def mainline_moves(self) -> list[chess.Move]:
+        return self.moves
+
+
 # ═══════════════════════════════════════════════════════════
 # Blunder Subtype Classification
 # ═══════════════════════════════════════════════════════════
@@ -612,148 +770,187 @@ PIECE_NAMES_MAP = {
     chess.ROOK: "rook", chess.QUEEN: "queen", chess.KING: "king",
 }
 
+# ═══════════════════════════════════════════════════════════
+# Position Features (shared by the tactic detectors)
+# ═══════════════════════════════════════════════════════════
+
+_SLIDER_TYPES = (chess.BISHOP, chess.ROOK, chess.QUEEN)
+
+
+def _popcount(mask: int) -> int:
+    return bin(mask).count("1")
+
+
+def _attack_map(board: chess.Board, color: chess.Color) -> int:
+    """Union of every square attacked by `color`'s pieces."""
+    attacked = 0
+    for sq in chess.scan_reversed(board.occupied_co[color]):
+        attacked |= board.attacks_mask(sq)
+    return attacked
+
+
+class MoveFeatures:
+    """
+    Everything the tactic detectors need about one (position, move) pair,
+    computed once and shared: the post-move board and lazily built bitboards
+    (attack maps per colour, pinned pieces, king zone, slider rays). Detectors
+    work on these masks with bitwise operations instead of walking
+    chess.SQUARES and copying the board each time.
+    """
+
+    def __init__(self, board: chess.Board, move: chess.Move):
+        self.board = board
+        self.move = move
+        self.player = board.turn
+        self.opponent = not board.turn
+        self.moving_piece = board.piece_at(move.from_square)
+        self.captured = board.piece_at(move.to_square)
+        self.board_after = board.copy(stack=False)
+        self.board_after.push(move)
+        self._cache: dict = {}
+
+    def _memo(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    # ── Attack / defender maps ──
+
+    def attacks_before(self, color: chess.Color) -> int:
+        return self._memo(("atk_before", color), lambda: _attack_map(self.board, color))
+
+    def attacks_after(self, color: chess.Color) -> int:
+        return self._memo(("atk_after", color), lambda: _attack_map(self.board_after, color))
+
+    def valuable_after(self, color: chess.Color) -> int:
+        """`color`'s minor and major pieces (value >= 3) after the move."""
+        b = self.board_after
+        return b.occupied_co[color] & (b.knights | b.bishops | b.rooks | b.queens)
+
+    # ── King ──
+
+    @property
+    def opponent_king_after(self) -> Optional[int]:
+        return self.board_after.king(self.opponent)
+
+    @property
+    def king_zone_after(self) -> int:
+        """Opponent king square plus its neighbours, after the move."""
+        king = self.opponent_king_after
+        if king is None:
+            return 0
+        return chess.BB_SQUARES[king] | chess.BB_KING_ATTACKS[king]
+
+    @property
+    def pinned_after(self) -> int:
+        """Opponent pieces pinned to their own king after the move."""
+        def compute():
+            king = self.opponent_king_after
+            if king is None:
+                return 0
+            return self.board_after._slider_blockers(king) & ~chess.BB_SQUARES[king]
+        return self._memo("pinned_after", compute)
+
+    # ── Sliding pieces ──
+
+    def player_slider_rays(self) -> list[tuple[int, int, int]]:
+        """(square, rays before, rays after) for the player's other sliders."""
+        def compute():
+            b = self.board
+            sliders = b.occupied_co[self.player] & (b.bishops | b.rooks | b.queens)
+            sliders &= ~chess.BB_SQUARES[self.move.from_square]
+            return [
+                (sq, b.attacks_mask(sq), self.board_after.attacks_mask(sq))
+                for sq in chess.scan_forward(sliders)
+            ]
+        return self._memo("slider_rays", compute)
+
+
 # ═══════════════════════════════════════════════════════════
 # Tactical Pattern Detection Helpers
 # ═══════════════════════════════════════════════════════════
 
-def _detect_fork(board: chess.Board, move: chess.Move) -> bool:
+def _detect_fork(f: MoveFeatures) -> bool:
     """Check if a move creates a fork (piece attacks 2+ higher-value targets)."""
-    board_after = board.copy()
-    board_after.push(move)
-    attacker = board.piece_at(move.from_square)
+    attacker = f.moving_piece
     if not attacker:
         return False
     attacker_val = PIECE_VALUES_MAP.get(attacker.piece_type, 0)
-    opponent = not board.turn
-    attacked_targets = 0
-    for sq in board_after.attacks(move.to_square):
-        target = board_after.piece_at(sq)
-        if target and target.color == opponent:
-            target_val = PIECE_VALUES_MAP.get(target.piece_type, 0)
-            if target_val > attacker_val or target.piece_type == chess.KING:
-                attacked_targets += 1
-    return attacked_targets >= 2
+    b = f.board_after
+    targets = b.kings
+    for piece_type, value in PIECE_VALUES_MAP.items():
+        if value > attacker_val:
+            targets |= b.pieces_mask(piece_type, f.opponent)
+    targets &= b.occupied_co[f.opponent]
+    return _popcount(b.attacks_mask(f.move.to_square) & targets) >= 2
 
 
-def _detect_pin(board: chess.Board, move: chess.Move) -> bool:
+def _detect_pin(f: MoveFeatures) -> bool:
     """Check if a move creates or exploits a pin on a ray (file/rank/diagonal)."""
-    board_after = board.copy()
-    board_after.push(move)
-    opponent = not board.turn
-    # Check if any opponent piece is now pinned to their king
-    opp_king_sq = board_after.king(opponent)
-    if opp_king_sq is None:
+    king = f.opponent_king_after
+    if king is None:
         return False
-    for sq in chess.SQUARES:
-        piece = board_after.piece_at(sq)
-        if piece and piece.color == opponent and sq != opp_king_sq:
-            if board_after.is_pinned(opponent, sq):
-                # Verify that this pin involves our moved piece
-                pin_dir = board_after.pin(opponent, sq)
-                if pin_dir and move.to_square in pin_dir:
-                    return True
+    to_mask = chess.BB_SQUARES[f.move.to_square]
+    # The pin must involve our moved piece: its square lies on the pin line
+    for sq in chess.scan_forward(f.pinned_after):
+        if chess.ray(king, sq) & to_mask:
+            return True
     return False
 
 
-def _detect_skewer(board: chess.Board, move: chess.Move) -> bool:
+def _detect_skewer(f: MoveFeatures) -> bool:
     """Check if a move creates a skewer (attacks high-value piece with lower behind it)."""
-    board_after = board.copy()
-    board_after.push(move)
-    attacker = board.piece_at(move.from_square)
+    attacker = f.moving_piece
     if not attacker:
         return False
     # Skewers happen on rays — only bishops, rooks, queens can skewer
-    if attacker.piece_type not in (chess.BISHOP, chess.ROOK, chess.QUEEN):
+    if attacker.piece_type not in _SLIDER_TYPES:
         return False
-    opponent = not board.turn
-    to_sq = move.to_square
-    to_rank, to_file = chess.square_rank(to_sq), chess.square_file(to_sq)
-
-    # Check each ray direction from the moved piece
-    ray_dirs = []
-    if attacker.piece_type in (chess.ROOK, chess.QUEEN):
-        ray_dirs += [(0, 1), (0, -1), (1, 0), (-1, 0)]
-    if attacker.piece_type in (chess.BISHOP, chess.QUEEN):
-        ray_dirs += [(1, 1), (1, -1), (-1, 1), (-1, -1)]
-
-    for dr, df in ray_dirs:
-        pieces_on_ray = []
-        r, f = to_rank + dr, to_file + df
-        while 0 <= r <= 7 and 0 <= f <= 7:
-            sq = chess.square(f, r)
-            p = board_after.piece_at(sq)
-            if p:
-                if p.color == opponent:
-                    pieces_on_ray.append(p)
-                break  # blocked by any piece
-            r += dr
-            f += df
-        # Continue past first piece if it can move
-        if len(pieces_on_ray) == 1:
-            r2, f2 = r + dr, f + df
-            while 0 <= r2 <= 7 and 0 <= f2 <= 7:
-                sq2 = chess.square(f2, r2)
-                p2 = board_after.piece_at(sq2)
-                if p2:
-                    if p2.color == opponent:
-                        pieces_on_ray.append(p2)
-                    break
-                r2 += dr
-                f2 += df
-        if len(pieces_on_ray) >= 2:
-            v1 = PIECE_VALUES_MAP.get(pieces_on_ray[0].piece_type, 0)
-            v2 = PIECE_VALUES_MAP.get(pieces_on_ray[1].piece_type, 0)
-            # Skewer: front piece is more valuable (or is king)
-            if pieces_on_ray[0].piece_type == chess.KING or v1 > v2:
-                return True
+    b = f.board_after
+    to_sq = f.move.to_square
+    opponent_mask = b.occupied_co[f.opponent]
+
+    # First piece hit on each ray from the moved piece (an opponent piece)
+    for front in chess.scan_forward(b.attacks_mask(to_sq) & opponent_mask):
+        # First piece behind it on the same line, further from to_sq
+        front_mask = chess.BB_SQUARES[front]
+        line = chess.ray(to_sq, front) & b.occupied & ~front_mask & ~chess.BB_SQUARES[to_sq]
+        behind = None
+        for sq in chess.scan_forward(line):
+            if chess.between(to_sq, sq) & front_mask and not chess.between(front, sq) & b.occupied:
+                behind = sq
+                break
+        if behind is None or not opponent_mask & chess.BB_SQUARES[behind]:
+            continue
+        p1 = b.piece_type_at(front)
+        p2 = b.piece_type_at(behind)
+        # Skewer: front piece is more valuable (or is king)
+        if p1 == chess.KING or PIECE_VALUES_MAP.get(p1, 0) > PIECE_VALUES_MAP.get(p2, 0):
+            return True
     return False
 
 
-def _detect_discovered_attack(board: chess.Board, move: chess.Move) -> bool:
+def _detect_discovered_attack(f: MoveFeatures) -> bool:
     """Check if moving a piece reveals an attack from another piece behind it."""
-    board_after = board.copy()
-    board_after.push(move)
-    player = board.turn
-    opponent = not player
-    from_sq = move.from_square
-    # Check if removing the piece from from_sq opened a line for our sliding pieces
-    for sq in chess.SQUARES:
-        piece = board.piece_at(sq)
-        if not piece or piece.color != player or sq == move.from_square:
-            continue
-        if piece.piece_type not in (chess.BISHOP, chess.ROOK, chess.QUEEN):
-            continue
-        # Did this piece gain new attacks by the move?
-        attacks_before = board.attacks(sq)
-        attacks_after = board_after.attacks(sq)
-        new_attacks = attacks_after & ~attacks_before
-        for atk_sq in new_attacks:
-            target = board_after.piece_at(atk_sq)
-            if target and target.color == opponent and PIECE_VALUES_MAP.get(target.piece_type, 0) >= 3:
-                return True
+    valuable = f.valuable_after(f.opponent)
+    # Did removing the piece from from_sq open a line for our sliding pieces?
+    for _, rays_before, rays_after in f.player_slider_rays():
+        if rays_after & ~rays_before & valuable:
+            return True
     return False
 
 
-def _detect_back_rank(board: chess.Board, move: chess.Move) -> bool:
+def _detect_back_rank(f: MoveFeatures) -> bool:
     """Check if a move delivers or threatens back-rank mate."""
-    board_after = board.copy()
-    board_after.push(move)
-    if board_after.is_checkmate():
-        opponent = not board.turn
-        king_sq = board_after.king(opponent)
-        if king_sq is not None:
-            king_rank = chess.square_rank(king_sq)
-            if (opponent == chess.WHITE and king_rank == 0) or (opponent == chess.BLACK and king_rank == 7):
-                return True
-    # Also check if it creates a back-rank mate threat
-    if board_after.is_check():
-        opponent = not board.turn
-        king_sq = board_after.king(opponent)
-        if king_sq is not None:
-            king_rank = chess.square_rank(king_sq)
-            if (opponent == chess.WHITE and king_rank == 0) or (opponent == chess.BLACK and king_rank == 7):
-                return True
-    return False
+    b = f.board_after
+    # Checkmate or check with the king on its back rank
+    if not b.is_check():
+        return False
+    king = f.opponent_king_after
+    if king is None:
+        return False
+    back_rank = chess.BB_RANK_1 if f.opponent == chess.WHITE else chess.BB_RANK_8
+    return bool(chess.BB_SQUARES[king] & back_rank)
 
 
 def _is_pawn_promotion_tactic(board: chess.Board, move: chess.Move) -> bool:
@@ -769,48 +966,44 @@ def _is_pawn_promotion_tactic(board: chess.Board, move: chess.Move) -> bool:
     return False
 
 
-def _detect_mate_threat(board: chess.Board, move: chess.Move) -> int | None:
+def _detect_mate_threat(f: MoveFeatures) -> int | None:
     """Check if a move delivers mate or mate-in-N (up to 3). Returns N or None."""
-    board_after = board.copy()
-    board_after.push(move)
-    if board_after.is_checkmate():
+    b = f.board_after
+    if b.is_checkmate():
         return 1
     # Check mate in 2-3 by examining if all opponent responses lead to forced mate
     # (Simplified: just check for mate-in-1 and obvious check sequences)
-    if board_after.is_check():
+    if b.is_check():
+        b = b.copy(stack=False)
         # After opponent's only legal responses, can we mate?
-        for response in board_after.legal_moves:
-            b2 = board_after.copy()
-            b2.push(response)
-            for our_move in b2.legal_moves:
-                b3 = b2.copy()
-                b3.push(our_move)
-                if b3.is_checkmate():
+        for response in list(b.legal_moves):
+            b.push(response)
+            for our_move in list(b.legal_moves):
+                b.push(our_move)
+                mated = b.is_checkmate()
+                b.pop()
+                if mated:
                     return 2
+            b.pop()
     return None
 
 
-def _detect_deflection(board: chess.Board, move: chess.Move) -> bool:
+def _detect_deflection(f: MoveFeatures) -> bool:
     """Check if a move forces a defender away from a critical square."""
-    board_after = board.copy()
-    board_after.push(move)
     # If the move is a capture or attack on a piece that was defending something
-    captured = board.piece_at(move.to_square)
-    if not captured:
+    if not f.captured:
         return False
-    opponent = not board.turn
-    player = board.turn
+    board, after = f.board, f.board_after
     # What was the captured piece defending?
-    for sq in board.attacks(move.to_square):
-        other = board.piece_at(sq)
-        if other and other.color == opponent and PIECE_VALUES_MAP.get(other.piece_type, 0) >= 3:
-            # Was the captured piece a defender of this square?
-            defenders_before = len(board.attackers(opponent, sq))
-            defenders_after = len(board_after.attackers(opponent, sq))
-            if defenders_after < defenders_before:
-                attackers_after = len(board_after.attackers(player, sq))
-                if attackers_after > defenders_after:
-                    return True
+    guarded = board.attacks_mask(f.move.to_square) & board.occupied_co[f.opponent]
+    guarded &= board.knights | board.bishops | board.rooks | board.queens
+    for sq in chess.scan_forward(guarded):
+        # Was the captured piece a defender of this square?
+        defenders_before = _popcount(board.attackers_mask(f.opponent, sq))
+        defenders_after = _popcount(after.attackers_mask(f.opponent, sq))
+        if defenders_after < defenders_before:
+            if _popcount(after.attackers_mask(f.player, sq)) > defenders_after:
+                return True
     return False
 
 
@@ -837,35 +1030,35 @@ def detect_puzzle_tactics(
         return []
 
     tags: list[str] = []
-    moving_piece = board.piece_at(move.from_square)
+    features = MoveFeatures(board, move)
+    moving_piece = features.moving_piece
 
     # ── Core tactical patterns ──
-    if _detect_fork(board, move):
+    if _detect_fork(features):
         tags.append("fork")
-    if _detect_pin(board, move):
+    if _detect_pin(features):
         tags.append("pin")
-    if _detect_skewer(board, move):
+    if _detect_skewer(features):
         tags.append("skewer")
-    if _detect_discovered_attack(board, move):
+    if _detect_discovered_attack(features):
         tags.append("discovered_attack")
-    if _detect_back_rank(board, move):
+    if _detect_back_rank(features):
         tags.append("back_rank")
-    if _detect_deflection(board, move):
+    if _detect_deflection(features):
         tags.append("deflection")
     if _is_pawn_promotion_tactic(board, move):
         tags.append("promotion")
 
     # ── Mate patterns ──
-    mate_n = _detect_mate_threat(board, move)
+    mate_n = _detect_mate_threat(features)
     if mate_n == 1:
         tags.append("mate_in_1")
     elif mate_n is not None:
         tags.append("checkmate_pattern")
 
     # ── Captures ──
-    captured = board.piece_at(move.to_square)
-    board_after = board.copy()
-    board_after.push(move)
+    captured = features.captured
+    board_after = features.board_after
 
     if captured:
         cap_val = PIECE_VALUES_MAP.get(captured.piece_type, 0)
@@ -901,7 +1094,7 @@ def detect_puzzle_tactics(
                 m = chess.Move.from_uci(uci)
                 if m in b.legal_moves:
                     if i % 2 == 0:  # Our moves
-                        if _detect_fork(b, m) and "fork" not in tags:
+                        if "fork" not in tags and _detect_fork(MoveFeatures(b, m)):
                             tags.append("fork")
                         if b.piece_at(m.to_square) and "combination" not in tags:
                             tags.append("combination")
@@ -954,56 +1147,57 @@ def classify_blunder_subtype(
 
     # ── 1. Check what the BEST move would have achieved ──
     if best_move and best_move in board_before.legal_moves:
+        best = MoveFeatures(board_before, best_move)
+
         # Missed checkmate?
-        mate_n = _detect_mate_threat(board_before, best_move)
+        mate_n = _detect_mate_threat(best)
         if mate_n is not None:
             return "missed_mate"
 
         # Missed fork?
-        if _detect_fork(board_before, best_move):
+        if _detect_fork(best):
             return "missed_fork"
 
         # Missed pin?
-        if _detect_pin(board_before, best_move):
+        if _detect_pin(best):
             return "missed_pin"
 
         # Missed skewer?
-        if _detect_skewer(board_before, best_move):
+        if _detect_skewer(best):
             return "missed_skewer"
 
         # Missed discovered attack?
-        if _detect_discovered_attack(board_before, best_move):
+        if _detect_discovered_attack(best):
             return "missed_discovery"
 
         # Missed back-rank threat?
-        if _detect_back_rank(board_before, best_move):
+        if _detect_back_rank(best):
             return "back_rank"
 
     # ── 2. Check what the PLAYED move caused ──
-    board_after = board_before.copy()
-    board_after.push(move)
+    played = MoveFeatures(board_before, move)
+    board_after = played.board_after
 
     # Did the player hang a piece?
-    moving_piece = board_before.piece_at(move.from_square)
+    moving_piece = played.moving_piece
     if moving_piece:
-        attackers = len(board_after.attackers(opponent_color, move.to_square))
-        defenders = len(board_after.attackers(player_color, move.to_square))
+        attackers = _popcount(board_after.attackers_mask(opponent_color, move.to_square))
+        defenders = _popcount(board_after.attackers_mask(player_color, move.to_square))
         piece_val = PIECE_VALUES_MAP.get(moving_piece.piece_type, 0)
         if attackers > defenders and piece_val >= 3:
             return "hanging_piece"
 
-    # Did the move expose another piece?
-    for sq in chess.SQUARES:
-        p = board_after.piece_at(sq)
-        if p and p.color == player_color and sq != move.to_square:
-            atk_after = len(board_after.attackers(opponent_color, sq))
-            def_after = len(board_after.attackers(player_color, sq))
-            # Was this piece safe before?
-            atk_before = len(board_before.attackers(opponent_color, sq))
-            def_before = len(board_before.attackers(player_color, sq))
-            val = PIECE_VALUES_MAP.get(p.piece_type, 0)
-            if val >= 3 and atk_after > def_after and atk_before <= def_before:
-                return "hanging_piece"
+    # Did the move expose another piece (minor or major, previously safe)?
+    others = played.valuable_after(player_color) & ~chess.BB_SQUARES[move.to_square]
+    for sq in chess.scan_forward(others):
+        atk_after = _popcount(board_after.attackers_mask(opponent_color, sq))
+        def_after = _popcount(board_after.attackers_mask(player_color, sq))
+        if atk_after <= def_after:
+            continue
+        atk_before = _popcount(board_before.attackers_mask(opponent_color, sq))
+        def_before = _popcount(board_before.attackers_mask(player_color, sq))
+        if atk_before <= def_before:
+            return "hanging_piece"
 
     # ── 3. King safety checks (all phases) ──
     if moving_piece and moving_piece.piece_type == chess.KING:
@@ -1024,7 +1218,7 @@ def classify_blunder_subtype(
     # ── 4. Back-rank vulnerability (opponent can now exploit) ──
     # Check if after our move, opponent has a back-rank threat
     for i, opp_move in enumerate(board_after.legal_moves):
-        if _detect_back_rank(board_after, opp_move):
+        if _detect_back_rank(MoveFeatures(board_after, opp_move)):
             return "back_rank"
         if i >= 4:  # Only check a few to avoid being too slow
             break
@@ -1061,3 +1255,228 @@ def classify_blunder_subtype(
 
     # ── Default: positional error (NOT missed_tactic) ──
     return "positional"
+
+
+# ═══════════════════════════════════════════════════════════
+# Game Analysis Derivation (from stored engine evaluations)
+# ═══════════════════════════════════════════════════════════
+
+
+def _simple_quality(cp_loss: int) -> str:
+    """Simple cp_loss classification used for opponent moves."""
+    if cp_loss == 0:
+        return "Best"
+    elif cp_loss <= 10:
+        return "Excellent"
+    elif cp_loss <= 25:
+        return "Good"
+    elif cp_loss <= 100:
+        return "Inaccuracy"
+    elif cp_loss <= 300:
+        return "Mistake"
+    return "Blunder"
+
+
+# Stored on GameAnalysis.analysis_version by every path that saves
+# derive_game_analysis output. Bump it when that output changes (new fields,
+# different classification) so app/reanalysis.py brings older rows up to date.
+ANALYSIS_VERSION = 1
+
+
+def derive_game_analysis(
+    pgn_game,
+    plies: list[dict],
+    player_color: str,
+    player_elo: int | None = None,
+) -> dict:
+    """
+    Build one player's view of a game from per-ply engine evaluations
+    (see app.engine_evals). No engine calls happen here: cp_loss, accuracy,
+    move quality, blunder subtypes, clock stats and puzzle candidates are all
+    derived from `plies`, so the same evaluations serve both players.
+
+    Returns a dict with the per-move records (`moves`), the player's stat
+    counters and `puzzle_candidates` as (ply_index, puzzle_data) pairs.
+    Puzzle solution lines are attached separately by the caller.
+    """
+    board = pgn_game.board()
+    moves = []
+    player_cp_losses = []
+    player_accuracies = []
+    phase_losses = {"opening": [], "middlegame": [], "endgame": []}
+    counts = {
+        "Best": 0, "Great": 0, "Brilliant": 0, "Missed Win": 0,
+        "Inaccuracy": 0, "Mistake": 0, "Blunder": 0,
+    }
+    prev_score_cp = 0
+    prev_is_mate = False
+    prev_mate_in = None
+    castled_white = False
+    castled_black = False
+    puzzle_candidates = []
+
+    prev_clock = None  # player's previous clock, for move time deltas
+    move_times = []  # player move times in seconds
+    time_trouble_blunders = 0
+
+    for ply_index, (node, ply) in enumerate(zip(pgn_game.mainline(), plies)):
+        move = node.move
+        move_num = ply_index + 1
+        mv_color = "white" if board.turn == chess.WHITE else "black"
+        san = board.san(move)
+        is_player_move = (mv_color == player_color)
+        fen_before = board.fen()
+        clock_remaining = parse_clock_comment(node.comment)
+
+        piece_obj = board.piece_at(move.from_square)
+        piece_symbol = piece_obj.symbol().upper() if piece_obj else None
+
+        if board.is_castling(move):
+            if mv_color == "white":
+                castled_white = True
+            else:
+                castled_black = True
+
+        best_move_san = None
+        best_move_uci = None
+        best_move_obj = None
+        best_second_gap_cp = None
+        # Only the player's moves need legal-move stats (Forced / Great / puzzles)
+        legal_moves = LegalMoveSummary(board)
+        is_only_legal = False
+
+        if is_player_move:
+            is_only_legal = legal_moves.is_only_legal
+            best_move_uci = ply.get("best")
+            if best_move_uci:
+                best_move_obj = chess.Move.from_uci(best_move_uci)
+                best_move_san = board.san(best_move_obj)
+            best_second_gap_cp = ply.get("gap")
+
+        score_cp = ply.get("cp", 0)
+        mate_in = ply.get("mate")
+        is_mate = mate_in is not None
+
+        # CP loss calculation
+        if prev_is_mate and is_mate:
+            cp_loss = 0
+        elif mv_color == "white":
+            cp_loss = max(0, prev_score_cp - score_cp)
+        else:
+            cp_loss = max(0, score_cp - prev_score_cp)
+        cp_loss = min(cp_loss, 800)
+
+        wp_before = win_probability(prev_score_cp, prev_is_mate, prev_mate_in)
+        wp_after = win_probability(score_cp, is_mate, mate_in)
+        mv_accuracy = move_accuracy(wp_before, wp_after, mv_color)
+
+        # Classification needs the pre-move board; phase needs the post-move one
+        if is_player_move:
+            quality = classify_move(
+                cp_loss=cp_loss,
+                win_prob_before=wp_before,
+                win_prob_after=wp_after,
+                color=mv_color,
+                board_before=board,
+                move=move,
+                best_move=best_move_obj,
+                is_only_legal=is_only_legal,
+                eval_before_cp=prev_score_cp,
+                eval_after_cp=score_cp,
+                is_mate_before=prev_is_mate,
+                is_mate_after=is_mate,
+                mate_before=prev_mate_in,
+                mate_after=mate_in,
+                player_elo=player_elo,
+                legal_moves=legal_moves,
+            )
+        else:
+            quality = _simple_quality(cp_loss)
+
+        board.push(move)
+        phase = detect_phase(board, move_num, castled_white, castled_black)
+
+        blunder_sub = None
+        if is_player_move:
+            player_accuracies.append(mv_accuracy)
+            player_cp_losses.append(cp_loss)
+            if quality in counts:
+                counts[quality] += 1
+            phase_losses[phase].append(cp_loss)
+
+            if quality == "Blunder":
+                board.pop()
+                blunder_sub = classify_blunder_subtype(board, move, best_move_obj, phase)
+                board.push(move)
+                if clock_remaining is not None and clock_remaining < 30:
+                    time_trouble_blunders += 1
+
+            if clock_remaining is not None and prev_clock is not None:
+                mt = prev_clock - clock_remaining
+                if mt > 0:
+                    move_times.append(mt)
+            if clock_remaining is not None:
+                prev_clock = clock_remaining
+
+            puzzle_data = generate_puzzle_data(
+                fen_before=fen_before,
+                san=san,
+                best_move_san=best_move_san,
+                best_move_uci=best_move_uci,
+                cp_loss=cp_loss,
+                phase=phase,
+                move_quality=quality,
+                move_number=move_num,
+                best_second_gap_cp=best_second_gap_cp,
+                is_only_legal=is_only_legal,
+                eval_before_cp=prev_score_cp,
+            )
+            if puzzle_data:
+                puzzle_candidates.append((ply_index, puzzle_data))
+
+        moves.append({
+            "move_number": move_num,
+            "color": mv_color,
+            "san": san,
+            "piece": piece_symbol,
+            "cp_loss": cp_loss,
+            "phase": phase,
+            "move_quality": quality,
+            "eval_before": prev_score_cp,
+            "eval_after": score_cp,
+            "fen_before": fen_before,
+            "best_move_san": best_move_san,
+            "best_move_uci": best_move_uci,
+            "win_prob_before": round(wp_before, 4),
+            "win_prob_after": round(wp_after, 4),
+            "accuracy": round(mv_accuracy, 1),
+            "is_mate_before": prev_is_mate,
+            "is_mate_after": is_mate,
+            "mate_before": prev_mate_in,
+            "mate_after": mate_in,
+            "time_remaining": clock_remaining,
+            "blunder_subtype": blunder_sub,
+        })
+
+        prev_score_cp = score_cp
+        prev_is_mate = is_mate
+        prev_mate_in = mate_in
+
+    return {
+        "moves": moves,
+        "player_cp_losses": player_cp_losses,
+        "accuracy": compute_game_accuracy(player_accuracies),
+        "phase_opening_cpl": avg(phase_losses["opening"]),
+        "phase_middlegame_cpl": avg(phase_losses["middlegame"]),
+        "phase_endgame_cpl": avg(phase_losses["endgame"]),
+        "blunders": counts["Blunder"],
+        "mistakes": counts["Mistake"],
+        "inaccuracies": counts["Inaccuracy"],
+        "best_moves": counts["Best"],
+        "great_moves": counts["Great"],
+        "brilliant_moves": counts["Brilliant"],
+        "missed_wins": counts["Missed Win"],
+        "average_move_time": round(sum(move_times) / len(move_times), 1) if move_times else None,
+        "time_trouble_blunders": time_trouble_blunders,
+        "puzzle_candidates": puzzle_candidates,
+    }
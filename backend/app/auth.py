@@ -28,6 +28,12 @@ async def get_current_user(
     Decode NextAuth.js JWT and return the User row.
     Returns None for unauthenticated requests (public endpoints).
     """
+    return await _resolve_user(credentials, db)
+
+
+async def _resolve_user(
+    credentials: Optional[HTTPAuthorizationCredentials], db: AsyncSession
+) -> Optional[User]:
     if credentials is None:
         return None
 
@@ -85,6 +91,19 @@ async def require_user(
     return user
 
 
+async def require_stream_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    db: AsyncSession = Depends(get_db, scope="function"),
+) -> User:
+    """
+    require_user for StreamingResponse endpoints. Pair it with
+    `db: AsyncSession = Depends(get_db, scope="function")` in the endpoint so
+    both share one session, which is closed as soon as the endpoint returns
+    rather than held for the whole stream.
+    """
+    return await require_user(await _resolve_user(credentials, db))
+
+
 async def require_pro(
     user: User = Depends(require_user),
 ) -> User:
@@ -4,16 +4,41 @@ Chess Analyzer Backend - Configuration
 Loads settings from environment variables with Pydantic validation.
 """
 
+from pydantic import BaseModel, Field
 from pydantic_settings import BaseSettings
 from typing import Optional
 from functools import lru_cache
 
 
+class EngineProfile(BaseModel):
+    """UCI options applied when a Stockfish process is started, plus the per-search time cap."""
+
+    threads: int = 1
+    hash_mb: int = 16
+    nnue: bool = True  # only sent to engines that still expose "Use NNUE"
+    move_overhead_ms: int = 10
+    search_time_s: float = 10.0  # wall-clock cap per search, sent alongside the depth limit
+
+
+DEFAULT_ENGINE_PROFILES = {
+    # Single-position lookups (opening drill): hash barely matters
+    "quick": EngineProfile(threads=1, hash_mb=16, search_time_s=2.0),
+    # /analysis/run and anonymous analysis: up to engine_max_concurrency at once
+    "interactive": EngineProfile(threads=1, hash_mb=64, search_time_s=5.0),
+    # arq worker and offline scripts (puzzle pipeline)
+    "batch": EngineProfile(threads=2, hash_mb=256),
+}
+
+
 class Settings(BaseSettings):
     """Application settings loaded from environment variables."""
 
     # ─── Database ───
     database_url: str = "postgresql+asyncpg://localhost:5432/chess_analyzer"
+    db_pool_size: int = 10  # interactive request pool
+    db_max_overflow: int = 20
+    analysis_db_pool_size: int = 5  # separate pool for analysis/AI streams (no overflow)
+    analysis_db_pool_timeout: float = 60  # seconds a stream waits for a connection
 
     # ─── Supabase ───
     supabase_url: str = ""
@@ -27,6 +52,48 @@ class Settings(BaseSettings):
     stockfish_path: str = "/usr/games/stockfish"
     default_analysis_depth: int = 12
     deep_analysis_depth: int = 18
+    # Named option sets for open_engine(); override with JSON, e.g.
+    # ENGINE_PROFILES='{"batch": {"threads": 4, "hash_mb": 1024}}'
+    engine_profiles: dict[str, EngineProfile] = Field(default_factory=lambda: dict(DEFAULT_ENGINE_PROFILES))
+    # Supervision (app/engine_supervisor.py): a search still running this long
+    # past its time cap is treated as a hung engine, killed and retried
+    engine_hang_grace_s: float = 5.0
+    engine_search_retries: int = 2  # restarts per search before the search fails
+
+    # ─── Engine service (app/engine_service.py) ───
+    # UNIX socket of the host-wide engine pool; empty = every process starts its own engines
+    engine_service_socket: str = ""
+    engine_service_profile: str = "interactive"  # options for the pool's engines
+    engine_service_engines: int = 0  # pool size; 0 = cores / profile threads
+    engine_service_aging_s: float = 30  # a queued search moves up one priority class per this many seconds
+
+    # ─── Background analysis jobs (app/job_scheduler.py) ───
+    interactive_job_max_games: int = 3  # game-specific jobs up to this size are "interactive"
+    analysis_jobs_per_user: int = 1  # jobs of one user processed at the same time
+    analysis_job_aging_s: float = 300  # a pending job moves up one class per this many seconds
+    analysis_job_stale_s: float = 1800  # processing jobs without progress this long are requeued
+
+    # ─── Background re-analysis (app/reanalysis.py; needs engine_service_socket) ───
+    reanalysis_target_depth: int = 12  # rows below this depth (or ANALYSIS_VERSION) are redone
+    reanalysis_offpeak_hours: str = "1-7"  # local hours [start-end) when host load is ignored (user load never is)
+    reanalysis_max_load: float = 0.5  # outside them, only while 1-min load average per core is below this
+    reanalysis_cpu_cores: float = 1.0  # average engine cores it may use; it sleeps between games to stay under
+    reanalysis_poll_s: float = 2.0  # how often load is rechecked, also mid-game
+    reanalysis_batch_size: int = 50  # stale games fetched per query
+
+    # ─── Engine admission control ───
+    engine_max_concurrency: int = 4  # concurrent Stockfish analyses per process
+    anonymous_queue_limit: int = 20  # queued anonymous requests before shedding (429)
+    anonymous_per_client_limit: int = 2  # active + queued anonymous requests per IP
+    # Peers whose X-Real-IP / X-Forwarded-For are believed (nginx in front); comma-separated CIDRs
+    trusted_proxies: str = "127.0.0.1/32,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16"
+
+    # ─── CPU work pool (python-chess parsing/classification off the event loop) ───
+    cpu_pool_workers: int = 2  # 0 = run inline on the event loop
+
+    # ─── Result cache (on-disk, per host) ───
+    result_cache_path: str = ".cache/result_cache.sqlite3"
+    result_cache_max_entries: int = 20000
 
     # ─── Redis ───
     redis_url: str = "redis://localhost:6379"
@@ -38,6 +105,7 @@ class Settings(BaseSettings):
 
     # ─── OpenAI ───
     openai_api_key: str = ""
+    openai_base_url: str = "https://api.openai.com/v1"  # point at a local stub for testing
 
     # ─── App ───
     cors_origins: str = "http://localhost:3000"
@@ -64,6 +132,13 @@ class Settings(BaseSettings):
             return "postgresql+asyncpg://" + url[len("postgresql://"):]
         return url
 
+    def engine_profile(self, name: str) -> EngineProfile:
+        """Profile by name; names missing from an ENGINE_PROFILES override fall back to the defaults."""
+        profile = self.engine_profiles.get(name) or DEFAULT_ENGINE_PROFILES.get(name)
+        if profile is None:
+            raise ValueError(f"Unknown engine profile: {name}")
+        return profile
+
     @property
     def is_production(self) -> bool:
         return self.env == "production"
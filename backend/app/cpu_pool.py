@@ -0,0 +1,148 @@
+"""
+CPU work executor – keeps python-chess work off the asyncio event loop.
+
+PGN parsing, SAN/FEN generation and move classification are pure Python and
+hold the GIL, so running them inside a request handler stalls every other
+request on the process (a 1,000-game import or a blunder-heavy
+classification is seconds of dead loop). Routes submit those stages here as
+batches – one game, or a chunk of games – and await the result while the
+loop keeps serving.
+
+The pool uses spawned processes with `chess` and app.analysis_core imported
+up front, and is warmed at startup so the first request doesn't pay for
+process creation. `cpu_pool_workers = 0` runs everything inline (the old
+behaviour, handy for debugging). `monitor_loop_lag` records event-loop lag
+into `event_loop_lag_seconds` on /metrics to show the effect.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from io import StringIO
+from typing import Any, Callable, Optional, Sequence
+
+from app.config import get_settings
+from app.metrics import EVENT_LOOP_LAG
+
+
+def _warm() -> None:
+    """Worker initializer: pay the import cost once per process."""
+    import chess.pgn  # noqa: F401
+    import app.analysis_core  # noqa: F401
+
+
+def _noop() -> None:
+    return None
+
+
+@lru_cache()
+def get_cpu_pool() -> Optional[ProcessPoolExecutor]:
+    workers = get_settings().cpu_pool_workers
+    if workers <= 0:
+        return None
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_warm,
+    )
+
+
+async def warm_cpu_pool() -> None:
+    """Start every worker process now instead of on the first request."""
+    pool = get_cpu_pool()
+    if pool is None:
+        return
+    loop = asyncio.get_running_loop()
+    workers = get_settings().cpu_pool_workers
+    await asyncio.gather(*(loop.run_in_executor(pool, _noop) for _ in range(workers)))
+
+
+def shutdown_cpu_pool() -> None:
+    pool = get_cpu_pool()
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+    get_cpu_pool.cache_clear()
+
+
+async def run_cpu(fn: Callable, *args: Any) -> Any:
+    """
+    Run `fn(*args)` in the CPU pool. `fn` must be a module-level function and
+    its arguments/result picklable. A crashed worker breaks the pool; it is
+    replaced so the next call gets a fresh one.
+    """
+    pool = get_cpu_pool()
+    if pool is None:
+        return fn(*args)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+    except BrokenProcessPool:
+        shutdown_cpu_pool()
+        raise
+
+
+async def map_cpu(fn: Callable[[list], list], items: Sequence, chunk_size: int = 50) -> list:
+    """`fn` over `items` in chunks spread across the pool; results keep input order."""
+    chunks = [list(items[i:i + chunk_size]) for i in range(0, len(items), chunk_size)]
+    results = await asyncio.gather(*(run_cpu(fn, chunk) for chunk in chunks))
+    return [r for chunk in results for r in chunk]
+
+
+async def monitor_loop_lag(interval: float = 0.25) -> None:
+    """Forever: sleep `interval` and record how late the loop woke us up."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - start - interval))
+
+
+# ═══════════════════════════════════════════════════════════
+# Tasks (module-level so they pickle by reference)
+# ═══════════════════════════════════════════════════════════
+
+
+def _read_game(pgn_text: str):
+    """Parsed game, or an empty one for unparsable text (same as LazyGame.game)."""
+    import chess.pgn
+    return chess.pgn.read_game(StringIO(pgn_text)) or chess.pgn.Game()
+
+
+def read_mainline(pgn_text: str):
+    """
+    (Mainline, movetext_hash) for the engine stage, or None for empty text
+    (where chess.pgn.read_game returns None).
+    """
+    import chess.pgn
+    from app.analysis_core import Mainline, movetext_hash
+    game = chess.pgn.read_game(StringIO(pgn_text))
+    if game is None:
+        return None
+    return Mainline(game), movetext_hash(game)
+
+
+def derive_analysis(pgn_text: str, plies: list[dict], player_color: str, player_elo: int | None) -> dict:
+    """Parse the game and run derive_game_analysis (SAN/FEN, classification, puzzles)."""
+    from app.analysis_core import derive_game_analysis
+    return derive_game_analysis(_read_game(pgn_text), plies, player_color, player_elo)
+
+
+def movetext_hashes(pgn_texts: list[str]) -> list[str]:
+    """movetext_hash(include_clocks, include_evals) per game, as used for result-cache keys."""
+    from app.analysis_core import movetext_hash
+    return [
+        movetext_hash(_read_game(text), include_clocks=True, include_evals=True)
+        for text in pgn_texts
+    ]
+
+
+def normalize_games(pgn_texts: list[str]) -> list[tuple[str, int]]:
+    """(normalized PGN as stored in games.moves_pgn, mainline length) per game."""
+    out = []
+    for text in pgn_texts:
+        game = _read_game(text)
+        out.append((str(game), sum(1 for _ in game.mainline_moves())))
+    return out
@@ -173,11 +173,17 @@ class GameAnalysis(Base):
     average_move_time = Column(Float, nullable=True)
     time_trouble_blunders = Column(Integer, default=0)
     analysis_depth = Column(Integer, default=12)
+    # analysis_core.ANALYSIS_VERSION of the pipeline that wrote the row;
+    # NULL = the worker's eval-only path (no accuracy, FENs, best moves, puzzles)
+    analysis_version = Column(Integer, nullable=True)
     analyzed_at = Column(DateTime(timezone=True), server_default=func.now())
 
     game = relationship("Game", back_populates="analysis")
 
-    __table_args__ = (Index("ix_analysis_game", "game_id"),)
+    __table_args__ = (
+        Index("ix_analysis_game", "game_id"),
+        Index("ix_analysis_version_depth", "analysis_version", "analysis_depth"),
+    )
 
 
 class MoveEvaluation(Base):
@@ -209,6 +215,8 @@ class MoveEvaluation(Base):
     time_remaining = Column(Float, nullable=True)
     is_mate_before = Column(Boolean, default=False)
     is_mate_after = Column(Boolean, default=False)
+    mate_before = Column(Integer, nullable=True)  # mate distance, White POV (scripts/reclassify_moves.py)
+    mate_after = Column(Integer, nullable=True)
 
     game = relationship("Game", back_populates="move_evals")
 
@@ -219,6 +227,27 @@ class MoveEvaluation(Base):
     )
 
 
+class GameEngineEval(Base):
+    """Per-ply engine evaluations, stored once per canonical game (movetext hash)
+    and search depth, shared by every user who imported the same game."""
+
+    __tablename__ = "game_engine_evals"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    movetext_hash = Column(String, nullable=False)
+    platform = Column(String, nullable=True)
+    platform_game_id = Column(String, nullable=True)
+    depth = Column(Integer, nullable=False)
+    plies = Column(JSONB, nullable=False, default=list)  # see app/engine_evals.py
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("movetext_hash", "depth", name="uq_engine_evals_movetext_depth"),
+        Index("ix_engine_evals_platform_game", "platform", "platform_game_id"),
+    )
+
+
 class Puzzle(Base):
     """Tactical puzzles generated from user games."""
 
@@ -290,7 +319,9 @@ class OpeningRepertoire(Base):
     games_won = Column(Integer, default=0)
     games_drawn = Column(Integer, default=0)
     games_lost = Column(Integer, default=0)
-    average_cpl = Column(Float, nullable=True)
+    average_cpl = Column(Float, nullable=True)  # cpl_sum / cpl_games
+    cpl_sum = Column(Float, default=0)  # sum of overall_cpl over analysed games
+    cpl_games = Column(Integer, default=0)  # analysed games counted in cpl_sum
     early_deviations = Column(Integer, default=0)
     last_played_at = Column(DateTime(timezone=True), nullable=True)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -335,11 +366,21 @@ class AnalysisJob(Base):
     games_completed = Column(Integer, default=0)
     result = Column(JSONB, nullable=True)  # Summary when complete
     error = Column(Text, nullable=True)
+    # Scheduling (app/job_scheduler.py)
+    priority_class = Column(String, nullable=False, default="batch")  # 'interactive' | 'batch' | 'background'
+    game_ids = Column(JSONB, nullable=True)  # games still to analyse
+    depth = Column(Integer, nullable=False, default=12)
+    queued_at = Column(DateTime(timezone=True), server_default=func.now())  # last time it became pending
+    queue_wait_s = Column(Float, nullable=False, default=0)  # total time spent pending
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)  # last progress while processing
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     started_at = Column(DateTime(timezone=True), nullable=True)
     completed_at = Column(DateTime(timezone=True), nullable=True)
 
-    __table_args__ = (Index("ix_jobs_user_status", "user_id", "status"),)
+    __table_args__ = (
+        Index("ix_jobs_user_status", "user_id", "status"),
+        Index("ix_jobs_status_queued", "status", "queued_at"),
+    )
 
 
 class PopulationStats(Base):
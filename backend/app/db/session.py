@@ -1,23 +1,45 @@
 """
 Database session management – async SQLAlchemy + Supabase Postgres.
+
+Two connection pools:
+  engine / async_session                     – interactive request handlers
+  analysis_engine / analysis_session         – long-running work (analysis
+                                               and AI SSE streams)
+A burst of analyses queues on the small analysis pool instead of exhausting
+the connections every other endpoint needs. Streaming endpoints also take
+their request session with `Depends(get_db, scope="function")` so it is
+returned to the pool when the endpoint function returns, before the stream
+body starts (see auth.require_stream_user).
 """
 
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
 from app.config import get_settings
+from app.metrics import Gauge
 
 settings = get_settings()
 
 engine = create_async_engine(
     settings.database_url_async,
     echo=not settings.is_production,
-    pool_size=10,
-    max_overflow=20,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
     pool_pre_ping=True,
 )
 
 async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+analysis_engine = create_async_engine(
+    settings.database_url_async,
+    echo=not settings.is_production,
+    pool_size=settings.analysis_db_pool_size,
+    max_overflow=0,
+    pool_timeout=settings.analysis_db_pool_timeout,
+    pool_pre_ping=True,
+)
+
+analysis_session = async_sessionmaker(analysis_engine, class_=AsyncSession, expire_on_commit=False)
+
 
 async def get_db() -> AsyncSession:
     """FastAPI dependency – yields a database session."""
@@ -26,3 +48,15 @@ async def get_db() -> AsyncSession:
             yield session
         finally:
             await session.close()
+
+
+def _pool_stats(attr: str) -> list[tuple[dict, float]]:
+    return [
+        ({"pool": name}, getattr(eng.pool, attr)())
+        for name, eng in (("interactive", engine), ("analysis", analysis_engine))
+    ]
+
+
+Gauge("db_pool_checked_out", "Connections currently checked out, by pool", fn=lambda: _pool_stats("checkedout"))
+Gauge("db_pool_size", "Configured persistent connections, by pool", fn=lambda: _pool_stats("size"))
+Gauge("db_pool_overflow", "Overflow connections in use (negative while below pool size), by pool", fn=lambda: _pool_stats("overflow"))
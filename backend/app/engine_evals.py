@@ -0,0 +1,323 @@
+"""
+Engine evaluations – per-ply Stockfish output for a game.
+
+The engine pass is separated from per-player classification so the same
+evaluations can be shared: a game imported by both of its players (same
+movetext) is searched once, and each user's GameAnalysis, move qualities and
+puzzles are derived from the stored plies by `derive_game_analysis`.
+
+Each ply is a small dict:
+    cp    – eval after the move, White POV, clamped to ±1500
+    mate  – mate distance after the move (White POV) or None
+    pre   – True once the pre-move multipv=2 search has been done
+    best  – best move (UCI) in the position before the move
+    gap   – best vs second-best gap in cp, side-to-move POV
+    sol   – puzzle solution line (UCI list) from the position before the move
+    src   – "pgn" when cp/mate came from the game's own [%eval] annotations
+            (kept per run; the shared row only stores engine evaluations)
+Imported games that already carry complete [%eval] annotations (Lichess
+server analysis, annotated uploads) skip the post-move searches entirely.
+Pre-move data is only searched for the sides that need it; the other
+player's perspective fills in the rest on their own analysis run.
+
+Engines are started with `open_engine(profile)` (threads / hash / NNUE /
+move overhead from Settings.engine_profiles). Every search for one game
+passes the same `game` key, so python-chess sends `ucinewgame` when the
+next game starts and not between plies (without a key it is only sent on
+an engine's first search, and one game's hash entries leak into the next).
+Routes, the worker and scripts wrap the engine in
+app.engine_supervisor.SupervisedEngine (restarts, per-search time caps).
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Optional
+
+import chess
+import chess.engine
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.analysis_core import Mainline, annotated_evals, compute_solution_line
+from app.config import EngineProfile, get_settings
+from app.db.models import GameEngineEval
+from app.metrics import ENGINE_NODES, ENGINE_SEARCH_SECONDS, ENGINE_SEARCHES, PLIES_REUSED
+
+
+def new_plies(pgn_game) -> list[dict]:
+    """Empty per-ply records for every mainline move."""
+    return [{} for _ in pgn_game.mainline_moves()]
+
+
+def seed_from_annotations(pgn_game, plies: list[dict]) -> int:
+    """
+    Fill post-move evals from embedded [%eval] annotations when the PGN is
+    fully annotated and no ply has been evaluated yet (never mix sources
+    within a game). Returns the number of plies seeded.
+    """
+    if any("cp" in ply for ply in plies):
+        return 0
+    evals = pgn_game.evals if isinstance(pgn_game, Mainline) else annotated_evals(pgn_game)
+    if evals is None or len(evals) != len(plies):
+        return 0
+    seeded = 0
+    for ply, ev in zip(plies, evals):
+        if ev is not None:
+            ply["cp"], ply["mate"] = ev
+            ply["src"] = "pgn"
+            seeded += 1
+    return seeded
+
+
+def engine_options(engine: chess.engine.UciProtocol, profile: EngineProfile) -> dict:
+    """The profile as UCI options, limited to the ones this engine exposes."""
+    wanted = {
+        "Threads": profile.threads,
+        "Hash": profile.hash_mb,
+        "Move Overhead": profile.move_overhead_ms,
+        "Use NNUE": profile.nnue,  # gone in Stockfish 16+, where NNUE is always on
+    }
+    return {name: value for name, value in wanted.items() if name in engine.options}
+
+
+async def open_engine(profile: str = "interactive", *, path: Optional[str] = None, **overrides):
+    """
+    Start Stockfish with a named profile from Settings.engine_profiles.
+    Keyword overrides replace profile fields (None = keep the profile's).
+    """
+    settings = get_settings()
+    options = settings.engine_profile(profile).model_copy(
+        update={k: v for k, v in overrides.items() if v is not None}
+    )
+    transport, engine = await chess.engine.popen_uci(path or settings.stockfish_path)
+    try:
+        await engine.configure(engine_options(engine, options))
+    except BaseException:
+        await close_engine(transport, engine)
+        raise
+    return transport, engine
+
+
+async def _search(engine: chess.engine.UciProtocol, board: chess.Board, depth: int, kind: str, **kwargs):
+    """`engine.analyse` with search count, wait time and node metrics recorded under `kind`."""
+    with ENGINE_SEARCH_SECONDS.time(kind=kind):
+        info = await engine.analyse(board, chess.engine.Limit(depth=depth), **kwargs)
+    ENGINE_SEARCHES.inc(kind=kind)
+    first = info[0] if isinstance(info, list) and info else info
+    if isinstance(first, dict) and first.get("nodes"):
+        ENGINE_NODES.inc(first["nodes"])
+    return info
+
+
+def _gap_cp(pov) -> int:
+    if pov.is_mate():
+        return 10000 if (pov.mate() or 0) > 0 else -10000
+    return pov.score() or 0
+
+
+async def evaluate_game(
+    engine: chess.engine.UciProtocol,
+    pgn_game,
+    plies: list[dict],
+    depth: int,
+    player_color: str,
+    game_key: object = None,
+) -> bool:
+    """
+    Fill in missing engine data for `plies` in place.
+
+    Every ply gets a post-move evaluation (taken from the PGN's [%eval]
+    annotations when complete); plies played by `player_color` also get the
+    pre-move multipv=2 search (best move + second-best gap).
+    `game_key` identifies the game to the engine (defaults to `pgn_game`);
+    pass the same key to ensure_solution_lines to keep the hash warm.
+    Returns True if the engine was queried at all.
+    """
+    game_key = pgn_game if game_key is None else game_key
+    seed_from_annotations(pgn_game, plies)
+    PLIES_REUSED.inc(sum(1 for ply in plies if "cp" in ply))
+    board = pgn_game.board()
+    used_engine = False
+
+    for ply, move in zip(plies, pgn_game.mainline_moves()):
+        mv_color = "white" if board.turn == chess.WHITE else "black"
+
+        if mv_color == player_color and not ply.get("pre"):
+            multi_info = await _search(
+                engine, board, depth, "pre",
+                multipv=2, info=chess.engine.INFO_ALL, game=game_key,
+            )
+            used_engine = True
+            pre_info = multi_info[0] if multi_info else {}
+            pv = pre_info.get("pv")
+            ply["best"] = pv[0].uci() if pv else None
+            ply["gap"] = None
+
+            # Gap between best and 2nd-best move for puzzle quality filtering
+            if len(multi_info) >= 2:
+                s1 = multi_info[0].get("score")
+                s2 = multi_info[1].get("score")
+                if s1 and s2:
+                    ply["gap"] = _gap_cp(s1.pov(board.turn)) - _gap_cp(s2.pov(board.turn))
+            ply["pre"] = True
+
+        board.push(move)
+
+        if "cp" not in ply:
+            info = await _search(engine, board, depth, "post", game=game_key)
+            used_engine = True
+            score = info.get("score")
+            score_cp = 0
+            mate_in = None
+            if score:
+                pov = score.pov(chess.WHITE)
+                if pov.is_mate():
+                    mate_in = pov.mate()
+                    score_cp = 1500 if (mate_in and mate_in > 0) else -1500
+                else:
+                    score_cp = max(-1500, min(1500, pov.score() or 0))
+            ply["cp"] = score_cp
+            ply["mate"] = mate_in
+
+    return used_engine
+
+
+async def ensure_solution_lines(
+    engine: chess.engine.UciProtocol,
+    plies: list[dict],
+    puzzle_candidates: list[tuple[int, dict]],
+    depth: int,
+    game_key: object = None,
+) -> bool:
+    """
+    Attach multi-move solution lines to puzzle candidates, computing only the
+    ones not already stored on the ply. Returns True if the engine was used.
+    """
+    used_engine = False
+    for ply_index, puzzle_data in puzzle_candidates:
+        ply = plies[ply_index]
+        if ply.get("sol") is None:
+            with ENGINE_SEARCH_SECONDS.time(kind="solution"):
+                ply["sol"] = await compute_solution_line(
+                    puzzle_data["fen"], engine, depth=depth, max_moves=6, game=game_key
+                )
+            ENGINE_SEARCHES.inc(kind="solution")
+            used_engine = True
+        puzzle_data["solution_line"] = list(ply["sol"])
+    return used_engine
+
+
+async def close_engine(transport, engine: chess.engine.UciProtocol, timeout: float = 2.0) -> None:
+    """
+    Quit the engine, killing the process if it doesn't exit promptly (e.g.
+    right after a cancelled search). Never raises.
+    """
+    try:
+        await asyncio.wait_for(engine.quit(), timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError, chess.engine.EngineError, OSError):
+        transport.close()
+
+
+# ═══════════════════════════════════════════════════════════
+# Shared storage (one row per canonical game)
+# ═══════════════════════════════════════════════════════════
+
+
+async def _get_row(
+    db: AsyncSession, movetext_key: str, depth: int, for_update: bool = False
+) -> Optional[GameEngineEval]:
+    query = select(GameEngineEval).where(
+        GameEngineEval.movetext_hash == movetext_key,
+        GameEngineEval.depth == depth,
+    )
+    if for_update:
+        query = query.with_for_update().execution_options(populate_existing=True)
+    result = await db.execute(query)
+    return result.scalar_one_or_none()
+
+
+async def load_shared_plies(
+    db: AsyncSession, movetext_key: str, pgn_game, depth: int
+) -> list[dict]:
+    """Return stored plies for this movetext at `depth`, or a fresh empty set."""
+    row = await _get_row(db, movetext_key, depth)
+    plies = new_plies(pgn_game)
+    if row is None or len(row.plies or []) != len(plies):
+        return plies
+    return _engine_only(row.plies)
+
+
+def _engine_only(plies: list[dict]) -> list[dict]:
+    """
+    Copies of `plies` without evaluations seeded from [%eval] annotations.
+    The row is keyed by movetext and depth only, so annotation values would
+    otherwise be served to other users as depth-N Stockfish results; the
+    annotating user's own runs seed them again from their PGN.
+    """
+    out = []
+    for ply in plies:
+        ply = dict(ply)
+        if ply.get("src") == "pgn":
+            for key in ("cp", "mate", "src"):
+                ply.pop(key, None)
+        out.append(ply)
+    return out
+
+
+def _merge_plies(existing: list[dict], fresh: list[dict]) -> list[dict]:
+    """Union of two ply lists: keep whatever either side has already searched."""
+    merged = []
+    for old, new in zip(existing, fresh):
+        ply = {**new, **old}
+        if new.get("pre") and not old.get("pre"):
+            ply.update(pre=True, best=new.get("best"), gap=new.get("gap"))
+        if ply.get("sol") is None and new.get("sol") is not None:
+            ply["sol"] = new["sol"]
+        merged.append(ply)
+    return merged
+
+
+async def save_shared_plies(
+    db: AsyncSession,
+    movetext_key: str,
+    depth: int,
+    plies: list[dict],
+    platform: Optional[str] = None,
+    platform_game_id: Optional[str] = None,
+) -> None:
+    """
+    Upsert the shared evaluation row with engine results only (evals seeded
+    from annotations are dropped, see `_engine_only`). Plies already stored
+    are merged so concurrent runs from both players' sides don't drop each
+    other's pre-move searches: the row is locked before merging (and
+    inserted with ON CONFLICT DO NOTHING first when missing, so two first
+    writers end up merging too). Caller commits, which releases the lock.
+    """
+    plies = _engine_only(plies)
+    row = await _get_row(db, movetext_key, depth, for_update=True)
+    if row is None:
+        inserted = await db.execute(
+            pg_insert(GameEngineEval)
+            .values(
+                movetext_hash=movetext_key,
+                platform=platform,
+                platform_game_id=platform_game_id,
+                depth=depth,
+                plies=plies,
+            )
+            .on_conflict_do_nothing(index_elements=[GameEngineEval.movetext_hash, GameEngineEval.depth])
+            .returning(GameEngineEval.id)
+        )
+        if inserted.scalar_one_or_none() is not None:
+            return
+        row = await _get_row(db, movetext_key, depth, for_update=True)  # lost the insert race
+
+    if len(row.plies or []) == len(plies):
+        plies = _merge_plies(_engine_only(row.plies), plies)
+    await db.execute(
+        update(GameEngineEval)
+        .where(GameEngineEval.id == row.id)
+        .values(plies=plies, updated_at=func.now())
+    )
@@ -0,0 +1,510 @@
+"""
+Engine service – one host-wide Stockfish pool shared by every backend process.
+
+Without it each uvicorn worker, arq worker and script starts its own
+Stockfish per request, so the engine count on a host grows with the number
+of processes and nothing enforces a machine-wide CPU budget. The service is
+a separate process that owns a fixed pool of supervised engines (one per
+core by default) and serves searches over a UNIX socket:
+
+    python -m app.engine_service --socket /run/chess/engine.sock [--engines 8]
+
+and every process that has ENGINE_SERVICE_SOCKET set sends its searches
+there instead of starting engines. Routes and scripts don't care which
+they get: `start_engine(profile, pipeline, priority=...)` returns a local
+SupervisedEngine or a RemoteEngine, both with the `analyse(board, limit,
+multipv=..., game=...)` / `close()` surface the analysis code uses.
+
+Protocol: one JSON object per line in each direction, requests tagged with
+an `id` so one connection carries many concurrent searches.
+
+    → {"id": 7, "op": "analyse", "priority": 1, "positions": [
+          {"fen": <root FEN>, "moves": [uci, ...], "game": "..."}],
+       "limit": {"depth": 14, "time": 5.0}, "multipv": 2}
+    ← {"id": 7, "results": [[info, ...]]}        (or {"id": 7, "error": "..."})
+    → {"id": 7, "op": "cancel"}
+    → {"id": 8, "op": "stats"}
+
+Queued searches run in priority order (PRIORITY_PAID < USER < ANONYMOUS
+from app.admission, then PRIORITY_BATCH < PRIORITY_BACKGROUND), then
+arrival order. Waiting `engine_service_aging_s` moves a search up one
+class, so background work is slowed by interactive load but never starved.
+A multi-position request (`analyse_many`) is queued as independent
+searches so several engines can work on it at once. Closing the
+connection cancels everything it queued.
+
+Searches with a `game` key stick to one engine while that game has queued
+or running searches: python-chess sends `ucinewgame` (clearing the hash)
+whenever an engine's game key changes, so spreading a game's plies over the
+pool, interleaved with other clients' games, would clear it before almost
+every search. A keyed game therefore runs its searches one at a time on
+its engine; parallelism comes from concurrent games and unkeyed searches.
+The `new_games` stat counts searches that started a new game on their
+engine, i.e. `ucinewgame`s sent.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import signal
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+import chess
+import chess.engine
+
+from app.admission import PRIORITY_ANONYMOUS
+from app.config import get_settings
+from app.engine_supervisor import EngineUnavailable, SupervisedEngine
+
+logger = logging.getLogger(__name__)
+
+# Bulk analysis jobs, then work nobody is waiting on (puzzle generation,
+# re-analysis): both behind every interactive request
+PRIORITY_BATCH = PRIORITY_ANONYMOUS + 1
+PRIORITY_BACKGROUND = PRIORITY_BATCH + 1
+
+_INFO_FIELDS = ("depth", "seldepth", "multipv", "nodes", "nps", "time", "tbhits", "hashfull")
+
+
+# ═══════════════════════════════════════════════════════════
+# Wire format
+# ═══════════════════════════════════════════════════════════
+
+
+def _encode_board(board: chess.Board, game: Any) -> dict:
+    """Root FEN plus the move stack, so the engine still sees repetitions."""
+    return {
+        "fen": board.root().fen(),
+        "moves": [move.uci() for move in board.move_stack],
+        "game": game,
+    }
+
+
+def _decode_board(position: dict) -> chess.Board:
+    board = chess.Board(position["fen"])
+    for uci in position.get("moves", ()):
+        board.push_uci(uci)
+    return board
+
+
+def _encode_limit(limit: chess.engine.Limit) -> dict:
+    return {k: v for k, v in (("depth", limit.depth), ("time", limit.time), ("nodes", limit.nodes)) if v is not None}
+
+
+def _encode_info(info: dict) -> dict:
+    out = {k: info[k] for k in _INFO_FIELDS if k in info}
+    score = info.get("score")
+    if score is not None:
+        white = score.white()
+        out["mate" if white.is_mate() else "cp"] = white.mate() if white.is_mate() else white.score()
+    if "pv" in info:
+        out["pv"] = [move.uci() for move in info["pv"]]
+    return out
+
+
+def _decode_info(data: dict) -> dict:
+    info = {k: data[k] for k in _INFO_FIELDS if k in data}
+    if "mate" in data:
+        info["score"] = chess.engine.PovScore(chess.engine.Mate(data["mate"]), chess.WHITE)
+    elif "cp" in data:
+        info["score"] = chess.engine.PovScore(chess.engine.Cp(data["cp"]), chess.WHITE)
+    if "pv" in data:
+        info["pv"] = [chess.Move.from_uci(uci) for uci in data["pv"]]
+    return info
+
+
+# ═══════════════════════════════════════════════════════════
+# Server
+# ═══════════════════════════════════════════════════════════
+
+
+@dataclass(eq=False)
+class _Job:
+    priority: int
+    seq: int
+    position: dict
+    limit: chess.engine.Limit
+    multipv: Optional[int]
+    result: asyncio.Future
+    queued_at: float = field(default_factory=time.monotonic)
+    running: Optional[asyncio.Future] = None
+
+    @property
+    def game(self) -> Any:
+        return self.position.get("game")
+
+
+class EngineServer:
+    def __init__(self, profile: str, engines: int, **overrides):
+        self.profile = profile
+        self.size = engines
+        self.overrides = overrides  # SupervisedEngine options (path, threads, …)
+        self.engines: list[SupervisedEngine] = []
+        self._running: set[_Job] = set()
+        self.aging_s = get_settings().engine_service_aging_s
+        self._waiting: list[_Job] = []
+        self._job_added = asyncio.Event()
+        self._seq = itertools.count()
+        # game key -> index of the engine it is pinned to, and its queued + running searches
+        self._game_engine: dict[Any, int] = {}
+        self._game_jobs: Counter = Counter()
+        # per engine: (game key, restart count) of its last search, to count ucinewgame
+        self._engine_game: list[Optional[tuple[Any, int]]] = []
+        self.new_games = 0
+
+    async def start(self) -> None:
+        self.engines = [
+            await SupervisedEngine.start(self.profile, pipeline="service", **self.overrides) for _ in range(self.size)
+        ]
+        self._engine_game = [None] * len(self.engines)
+        self._workers = [asyncio.create_task(self._run_engine(i, engine)) for i, engine in enumerate(self.engines)]
+
+    async def close(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        await asyncio.gather(*(engine.close() for engine in self.engines))
+
+    def stats(self) -> dict:
+        return {
+            "engines": len(self.engines),
+            "busy": len(self._running),
+            "queued": len(self._waiting),
+            # searches someone is waiting on, queued or running (app/reanalysis.py backs off)
+            "interactive": sum(
+                1 for job in (*self._waiting, *self._running)
+                if job.priority < PRIORITY_BATCH and not job.result.done()
+            ),
+            "restarts": sum(engine.restarts for engine in self.engines),
+            "games": len(self._game_engine),
+            "new_games": self.new_games,
+        }
+
+    def submit(self, priority: int, position: dict, limit: chess.engine.Limit, multipv: Optional[int]) -> _Job:
+        job = _Job(priority, next(self._seq), position, limit, multipv, asyncio.get_running_loop().create_future())
+        if job.game is not None:
+            self._game_jobs[job.game] += 1
+        self._waiting.append(job)
+        self._job_added.set()
+        return job
+
+    def _release(self, job: _Job) -> None:
+        """A job left the queue for good (finished or cancelled): unpin its game once idle."""
+        if job.game is None:
+            return
+        self._game_jobs[job.game] -= 1
+        if self._game_jobs[job.game] <= 0:
+            del self._game_jobs[job.game]
+            self._game_engine.pop(job.game, None)
+
+    async def _next_job(self, index: int) -> _Job:
+        """
+        Best waiting job engine `index` may take (unkeyed, or its game is
+        unpinned or pinned here): lowest priority class after aging, then the
+        engine's current game, then oldest.
+        """
+        while True:
+            waiting = []
+            for job in self._waiting:
+                if job.result.done():
+                    self._release(job)  # cancelled while queued
+                else:
+                    waiting.append(job)
+            self._waiting = waiting
+            eligible = [job for job in waiting if self._game_engine.get(job.game, index) == index]
+            if eligible:
+                now = time.monotonic()
+                current = (self._engine_game[index] or (None,))[0]
+                job = min(eligible, key=lambda j: (
+                    j.priority - int((now - j.queued_at) // self.aging_s),
+                    current is None or j.game != current,  # within a class, stay on the current game
+                    j.seq,
+                ))
+                self._waiting.remove(job)
+                if job.game is not None:
+                    self._game_engine[job.game] = index
+                return job
+            self._job_added.clear()
+            await self._job_added.wait()
+
+    @staticmethod
+    def cancel(job: _Job) -> None:
+        """Drop a queued job, or stop its search if it is already running."""
+        if job.running is not None:
+            job.running.cancel()
+        if not job.result.done():
+            job.result.cancel()
+
+    async def _run_engine(self, index: int, engine: SupervisedEngine) -> None:
+        while True:
+            job = await self._next_job(index)
+            board = _decode_board(job.position)
+            # Same test as python-chess: first search on a (re)started engine or a new game key
+            last = self._engine_game[index]
+            if last is None or last != (job.game, engine.restarts):
+                self.new_games += 1
+            job.running = asyncio.ensure_future(engine.analyse(
+                board, job.limit, multipv=job.multipv or 1, game=job.game,
+            ))
+            self._running.add(job)
+            try:
+                await asyncio.wait({job.running})
+            finally:
+                self._running.discard(job)
+                self._engine_game[index] = (job.game, engine.restarts)
+                self._release(job)
+            if job.result.done() or job.running.cancelled():
+                continue
+            error = job.running.exception()
+            if error is not None:
+                job.result.set_exception(error)
+            else:
+                job.result.set_result([_encode_info(info) for info in job.running.result()])
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        jobs: dict[Any, list[_Job]] = {}
+        answers: set[asyncio.Task] = set()
+        write_lock = asyncio.Lock()
+
+        async def reply(message: dict) -> None:
+            async with write_lock:
+                try:
+                    writer.write(json.dumps(message).encode() + b"\n")
+                    await writer.drain()
+                except ConnectionError:
+                    pass  # client gone; its jobs are cancelled below
+
+        async def answer(request_id, request_jobs: list[_Job]) -> None:
+            results = await asyncio.gather(*(job.result for job in request_jobs), return_exceptions=True)
+            jobs.pop(request_id, None)
+            if any(isinstance(r, asyncio.CancelledError) for r in results):
+                return
+            error = next((r for r in results if isinstance(r, BaseException)), None)
+            if error is not None:
+                await reply({"id": request_id, "error": str(error)[:300]})
+            else:
+                await reply({"id": request_id, "results": results})
+
+        try:
+            while line := await reader.readline():
+                request = json.loads(line)
+                request_id, op = request.get("id"), request.get("op")
+                if op == "analyse":
+                    limit = chess.engine.Limit(**request.get("limit", {}))
+                    priority = int(request.get("priority", PRIORITY_BATCH))
+                    jobs[request_id] = [
+                        self.submit(priority, position, limit, request.get("multipv"))
+                        for position in request["positions"]
+                    ]
+                    task = asyncio.create_task(answer(request_id, jobs[request_id]))
+                    answers.add(task)
+                    task.add_done_callback(answers.discard)
+                elif op == "cancel":
+                    for job in jobs.pop(request_id, ()):
+                        self.cancel(job)
+                elif op == "stats":
+                    await reply({"id": request_id, "stats": self.stats()})
+                else:
+                    await reply({"id": request_id, "error": f"unknown op {op!r}"})
+        except (ConnectionError, ValueError) as e:
+            logger.warning("Engine service client dropped: %r", e)
+        finally:
+            for request_jobs in jobs.values():
+                for job in request_jobs:
+                    self.cancel(job)
+            writer.close()
+
+
+async def serve(socket_path: str, profile: str, engines: int) -> None:
+    server = EngineServer(profile, engines)
+    await server.start()
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    unix_server = await asyncio.start_unix_server(server.handle_client, path=socket_path, limit=2 ** 22)
+    os.chmod(socket_path, 0o660)
+    print(f"♟️  Engine service: {engines} × {profile} engines on {socket_path}", flush=True)
+    stop = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        asyncio.get_running_loop().add_signal_handler(sig, stop.set)
+    try:
+        async with unix_server:
+            await stop.wait()
+    finally:
+        await server.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+# ═══════════════════════════════════════════════════════════
+# Client
+# ═══════════════════════════════════════════════════════════
+
+
+class EngineServiceClient:
+    """One multiplexed connection to the service per process (and event loop)."""
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self._ids = itertools.count(1)
+        self._pending: dict[int, asyncio.Future] = {}
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._connecting = asyncio.Lock()
+
+    async def connect(self) -> asyncio.StreamWriter:
+        async with self._connecting:
+            if self._writer is None or self._writer.is_closing():
+                try:
+                    reader, self._writer = await asyncio.open_unix_connection(self.socket_path, limit=2 ** 22)
+                except OSError as e:
+                    raise EngineUnavailable(f"Engine service not reachable at {self.socket_path}: {e}") from e
+                self._reader_task = asyncio.create_task(self._read_replies(reader))
+            return self._writer
+
+    async def _read_replies(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while line := await reader.readline():
+                message = json.loads(line)
+                future = self._pending.pop(message.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(message)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self._writer = None
+            pending, self._pending = self._pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(EngineUnavailable("Lost connection to the engine service"))
+
+    async def _send(self, message: dict) -> None:
+        writer = await self.connect()
+        writer.write(json.dumps(message).encode() + b"\n")
+        await writer.drain()
+
+    async def call(self, op: str, **payload) -> dict:
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            await self._send({"id": request_id, "op": op, **payload})
+            message = await future
+        except asyncio.CancelledError:
+            self._pending.pop(request_id, None)
+            if self._writer is not None and not self._writer.is_closing():
+                self._writer.write(json.dumps({"id": request_id, "op": "cancel"}).encode() + b"\n")
+            raise
+        if "error" in message:
+            raise EngineUnavailable(message["error"])
+        return message
+
+    async def stats(self) -> dict:
+        return (await self.call("stats"))["stats"]
+
+
+_client: Optional[EngineServiceClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_engine_service_client() -> EngineServiceClient:
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        _client, _client_loop = EngineServiceClient(get_settings().engine_service_socket), loop
+    return _client
+
+
+class RemoteEngine:
+    """
+    Stand-in for a local engine that searches on the engine service. The
+    requesting profile's time cap still applies; threads / hash are the
+    service's own.
+    """
+
+    def __init__(self, client: EngineServiceClient, profile: str, priority: int):
+        self.client = client
+        self.priority = priority
+        self.search_time = get_settings().engine_profile(profile).search_time_s
+        self.restarts = 0
+
+    def _limit(self, limit: chess.engine.Limit) -> dict:
+        wire = _encode_limit(limit)
+        wire["time"] = min(wire.get("time", self.search_time), self.search_time)
+        return wire
+
+    @staticmethod
+    def _game(game: Any) -> Optional[str]:
+        """Game keys must survive JSON and not collide across processes."""
+        if game is None:
+            return None
+        key = game if isinstance(game, (str, int)) else id(game)
+        return f"{os.getpid()}:{key}"
+
+    async def analyse_many(
+        self, boards: list[chess.Board], limit: chess.engine.Limit, *, multipv: Optional[int] = None, game: Any = None,
+    ) -> list:
+        """
+        Search several positions at once; results in input order. Unkeyed
+        positions spread over the pool, a game's stay on its engine.
+        """
+        game = self._game(game)
+        message = await self.client.call(
+            "analyse",
+            priority=self.priority,
+            positions=[_encode_board(board, game) for board in boards],
+            limit=self._limit(limit),
+            multipv=multipv,
+        )
+        results = [[_decode_info(info) for info in infos] for infos in message["results"]]
+        return results if multipv is not None else [infos[0] if infos else {} for infos in results]
+
+    async def analyse(
+        self, board: chess.Board, limit: chess.engine.Limit, *, multipv: Optional[int] = None, game: Any = None, **kwargs,
+    ):
+        """Same return shape as `UciProtocol.analyse`: a list with multipv, else one info dict."""
+        return (await self.analyse_many([board], limit, multipv=multipv, game=game))[0]
+
+    async def close(self) -> None:
+        """Nothing to release: the connection is shared by the whole process."""
+
+
+async def start_engine(profile: str, pipeline: str, *, priority: int = PRIORITY_BATCH, **overrides):
+    """
+    Engine for one analysis run: a RemoteEngine when ENGINE_SERVICE_SOCKET
+    is set, otherwise a local SupervisedEngine (`overrides` – path, threads,
+    hash_mb… – only apply to local engines).
+    """
+    if get_settings().engine_service_socket:
+        client = get_engine_service_client()
+        await client.connect()  # fail fast if the service is down
+        return RemoteEngine(client, profile, priority)
+    return await SupervisedEngine.start(profile, pipeline=pipeline, **overrides)
+
+
+# ═══════════════════════════════════════════════════════════
+# Entry point
+# ═══════════════════════════════════════════════════════════
+
+
+def main() -> None:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Host-wide Stockfish pool served over a UNIX socket")
+    parser.add_argument("--socket", default=settings.engine_service_socket or "/tmp/chess-analyzer-engine.sock")
+    parser.add_argument("--profile", default=settings.engine_service_profile)
+    parser.add_argument("--engines", type=int, default=settings.engine_service_engines,
+                        help="pool size (default: cores / profile threads)")
+    args = parser.parse_args()
+    engines = args.engines or max(1, (os.cpu_count() or 1) // settings.engine_profile(args.profile).threads)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(serve(args.socket, args.profile, engines))
+
+
+if __name__ == "__main__":
+    main()
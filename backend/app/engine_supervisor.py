@@ -0,0 +1,152 @@
+"""
+Engine supervisor – keeps a Stockfish process alive for the length of a run.
+
+A crashed or wedged engine used to poison everything after it: the sync
+route reported `game_error` for every remaining game, anonymous analysis
+aborted the stream and the worker failed the whole job. `SupervisedEngine`
+stands in for the python-chess protocol object (it only needs `analyse`,
+which is all evaluate_game / compute_solution_line call) and:
+
+    - caps every search by wall clock: the profile's `search_time_s` is sent
+      as UCI `movetime` next to the depth, so pathological positions return
+      a shallower result instead of pinning a core
+    - treats a search still running `engine_hang_grace_s` past that cap as a
+      hung engine; it and dead processes / protocol errors get the process
+      killed, a fresh one started and the same position searched again
+    - gives up on a search after `engine_search_retries` restarts with
+      EngineUnavailable, leaving the next search to start a new engine
+
+Restarts, hangs and capped searches show up on /metrics as
+`engine_restarts_total` and `engine_search_timeouts_total`.
+
+    engine = await SupervisedEngine.start("batch", pipeline="worker")
+    try:
+        info = await engine.analyse(board, chess.engine.Limit(depth=14), game=game_id)
+    finally:
+        await engine.close()
+"""
+
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import logging
+from typing import Optional
+
+import chess
+import chess.engine
+
+from app.config import get_settings
+from app.engine_evals import close_engine, open_engine
+from app.metrics import ENGINE_RESTARTS, ENGINE_SEARCH_TIMEOUTS, ENGINE_STARTS
+
+logger = logging.getLogger(__name__)
+
+
+class EngineUnavailable(Exception):
+    """A search kept failing after every allowed engine restart."""
+
+
+class SupervisedEngine:
+    def __init__(self, profile: str, pipeline: str, *, path: Optional[str] = None, **overrides):
+        settings = get_settings()
+        self.profile = profile
+        self.pipeline = pipeline
+        self._path = path
+        self._overrides = overrides
+        self.search_time = overrides.get("search_time_s") or settings.engine_profile(profile).search_time_s
+        self.hang_grace = settings.engine_hang_grace_s
+        self.retries = settings.engine_search_retries
+        self.restarts = 0
+        self._transport = None
+        self._engine: Optional[chess.engine.UciProtocol] = None
+
+    @classmethod
+    async def start(cls, profile: str, pipeline: str, **kwargs) -> "SupervisedEngine":
+        """Create and start the first engine process (so startup errors surface here)."""
+        supervisor = cls(profile, pipeline, **kwargs)
+        await supervisor._ensure_engine()
+        return supervisor
+
+    async def _ensure_engine(self) -> chess.engine.UciProtocol:
+        if self._engine is None:
+            self._transport, self._engine = await open_engine(self.profile, path=self._path, **self._overrides)
+            ENGINE_STARTS.inc(pipeline=self.pipeline)
+        return self._engine
+
+    async def _discard(self) -> None:
+        """Kill the current process; the next search starts a new one."""
+        transport, engine = self._transport, self._engine
+        self._transport = self._engine = None
+        if engine is not None:
+            await close_engine(transport, engine, timeout=1.0)
+
+    def _capped(self, limit: chess.engine.Limit) -> chess.engine.Limit:
+        if limit.time is not None and limit.time <= self.search_time:
+            return limit
+        return dataclasses.replace(limit, time=self.search_time)
+
+    async def analyse(self, board: chess.Board, limit: chess.engine.Limit, **kwargs):
+        """`UciProtocol.analyse` with a time cap, hang detection and restart-and-retry."""
+        limit = self._capped(limit)
+        timeout = limit.time + self.hang_grace
+        last_error: Optional[BaseException] = None
+        for attempt in range(self.retries + 1):
+            engine = await self._ensure_engine()
+            try:
+                info = await self._search_or_kill(engine, board, limit, timeout, kwargs)
+            except asyncio.TimeoutError as e:
+                reason, last_error = "hang", e
+                ENGINE_SEARCH_TIMEOUTS.inc(pipeline=self.pipeline, kind="hung")
+            except (chess.engine.EngineTerminatedError, OSError) as e:
+                reason, last_error = "crash", e
+            except chess.engine.EngineError as e:
+                reason, last_error = "error", e
+            else:
+                self._record_capped(info, limit)
+                return info
+
+            logger.warning(
+                "Stockfish %s (%s, attempt %d/%d) on %s: %r",
+                reason, self.pipeline, attempt + 1, self.retries + 1, board.fen(), last_error,
+            )
+            ENGINE_RESTARTS.inc(pipeline=self.pipeline, reason=reason)
+            self.restarts += 1
+            await self._discard()
+
+        raise EngineUnavailable(
+            f"Stockfish failed {self.retries + 1} times on {board.fen()}: {last_error!r}"
+        ) from last_error
+
+    async def _search_or_kill(self, engine, board, limit, timeout: float, kwargs: dict):
+        """
+        Run one search; if it outlives `timeout`, kill the process and raise
+        TimeoutError. Killing (rather than cancelling the search) lets
+        python-chess fail the pending command cleanly with EngineTerminatedError.
+        """
+        search = asyncio.ensure_future(engine.analyse(board, limit, **kwargs))
+        try:
+            done, _ = await asyncio.wait({search}, timeout=timeout)
+        except asyncio.CancelledError:
+            search.cancel()  # caller went away (e.g. client disconnect): stop the search as before
+            raise
+        if not done:
+            self._transport.close()
+            await asyncio.gather(search, return_exceptions=True)
+            raise asyncio.TimeoutError()
+        return search.result()
+
+    def _record_capped(self, info, limit: chess.engine.Limit) -> None:
+        """Count searches that ran into the time cap before reaching the requested depth."""
+        first = info[0] if isinstance(info, list) and info else info
+        if limit.depth is None or not isinstance(first, dict):
+            return
+        if first.get("depth", limit.depth) < limit.depth and first.get("time", 0) >= limit.time * 0.9:
+            ENGINE_SEARCH_TIMEOUTS.inc(pipeline=self.pipeline, kind="capped")
+
+    async def close(self) -> None:
+        """Quit the engine (killing it if it doesn't exit promptly). Never raises."""
+        transport, engine = self._transport, self._engine
+        self._transport = self._engine = None
+        if engine is not None:
+            await close_engine(transport, engine)
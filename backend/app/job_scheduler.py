@@ -0,0 +1,192 @@
+"""
+Job scheduler – which background analysis job the worker runs next.
+
+`/analysis/start` used to hand arq a job that then ran start to finish, so
+a one-game request waited behind every 100-game job queued before it. Jobs
+now carry a priority class:
+
+    interactive  – a handful of specific games a user is waiting on
+    batch        – "analyse all my games" backfills
+    background   – system work nobody is watching (re-analysis, scripts)
+
+and the worker takes work from the analysis_jobs table rather than from arq
+order; its engine searches carry the matching ENGINE_PRIORITY. The pending
+job with the lowest effective rank is claimed first, where rank = class −
+time waited / `analysis_job_aging_s`, so batch and background work still
+get their turn under a steady interactive load.
+Users already at `analysis_jobs_per_user` processing jobs are skipped;
+jobs that stopped making progress (worker killed) are requeued after
+`analysis_job_stale_s` so they don't hold the cap forever.
+
+Jobs are analysed one game at a time. After each game `should_yield` checks
+whether a pending job now outranks the running one; if so the job goes back
+to the queue (`requeue`) with its remaining games, and the worker claims
+again – preemption at game boundaries. A job's total time spent pending is
+kept in `queue_wait_s` and reported by `/analysis/job/{id}` along with
+recent waits per class (`queue_wait_by_class`).
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import Float, case, cast, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.admission import PRIORITY_USER
+from app.config import get_settings
+from app.db.models import AnalysisJob
+from app.engine_service import PRIORITY_BACKGROUND, PRIORITY_BATCH
+from app.metrics import JOB_PREEMPTIONS, JOB_QUEUE_WAIT_SECONDS
+
+JOB_CLASSES = ("interactive", "batch", "background")
+_CLASS_RANK = {name: rank for rank, name in enumerate(JOB_CLASSES)}
+
+# Engine-pool priority for each class's searches (app/engine_service.py)
+ENGINE_PRIORITY = {
+    "interactive": PRIORITY_USER,
+    "batch": PRIORITY_BATCH,
+    "background": PRIORITY_BACKGROUND,
+}
+
+
+def job_class(job_type: str, total_games: int) -> str:
+    """Priority class for a new job."""
+    if job_type == "single_game" and total_games <= get_settings().interactive_job_max_games:
+        return "interactive"
+    if job_type == "background":
+        return "background"
+    return "batch"
+
+
+def _effective_rank():
+    """Class rank minus aging credit, as a SQL expression over AnalysisJob."""
+    class_rank = case(
+        *((AnalysisJob.priority_class == name, rank) for name, rank in _CLASS_RANK.items()),
+        else_=_CLASS_RANK["batch"],
+    )
+    waited = func.extract("epoch", func.now() - func.coalesce(AnalysisJob.queued_at, AnalysisJob.created_at))
+    return cast(class_rank, Float) - waited / get_settings().analysis_job_aging_s
+
+
+def _stale_before():
+    return func.now() - timedelta(seconds=get_settings().analysis_job_stale_s)
+
+
+def _users_at_cap(exclude_job_id: Optional[int] = None):
+    """Users already running as many jobs as they are allowed."""
+    query = select(AnalysisJob.user_id).where(
+        AnalysisJob.status == "processing", AnalysisJob.heartbeat_at >= _stale_before(),
+    )
+    if exclude_job_id is not None:
+        query = query.where(AnalysisJob.id != exclude_job_id)
+    return query.group_by(AnalysisJob.user_id).having(func.count() >= get_settings().analysis_jobs_per_user)
+
+
+def _waited_s(job: AnalysisJob) -> float:
+    since = job.queued_at or job.created_at
+    return max(0.0, (datetime.now(timezone.utc) - since).total_seconds()) if since else 0.0
+
+
+def queue_wait_s(job: AnalysisJob) -> float:
+    """Total time `job` has spent pending, including the current wait."""
+    return round((job.queue_wait_s or 0) + (_waited_s(job) if job.status == "pending" else 0), 1)
+
+
+async def requeue_stale_jobs(db: AsyncSession) -> int:
+    """Put processing jobs that stopped making progress back in the queue. Caller commits."""
+    result = await db.execute(
+        update(AnalysisJob)
+        .where(AnalysisJob.status == "processing", AnalysisJob.heartbeat_at < _stale_before())
+        .values(status="pending", queued_at=func.now())
+    )
+    return result.rowcount or 0
+
+
+async def claim_next_job(db: AsyncSession) -> Optional[AnalysisJob]:
+    """
+    Mark the best pending job as processing and return it (None when nothing
+    is claimable). SKIP LOCKED lets several workers claim concurrently; the
+    per-user cap is best-effort between them.
+    """
+    result = await db.execute(
+        select(AnalysisJob)
+        .where(AnalysisJob.status == "pending", AnalysisJob.user_id.not_in(_users_at_cap()))
+        .order_by(_effective_rank(), AnalysisJob.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    job = result.scalar_one_or_none()
+    if job is None:
+        return None
+    waited = _waited_s(job)
+    JOB_QUEUE_WAIT_SECONDS.observe(waited, priority_class=job.priority_class)
+    job.queue_wait_s = (job.queue_wait_s or 0) + waited
+    job.status = "processing"
+    job.started_at = job.started_at or datetime.now(timezone.utc)
+    job.heartbeat_at = func.now()
+    await db.commit()
+    return job
+
+
+async def should_yield(db: AsyncSession, job: AnalysisJob) -> bool:
+    """True if a claimable pending job outranks `job` (which has no aging credit while running)."""
+    result = await db.execute(
+        select(func.count())
+        .select_from(AnalysisJob)
+        .where(
+            AnalysisJob.status == "pending",
+            AnalysisJob.user_id.not_in(_users_at_cap(exclude_job_id=job.id)),
+            _effective_rank() < _CLASS_RANK.get(job.priority_class, _CLASS_RANK["batch"]),
+        )
+    )
+    return (result.scalar() or 0) > 0
+
+
+def requeue(job: AnalysisJob) -> None:
+    """Hand a preempted job back to the queue with its remaining games. Caller commits."""
+    JOB_PREEMPTIONS.inc(priority_class=job.priority_class)
+    job.status = "pending"
+    job.queued_at = func.now()
+
+
+async def active_user_jobs(db: AsyncSession) -> int:
+    """Pending or live processing jobs outside the background class (app/reanalysis.py yields to them)."""
+    result = await db.execute(
+        select(func.count())
+        .select_from(AnalysisJob)
+        .where(
+            AnalysisJob.priority_class != "background",
+            (AnalysisJob.status == "pending")
+            | ((AnalysisJob.status == "processing") & (AnalysisJob.heartbeat_at >= _stale_before())),
+        )
+    )
+    return result.scalar() or 0
+
+
+async def queue_wait_by_class(db: AsyncSession, window: timedelta = timedelta(hours=1)) -> dict[str, dict]:
+    """p50 / p95 queue wait of jobs started within `window`, and jobs waiting now, per class."""
+    out = {name: {"jobs": 0, "p50_s": None, "p95_s": None, "waiting": 0} for name in JOB_CLASSES}
+    started = await db.execute(
+        select(
+            AnalysisJob.priority_class,
+            func.count(),
+            func.percentile_cont(0.5).within_group(AnalysisJob.queue_wait_s),
+            func.percentile_cont(0.95).within_group(AnalysisJob.queue_wait_s),
+        )
+        .where(AnalysisJob.started_at >= datetime.now(timezone.utc) - window)
+        .group_by(AnalysisJob.priority_class)
+    )
+    for name, jobs, p50, p95 in started.all():
+        if name in out:
+            out[name].update(jobs=jobs, p50_s=round(p50, 1), p95_s=round(p95, 1))
+    waiting = await db.execute(
+        select(AnalysisJob.priority_class, func.count())
+        .where(AnalysisJob.status == "pending")
+        .group_by(AnalysisJob.priority_class)
+    )
+    for name, count in waiting.all():
+        if name in out:
+            out[name]["waiting"] = count
+    return out
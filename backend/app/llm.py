@@ -0,0 +1,105 @@
+"""
+OpenAI chat completions client – one-shot and streamed.
+
+`stream_chat_completion` yields content deltas as they arrive so routes can
+forward them over SSE; it raises `LLMError` unless the upstream stream runs
+to its final `[DONE]` marker, letting callers charge quota only for
+complete answers. The base URL comes from settings (`openai_base_url`), so
+scripts/openai_stub.py can stand in for the real API.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import AsyncIterator
+
+import httpx
+
+from app.config import get_settings
+
+
+class LLMError(Exception):
+    """Upstream failure: transport error, non-200 status or malformed payload."""
+
+    def __init__(self, detail: str):
+        super().__init__(detail)
+        self.detail = detail
+
+
+def _request(model: str, messages: list[dict], temperature: float, max_tokens: int, stream: bool) -> dict:
+    settings = get_settings()
+    return {
+        "url": f"{settings.openai_base_url}/chat/completions",
+        "headers": {
+            "Authorization": f"Bearer {settings.openai_api_key}",
+            "Content-Type": "application/json",
+        },
+        "json": {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            **({"stream": True} if stream else {}),
+        },
+    }
+
+
+async def chat_completion(
+    *,
+    model: str,
+    messages: list[dict],
+    temperature: float,
+    max_tokens: int,
+    timeout: float = 30,
+) -> str:
+    """Full completion text for `messages`."""
+    try:
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            resp = await client.post(**_request(model, messages, temperature, max_tokens, stream=False))
+    except httpx.HTTPError:
+        raise LLMError("AI service unavailable")
+
+    if resp.status_code != 200:
+        raise LLMError("AI service error")
+
+    try:
+        return resp.json()["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, ValueError):
+        raise LLMError("Unexpected AI response format")
+
+
+async def stream_chat_completion(
+    *,
+    model: str,
+    messages: list[dict],
+    temperature: float,
+    max_tokens: int,
+    timeout: float = 60,
+) -> AsyncIterator[str]:
+    """Yield content deltas; raises LLMError if the stream fails or ends early."""
+    finished = False
+    try:
+        async with httpx.AsyncClient(timeout=httpx.Timeout(timeout, connect=10)) as client:
+            async with client.stream(
+                "POST", **_request(model, messages, temperature, max_tokens, stream=True)
+            ) as resp:
+                if resp.status_code != 200:
+                    raise LLMError("AI service error")
+                async for line in resp.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        finished = True
+                        break
+                    try:
+                        delta = json.loads(data)["choices"][0]["delta"].get("content")
+                    except (KeyError, IndexError, ValueError, AttributeError):
+                        raise LLMError("Unexpected AI response format")
+                    if delta:
+                        yield delta
+    except httpx.HTTPError:
+        raise LLMError("AI service unavailable")
+
+    if not finished:
+        raise LLMError("AI response ended early")
@@ -4,6 +4,7 @@ Chess Analyzer Backend - FastAPI Application
 Main application factory with middleware, routes, and lifecycle events.
 """
 
+import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
@@ -12,7 +13,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import text
 
 from app.config import get_settings
-from app.db.session import engine, async_session
+from app.cpu_pool import monitor_loop_lag, shutdown_cpu_pool, warm_cpu_pool
+from app.db.session import analysis_engine, engine, async_session
 from app.db.models import Base
 from app.routes import games, analysis, puzzles, insights, users, webhooks, health, coach, anonymous, explanations, openings, patterns
 
@@ -35,10 +37,17 @@ async def lifespan(app: FastAPI):
         import logging
         logging.getLogger(__name__).warning(f"DB startup check failed: {e}")
 
+    # CPU pool for python-chess work, and loop-lag sampling for /metrics
+    await warm_cpu_pool()
+    lag_monitor = asyncio.create_task(monitor_loop_lag())
+
     yield
 
     # Cleanup
+    lag_monitor.cancel()
+    shutdown_cpu_pool()
     await engine.dispose()
+    await analysis_engine.dispose()
 
 
 def create_app() -> FastAPI:
@@ -0,0 +1,269 @@
+"""
+In-process metrics – counters, gauges and histograms in Prometheus text format.
+
+The analysis pipeline records where its time goes (engine wait, PGN parsing,
+classification, DB reads/writes, SSE delivery) and how much work it does
+(searches, nodes, cache hits, engine starts); `GET /metrics` on the health
+router renders everything for a Prometheus scrape. Values are per process –
+scrape every worker. Kept dependency-free: the exposition format is a few
+lines of text and the hot path only takes a lock and adds to a float.
+
+    with STAGE_SECONDS.time(pipeline="sync", stage="engine"):
+        await evaluate_game(...)
+    ENGINE_SEARCHES.inc(kind="pre")
+"""
+
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+LabelKey = tuple[tuple[str, str], ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _key(labels: dict) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(key: LabelKey, extra: tuple = ()) -> str:
+    pairs = [*key, *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, optionally split by labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self._values: dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_key(labels), 0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """
+    Current value. Either set explicitly or, with `fn`, read at scrape time
+    (e.g. queue depth straight from the admission controller). `fn` returns
+    a number, or a list of (labels, value) pairs for a labelled gauge.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Optional[Callable[[], float]] = None):
+        super().__init__(name, help)
+        self._fn = fn
+        self._values: dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def _samples(self) -> list[str]:
+        if self._fn is not None:
+            try:
+                value = self._fn()
+            except Exception:
+                return []
+            if isinstance(value, list):
+                return [f"{self.name}{_fmt_labels(_key(labels))} {_fmt_value(v)}" for labels, v in value]
+            return [f"{self.name} {_fmt_value(value)}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (seconds, by default buckets)."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [per-bucket counts..., +Inf count, sum]
+        self._values: dict[LabelKey, list[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[i] += 1
+            state[-1] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the wall time of the block (also when it raises or is cancelled)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        state = self._values.get(_key(labels))
+        return int(sum(state[:-1])) if state else 0
+
+    def total(self, **labels) -> float:
+        state = self._values.get(_key(labels))
+        return state[-1] if state else 0.0
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = []
+        for key, state in items:
+            cumulative = 0
+            for bound, n in zip((*self.buckets, float("inf")), state[:-1]):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_fmt_labels(key, (('le', _fmt_value(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_fmt_labels(key)} {_fmt_value(state[-1])}")
+            lines.append(f"{self.name}_count{_fmt_labels(key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        return "\n".join(m.render() for m in self._metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# ═══════════════════════════════════════════════════════════
+# Analysis pipeline metrics
+# ═══════════════════════════════════════════════════════════
+
+# pipeline: sync (/analysis/run) | anonymous | worker | reanalysis
+# stage: parse | load | engine | classify | save
+STAGE_SECONDS = Histogram(
+    "analysis_stage_seconds", "Wall time per analysis stage and game",
+)
+GAMES_ANALYZED = Counter(
+    "analysis_games_total", "Games processed by the analysis pipeline, by outcome",
+)
+ENGINE_SEARCHES = Counter(
+    "engine_searches_total", "Stockfish searches by kind (pre, post; solution counts whole lines)",
+)
+ENGINE_SEARCH_SECONDS = Histogram(
+    "engine_search_seconds", "Time spent waiting on a single Stockfish search",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+ENGINE_NODES = Counter(
+    "engine_nodes_total", "Nodes searched by Stockfish, as reported by the engine",
+)
+ENGINE_STARTS = Counter(
+    "engine_starts_total", "Stockfish processes started, by pipeline",
+)
+ENGINE_RESTARTS = Counter(
+    "engine_restarts_total", "Stockfish processes replaced by the supervisor, by pipeline and reason (crash, error, hang)",
+)
+ENGINE_SEARCH_TIMEOUTS = Counter(
+    "engine_search_timeouts_total", "Searches cut short by the wall-clock cap, by pipeline and kind (capped, hung)",
+)
+PLIES_REUSED = Counter(
+    "analysis_plies_reused_total", "Plies whose evaluation came from the shared store or PGN annotations",
+)
+CACHE_LOOKUPS = Counter(
+    "analysis_cache_lookups_total", "Result-cache lookups by cache and result (hit, miss)",
+)
+JOB_QUEUE_WAIT_SECONDS = Histogram(
+    "analysis_job_queue_wait_seconds", "Time a background analysis job waited before being claimed, by priority class",
+    buckets=(0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0),
+)
+JOB_PREEMPTIONS = Counter(
+    "analysis_job_preemptions_total", "Jobs handed back to the queue at a game boundary for more urgent work, by class",
+)
+REANALYSIS_PAUSES = Counter(
+    "reanalysis_pauses_total", "Background re-analysis stopped for interactive load or busy hours, by reason",
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "How late the event loop wakes a periodic timer (time other work held the loop)",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+SSE_SEND_SECONDS = Histogram(
+    "sse_send_seconds", "Time to hand one SSE event to the client connection",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0),
+)
+
+
+
+def _admission():
+    from app.admission import get_engine_admission
+    return get_engine_admission()
+
+
+ENGINE_SLOTS_ACTIVE = Gauge(
+    "engine_slots_active", "Engine slots currently held", fn=lambda: _admission().active_count,
+)
+ENGINE_QUEUE_DEPTH = Gauge(
+    "engine_queue_depth", "Requests waiting for an engine slot", fn=lambda: _admission().waiting_count,
+)
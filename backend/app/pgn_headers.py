@@ -0,0 +1,150 @@
+"""
+Header-only PGN access.
+
+`chess.pgn.read_game` builds the full move tree, which is wasted work when
+only the tag pairs are needed (player names for a listing, Site for import
+de-duplication, a game count before analysis). This module scans tags with a
+regex and stops at the first movetext line – unless the Result tag is missing
+or `*`, which read_game fills from the termination marker, so that case scans
+on for it. `LazyGame` wraps one game's text and only runs the real parser
+when `.game` is first touched.
+"""
+
+from __future__ import annotations
+
+import re
+from io import StringIO
+from typing import Iterator
+
+import chess.pgn
+
+# Same tag grammar as chess.pgn.TAG_REGEX, so tag values match read_game.
+_TAG_RE = re.compile(r'^\s*\[([A-Za-z0-9][A-Za-z0-9_+#=:-]*)\s+"([^\r]*)"\]\s*$')
+
+# Movetext tokens that matter for the result: comments and `%` lines (skipped
+# whole), variation brackets, termination markers, and what ends the game
+# (a blank line or a tag line, same as split_games).
+_RESULT_TOKEN_RE = re.compile(
+    r"\{[^}]*\}?|;[^\n]*|^%[^\n]*|[()]|(\n[ \t\r]*\n|^\[)|(?<![\w/-])(1-0|0-1|1/2-1/2|\*)(?![\w/-])",
+    re.MULTILINE,
+)
+
+# Stored games begin with their tag section; this many characters comfortably
+# covers it, so callers can fetch a prefix of moves_pgn instead of the column.
+HEADER_PREFIX_CHARS = 4096
+
+
+def read_headers(pgn_text: str) -> chess.pgn.Headers:
+    """
+    Tag pairs of the first game in `pgn_text`, without parsing movetext.
+    Like read_game, a missing or `*` Result is taken from the game's
+    termination marker, so only then is the movetext scanned.
+    """
+    headers = chess.pgn.Headers()
+    handle = StringIO(pgn_text)
+    for line in handle:
+        m = _TAG_RE.match(line)
+        if m:
+            headers[m.group(1)] = m.group(2)
+        elif line.strip() and not line.lstrip().startswith("%"):
+            if headers.get("Result", "*") == "*":
+                headers["Result"] = _movetext_result(line + handle.read())
+            break
+    return headers
+
+
+def _movetext_result(text: str) -> str:
+    """
+    First decisive termination marker of the game whose movetext starts
+    `text`, outside comments and variations; `*` if there is none.
+    """
+    if "1-0" not in text and "0-1" not in text and "1/2-1/2" not in text:
+        return "*"
+    depth = 0
+    for m in _RESULT_TOKEN_RE.finditer(text):
+        token = m.group(0)
+        if m.group(1):
+            break
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth = max(0, depth - 1)
+        elif depth == 0 and m.group(2) and token != "*":
+            return token
+    return "*"
+
+
+class LazyGame:
+    """One game's PGN text: headers scanned eagerly, moves parsed on demand."""
+
+    __slots__ = ("text", "headers", "_game")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.headers = read_headers(text)
+        self._game: chess.pgn.Game | None = None
+
+    @property
+    def game(self) -> chess.pgn.Game:
+        """The fully parsed game (parsed once, then reused)."""
+        if self._game is None:
+            self._game = chess.pgn.read_game(StringIO(self.text)) or chess.pgn.Game()
+        return self._game
+
+
+def _movetext_comment_state(line: str, in_comment: bool) -> bool:
+    """Whether a `{` comment is still open after `line` (`;` comments end at the newline)."""
+    for ch in line:
+        if in_comment:
+            in_comment = ch != "}"
+        elif ch == "{":
+            in_comment = True
+        elif ch == ";":
+            break
+    return in_comment
+
+
+def split_games(pgn_text: str) -> Iterator[str]:
+    """
+    Split multi-game PGN into per-game text at the same places
+    chess.pgn.read_game stops: a blank line after movetext (outside a brace
+    comment) ends a game – which also separates tagless games like
+    `1. e4 e5 1-0` – and a tag line starts a new one once the current game
+    has movetext. `;` runs to the end of the line, so a `{` inside it doesn't
+    open a comment; a line inside a multi-line brace comment is never
+    mistaken for a tag or a blank separator.
+    """
+    lines: list[str] = []
+    has_moves = False
+    in_comment = False
+
+    for line in pgn_text.splitlines():
+        if not in_comment:
+            if _TAG_RE.match(line):
+                if has_moves:
+                    yield "\n".join(lines)
+                    lines, has_moves = [], False
+                lines.append(line)
+                continue
+            if not line.strip():
+                if has_moves:
+                    yield "\n".join(lines)
+                    lines, has_moves = [], False
+                lines.append(line)
+                continue
+            if line.startswith("%"):
+                lines.append(line)
+                continue
+        if line.strip():
+            has_moves = True
+        in_comment = _movetext_comment_state(line, in_comment)
+        lines.append(line)
+
+    if has_moves or any(line.strip() for line in lines):
+        yield "\n".join(lines)
+
+
+def iter_games(pgn_text: str) -> Iterator[LazyGame]:
+    """LazyGame per game in a multi-game PGN string."""
+    for text in split_games(pgn_text):
+        yield LazyGame(text)
@@ -0,0 +1,390 @@
+"""
+Background re-analysis – brings old game analyses up to date on idle cores.
+
+Rows written by the worker's eval-only path (analysis_version NULL: no
+accuracy, FENs, best moves, win probabilities or puzzles), by an older
+pipeline (version below analysis_core.ANALYSIS_VERSION) or at a depth
+below `reanalysis_target_depth` stay degraded until the user re-runs
+analysis by hand. This process finds them and re-analyses them with the
+full pipeline (shared plies → derive_analysis → solution lines), users
+with the most recent imports first:
+
+    ENGINE_SERVICE_SOCKET=... python -m app.reanalysis [--once]
+
+It requires the engine service (app/engine_service.py). /analysis/run and
+anonymous analyses otherwise run local engines inside the web processes,
+whose admission state this process cannot see, so it would keep taking
+cores from live interactive streams. With the service every interactive
+search is queued in one place and shows up in its stats.
+
+It only runs while the host has capacity to spare:
+
+    - inside `reanalysis_offpeak_hours`, or while the 1-min load average per
+      core (less its own engine) is below `reanalysis_max_load`
+    - never while users are waiting, off-peak hours included: pending /
+      running analysis jobs outside the background class, or interactive
+      searches queued or running on the engine service. This is rechecked every `reanalysis_poll_s`, mid-game too;
+      the search in flight is cancelled and the plies found so far are
+      saved to the shared store, so the game resumes cheaply later.
+    - within `reanalysis_cpu_cores`: after each game it sleeps long enough
+      that engine threads × busy time averages out under the budget
+
+Searches go out at PRIORITY_BACKGROUND, so on the engine service they also
+queue behind everything else. A re-analysed game replaces its analysis in
+one transaction (GameAnalysis updated in place, move evaluations swapped,
+puzzles added, repertoire CPL adjusted), after re-checking under a row lock
+that the stored row is still stale – readers see the old analysis or the
+new one, never a mix. Run one per host.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import delete, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.analysis_core import ANALYSIS_VERSION
+from app.config import get_settings
+from app.cpu_pool import derive_analysis, read_mainline, run_cpu, shutdown_cpu_pool
+from app.db.models import Game, GameAnalysis, MoveEvaluation, Puzzle
+from app.db.session import async_session
+from app.engine_evals import ensure_solution_lines, evaluate_game, load_shared_plies, save_shared_plies
+from app.engine_service import PRIORITY_BACKGROUND, get_engine_service_client, start_engine
+from app.engine_supervisor import EngineUnavailable
+from app.job_scheduler import active_user_jobs
+from app.metrics import GAMES_ANALYZED, REANALYSIS_PAUSES, STAGE_SECONDS
+from app.repertoire import RepertoireDelta
+
+logger = logging.getLogger(__name__)
+
+
+# ═══════════════════════════════════════════════════════════
+# Idle detection
+# ═══════════════════════════════════════════════════════════
+
+
+def _engine_threads() -> int:
+    """Cores one of our searches occupies (the engine service's profile)."""
+    settings = get_settings()
+    return settings.engine_profile(settings.engine_service_profile).threads
+
+
+def _offpeak(hour: int) -> bool:
+    start, end = (int(h) for h in get_settings().reanalysis_offpeak_hours.split("-"))
+    return start <= hour < end if start <= end else (hour >= start or hour < end)
+
+
+def _host_load(running: bool) -> float:
+    """1-min load average per core, not counting our own engine while it runs."""
+    load = os.getloadavg()[0]
+    if running:
+        load = max(0.0, load - _engine_threads())
+    return load / (os.cpu_count() or 1)
+
+
+async def _user_load() -> int:
+    """Analysis jobs and interactive engine searches users are waiting on."""
+    async with async_session() as db:
+        waiting = await active_user_jobs(db)
+    try:
+        waiting += (await get_engine_service_client().stats()).get("interactive", 0)
+    except EngineUnavailable as e:
+        logger.warning("Engine service stats unavailable: %s", e)
+        waiting += 1  # can't tell: assume busy
+    return waiting
+
+
+async def _pause_reason(running: bool = False) -> Optional[str]:
+    """Why re-analysis must not run right now (None = go ahead)."""
+    if await _user_load():
+        return "interactive"
+    settings = get_settings()
+    if not _offpeak(datetime.now().hour) and _host_load(running) >= settings.reanalysis_max_load:
+        return "load"
+    return None
+
+
+class _Paused(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+async def _wait_until_idle(reason: str) -> None:
+    REANALYSIS_PAUSES.inc(reason=reason)
+    logger.info("Re-analysis paused (%s)", reason)
+    while await _pause_reason():
+        await asyncio.sleep(get_settings().reanalysis_poll_s)
+    logger.info("Re-analysis resumed")
+
+
+# ═══════════════════════════════════════════════════════════
+# Work selection
+# ═══════════════════════════════════════════════════════════
+
+
+def _stale(target_depth: int):
+    """SQL condition: the GameAnalysis row is older or shallower than the current target."""
+    return or_(
+        GameAnalysis.analysis_version.is_(None),
+        GameAnalysis.analysis_version < ANALYSIS_VERSION,
+        func.coalesce(GameAnalysis.analysis_depth, 0) < target_depth,
+    )
+
+
+async def count_stale(db: AsyncSession) -> int:
+    result = await db.execute(
+        select(func.count()).select_from(GameAnalysis).where(_stale(get_settings().reanalysis_target_depth))
+    )
+    return result.scalar() or 0
+
+
+async def _stale_games(db: AsyncSession, limit: int, skip: set[int]) -> list[dict]:
+    """
+    Next games to redo: users ordered by their latest import (most active
+    first), then each user's newest games. `skip` holds games that failed
+    in this run.
+    """
+    target = get_settings().reanalysis_target_depth
+    activity = (
+        select(Game.user_id, func.max(Game.created_at).label("last_active"))
+        .group_by(Game.user_id)
+        .subquery()
+    )
+    query = (
+        select(
+            Game.id, Game.user_id, Game.platform, Game.platform_game_id, Game.moves_pgn,
+            Game.color, Game.player_elo, Game.opening_name, GameAnalysis.analysis_depth,
+        )
+        .join(GameAnalysis, GameAnalysis.game_id == Game.id)
+        .join(activity, activity.c.user_id == Game.user_id)
+        .where(_stale(target))
+    )
+    if skip:
+        query = query.where(Game.id.not_in(skip))
+    result = await db.execute(
+        query.order_by(activity.c.last_active.desc().nulls_last(), Game.date.desc(), Game.id).limit(limit)
+    )
+    return [
+        {**row._asdict(), "depth": max(target, row.analysis_depth or 0)}
+        for row in result.all()
+    ]
+
+
+# ═══════════════════════════════════════════════════════════
+# Re-analysis and swap
+# ═══════════════════════════════════════════════════════════
+
+
+async def _reanalyse(engine, gd: dict) -> bool:
+    """Re-analyse one game and swap the result in. Returns False if there was nothing to replace."""
+    depth = gd["depth"]
+    with STAGE_SECONDS.time(pipeline="reanalysis", stage="parse"):
+        parsed = await run_cpu(read_mainline, gd["moves_pgn"])
+        if parsed is None:
+            return False
+        pgn_game, movetext_key = parsed
+
+    with STAGE_SECONDS.time(pipeline="reanalysis", stage="load"):
+        async with async_session() as db:
+            plies = await load_shared_plies(db, movetext_key, pgn_game, depth)
+
+    try:
+        with STAGE_SECONDS.time(pipeline="reanalysis", stage="engine"):
+            searched = await evaluate_game(engine, pgn_game, plies, depth, gd["color"], game_key=gd["id"])
+        with STAGE_SECONDS.time(pipeline="reanalysis", stage="classify"):
+            derived = await run_cpu(derive_analysis, gd["moves_pgn"], plies, gd["color"], gd["player_elo"])
+        with STAGE_SECONDS.time(pipeline="reanalysis", stage="engine"):
+            searched |= await ensure_solution_lines(
+                engine, plies, derived["puzzle_candidates"], depth, game_key=gd["id"]
+            )
+    except asyncio.CancelledError:
+        # Paused for interactive load: keep the plies searched so far
+        async with async_session() as db:
+            await save_shared_plies(
+                db, movetext_key, depth, plies,
+                platform=gd["platform"], platform_game_id=gd["platform_game_id"],
+            )
+            await db.commit()
+        raise
+
+    with STAGE_SECONDS.time(pipeline="reanalysis", stage="save"):
+        async with async_session() as db:
+            return await _swap_analysis(db, gd, derived, plies if searched else None, movetext_key)
+
+
+async def _swap_analysis(
+    db: AsyncSession, gd: dict, derived: dict, plies: Optional[list[dict]], movetext_key: str
+) -> bool:
+    """Replace the game's analysis, move evaluations and repertoire CPL in one transaction."""
+    depth = gd["depth"]
+    result = await db.execute(
+        select(GameAnalysis).where(GameAnalysis.game_id == gd["id"]).with_for_update()
+    )
+    row = result.scalar_one_or_none()
+    if row is None or (
+        row.analysis_version is not None
+        and row.analysis_version >= ANALYSIS_VERSION
+        and (row.analysis_depth or 0) >= depth
+    ):
+        await db.rollback()  # game deleted, or brought up to date meanwhile
+        return False
+
+    player_cp_losses = derived["player_cp_losses"]
+    overall_cpl = round(sum(player_cp_losses) / len(player_cp_losses), 2) if player_cp_losses else 0
+    repertoire = RepertoireDelta()
+    repertoire.replace_analysis(gd["user_id"], gd["opening_name"], gd["color"], row.overall_cpl, overall_cpl)
+
+    row.overall_cpl = overall_cpl
+    row.phase_opening_cpl = derived["phase_opening_cpl"]
+    row.phase_middlegame_cpl = derived["phase_middlegame_cpl"]
+    row.phase_endgame_cpl = derived["phase_endgame_cpl"]
+    row.blunders_count = derived["blunders"]
+    row.mistakes_count = derived["mistakes"]
+    row.inaccuracies_count = derived["inaccuracies"]
+    row.best_moves_count = derived["best_moves"]
+    row.great_moves_count = derived["great_moves"]
+    row.brilliant_moves_count = derived["brilliant_moves"]
+    row.missed_wins_count = derived["missed_wins"]
+    row.accuracy = derived["accuracy"]
+    row.average_move_time = derived["average_move_time"]
+    row.time_trouble_blunders = derived["time_trouble_blunders"]
+    row.analysis_depth = depth
+    row.analysis_version = ANALYSIS_VERSION
+    row.analyzed_at = func.now()
+
+    await db.execute(delete(MoveEvaluation).where(MoveEvaluation.game_id == gd["id"]))
+    for me in derived["moves"]:
+        db.add(MoveEvaluation(game_id=gd["id"], **me))
+
+    for _, pd in derived["puzzle_candidates"]:
+        pd["source_game_id"] = gd["id"]
+        pd["source_user_id"] = gd["user_id"]
+        existing = await db.execute(select(Puzzle.id).where(Puzzle.puzzle_key == pd["puzzle_key"]))
+        if existing.first() is None:
+            db.add(Puzzle(**pd))
+
+    await repertoire.apply(db)
+    if plies is not None:
+        await save_shared_plies(
+            db, movetext_key, depth, plies,
+            platform=gd["platform"], platform_game_id=gd["platform_game_id"],
+        )
+    await db.commit()
+    return True
+
+
+async def _run_until_paused(engine, gd: dict) -> bool:
+    """
+    `_reanalyse` with the load rechecked every `reanalysis_poll_s`; raises
+    _Paused (after cancelling the game) when the host is needed elsewhere.
+    """
+    task = asyncio.create_task(_reanalyse(engine, gd))
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=get_settings().reanalysis_poll_s)
+            if done:
+                return task.result()
+            reason = await _pause_reason(running=True)
+            if reason:
+                raise _Paused(reason)
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+# ═══════════════════════════════════════════════════════════
+# Main loop
+# ═══════════════════════════════════════════════════════════
+
+
+async def run(once: bool = False) -> None:
+    """
+    Re-analyse stale games forever (or until none are left, with `once`),
+    pausing whenever the host is needed elsewhere.
+    """
+    settings = get_settings()
+    async with async_session() as db:
+        logger.info("Re-analysis backlog: %d games", await count_stale(db))
+
+    engine = None
+    failed: set[int] = set()
+    done = 0
+    try:
+        while True:
+            reason = await _pause_reason()
+            if reason:
+                if engine is not None:
+                    await engine.close()
+                    engine = None
+                await _wait_until_idle(reason)
+                continue
+
+            async with async_session() as db:
+                games = await _stale_games(db, settings.reanalysis_batch_size, failed)
+            if not games:
+                if once:
+                    break
+                await asyncio.sleep(settings.reanalysis_poll_s * 30)
+                continue
+
+            for gd in games:
+                if engine is None:
+                    engine = await start_engine("batch", pipeline="reanalysis", priority=PRIORITY_BACKGROUND)
+                started = time.monotonic()
+                try:
+                    swapped = await _run_until_paused(engine, gd)
+                except _Paused as paused:
+                    await engine.close()  # give the cores and hash back while paused
+                    engine = None
+                    await _wait_until_idle(paused.reason)
+                    break  # fetch a fresh batch once idle
+                except Exception:
+                    logger.exception("Re-analysis of game %s failed", gd["id"])
+                    GAMES_ANALYZED.inc(pipeline="reanalysis", outcome="error")
+                    failed.add(gd["id"])
+                    continue
+                if swapped:
+                    done += 1
+                    GAMES_ANALYZED.inc(pipeline="reanalysis", outcome="ok")
+                else:
+                    failed.add(gd["id"])  # unparsable or gone: don't pick it again
+
+                # CPU budget: engine threads × busy time ≤ reanalysis_cpu_cores × wall time
+                busy = time.monotonic() - started
+                await asyncio.sleep(max(0.0, busy * (_engine_threads() / settings.reanalysis_cpu_cores - 1)))
+    finally:
+        if engine is not None:
+            await engine.close()
+        shutdown_cpu_pool()
+        logger.info("Re-analysed %d games (%d skipped)", done, len(failed))
+
+
+# ═══════════════════════════════════════════════════════════
+# Entry point
+# ═══════════════════════════════════════════════════════════
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Re-analyse stale or shallow game analyses on idle capacity")
+    parser.add_argument("--once", action="store_true", help="exit when no stale analyses are left")
+    args = parser.parse_args()
+    if not get_settings().engine_service_socket:
+        parser.error(
+            "ENGINE_SERVICE_SOCKET is not set: without the engine service, interactive "
+            "analyses run in the web processes where re-analysis can't see them"
+        )
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run(once=args.once))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Opening repertoire aggregation – keeps `opening_repertoire` in step with games.
+
+Every path that creates games or analyses (PGN import, /analysis/run, the arq
+worker, claiming anonymous results, background re-analysis) collects a
+`RepertoireDelta` and applies it with one batched INSERT ... ON CONFLICT DO
+UPDATE, so the opening endpoints read finished aggregates instead of
+recomputing over all games.
+
+Counters are additive: a game adds to games_played/won/drawn/lost when it is
+imported, and its CPL adds to cpl_sum/cpl_games when its analysis is saved.
+average_cpl is cpl_sum / cpl_games. `rebuild_repertoire` recomputes rows from
+games + game_analysis (scripts/rebuild_repertoire.py); use it after
+migration 004 and whenever the counters may have drifted.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Numeric, case, cast, func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import OpeningRepertoire
+
+
+@dataclass
+class _OpeningCounts:
+    eco_code: Optional[str] = None
+    games: int = 0
+    wins: int = 0
+    draws: int = 0
+    losses: int = 0
+    cpl_sum: float = 0.0
+    cpl_games: int = 0
+    last_played_at: Optional[datetime] = None
+
+
+class RepertoireDelta:
+    """Per-(user, opening, color) increments accumulated before one upsert."""
+
+    def __init__(self):
+        self._rows: dict[tuple[str, str, str], _OpeningCounts] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self._rows)
+
+    def _row(self, user_id: str, opening_name: str, color: str, eco_code: Optional[str]) -> _OpeningCounts:
+        row = self._rows.setdefault((user_id, opening_name, color), _OpeningCounts())
+        row.eco_code = row.eco_code or eco_code
+        return row
+
+    def add_game(
+        self,
+        user_id: str,
+        opening_name: Optional[str],
+        color: str,
+        result: str,
+        eco_code: Optional[str] = None,
+        played_at: Optional[datetime] = None,
+    ) -> None:
+        """Count a newly stored game (result from the player's perspective)."""
+        if not opening_name:
+            return
+        row = self._row(user_id, opening_name, color, eco_code)
+        row.games += 1
+        if result == "win":
+            row.wins += 1
+        elif result == "draw":
+            row.draws += 1
+        else:
+            row.losses += 1
+        if played_at and (row.last_played_at is None or played_at > row.last_played_at):
+            row.last_played_at = played_at
+
+    def add_analysis(
+        self,
+        user_id: str,
+        opening_name: Optional[str],
+        color: str,
+        overall_cpl: Optional[float],
+        eco_code: Optional[str] = None,
+    ) -> None:
+        """Count a newly saved GameAnalysis towards the opening's average CPL."""
+        if not opening_name or overall_cpl is None:
+            return
+        row = self._row(user_id, opening_name, color, eco_code)
+        row.cpl_sum += overall_cpl
+        row.cpl_games += 1
+
+    def replace_analysis(
+        self,
+        user_id: str,
+        opening_name: Optional[str],
+        color: str,
+        old_cpl: Optional[float],
+        new_cpl: Optional[float],
+    ) -> None:
+        """Swap a re-analysed game's CPL for its previous one (app/reanalysis.py)."""
+        if not opening_name:
+            return
+        row = self._row(user_id, opening_name, color, None)
+        if old_cpl is not None:
+            row.cpl_sum -= old_cpl
+            row.cpl_games -= 1
+        if new_cpl is not None:
+            row.cpl_sum += new_cpl
+            row.cpl_games += 1
+
+    async def apply(self, db: AsyncSession) -> int:
+        """Upsert all accumulated rows in one statement. Caller commits."""
+        if not self._rows:
+            return 0
+        stmt = pg_insert(OpeningRepertoire).values([
+            {
+                "user_id": user_id,
+                "opening_name": opening_name,
+                "color": color,
+                "eco_code": c.eco_code,
+                "games_played": c.games,
+                "games_won": c.wins,
+                "games_drawn": c.draws,
+                "games_lost": c.losses,
+                "cpl_sum": c.cpl_sum,
+                "cpl_games": c.cpl_games,
+                "average_cpl": round(c.cpl_sum / c.cpl_games, 2) if c.cpl_games else None,
+                "last_played_at": c.last_played_at,
+            }
+            for (user_id, opening_name, color), c in self._rows.items()
+        ])
+        t, new = OpeningRepertoire, stmt.excluded
+        cpl_games = t.cpl_games + new.cpl_games
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_repertoire",
+            set_={
+                "games_played": t.games_played + new.games_played,
+                "games_won": t.games_won + new.games_won,
+                "games_drawn": t.games_drawn + new.games_drawn,
+                "games_lost": t.games_lost + new.games_lost,
+                "cpl_sum": t.cpl_sum + new.cpl_sum,
+                "cpl_games": cpl_games,
+                "average_cpl": case(
+                    (cpl_games > 0, func.round(cast((t.cpl_sum + new.cpl_sum) / cpl_games, Numeric), 2)),
+                    else_=None,
+                ),
+                "eco_code": func.coalesce(t.eco_code, new.eco_code),
+                "last_played_at": func.greatest(t.last_played_at, new.last_played_at),
+                "updated_at": func.now(),
+            },
+        )
+        await db.execute(stmt)
+        count = len(self._rows)
+        self._rows.clear()
+        return count
+
+
+_REBUILD_SQL = """
+INSERT INTO opening_repertoire (
+    user_id, opening_name, eco_code, color,
+    games_played, games_won, games_drawn, games_lost,
+    cpl_sum, cpl_games, average_cpl, last_played_at, updated_at
+)
+SELECT
+    g.user_id, g.opening_name, min(g.eco_code), g.color,
+    count(*),
+    count(*) FILTER (WHERE g.result = 'win'),
+    count(*) FILTER (WHERE g.result = 'draw'),
+    count(*) FILTER (WHERE g.result NOT IN ('win', 'draw')),
+    coalesce(sum(ga.overall_cpl), 0),
+    count(ga.overall_cpl),
+    round(avg(ga.overall_cpl)::numeric, 2),
+    max(g.date),
+    now()
+FROM games g
+LEFT JOIN game_analysis ga ON ga.game_id = g.id
+WHERE g.opening_name IS NOT NULL {user_filter}
+GROUP BY g.user_id, g.opening_name, g.color
+ON CONFLICT (user_id, opening_name, color) DO UPDATE SET
+    eco_code = excluded.eco_code,
+    games_played = excluded.games_played,
+    games_won = excluded.games_won,
+    games_drawn = excluded.games_drawn,
+    games_lost = excluded.games_lost,
+    cpl_sum = excluded.cpl_sum,
+    cpl_games = excluded.cpl_games,
+    average_cpl = excluded.average_cpl,
+    last_played_at = excluded.last_played_at,
+    updated_at = now()
+"""
+
+_PRUNE_SQL = """
+DELETE FROM opening_repertoire r
+WHERE {user_filter} NOT EXISTS (
+    SELECT 1 FROM games g
+    WHERE g.user_id = r.user_id AND g.opening_name = r.opening_name AND g.color = r.color
+)
+"""
+
+
+async def rebuild_repertoire(db: AsyncSession, user_id: Optional[str] = None) -> int:
+    """
+    Recompute repertoire rows from games + game_analysis (one user, or
+    everyone) and delete rows with no games left. early_deviations is kept.
+    Returns the number of rows written. Caller commits.
+    """
+    params = {"user_id": user_id} if user_id else {}
+    result = await db.execute(
+        text(_REBUILD_SQL.format(user_filter="AND g.user_id = :user_id" if user_id else "")), params
+    )
+    await db.execute(
+        text(_PRUNE_SQL.format(user_filter="r.user_id = :user_id AND" if user_id else "")), params
+    )
+    return result.rowcount or 0
@@ -0,0 +1,133 @@
+"""
+On-disk result cache – bounded SQLite key/value store with LRU eviction.
+
+Used to memoize expensive, deterministic results (e.g. anonymous game
+analyses) across requests and process restarts. Values are JSON documents.
+Request handlers use `aget` / `aput` so the SQLite I/O stays off the event loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Optional
+
+from app.config import get_settings
+
+
+class DiskLRUCache:
+    """
+    Small SQLite-backed cache. Entries are grouped by namespace and the store
+    is capped at `max_entries` rows; the least recently read rows are evicted
+    first once the cap is exceeded.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10_000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace   TEXT NOT NULL,
+                key         TEXT NOT NULL,
+                value       TEXT NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_cache_accessed ON cache_entries (accessed_at)"
+        )
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """Return the cached value (and bump its recency), or None on a miss."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM cache_entries WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (time.time(), namespace, key),
+            )
+        try:
+            return json.loads(row[0])
+        except ValueError:
+            return None
+
+    def put(self, namespace: str, key: str, value: Any) -> None:
+        """Insert or replace an entry, evicting the oldest rows past the cap."""
+        payload = json.dumps(value, separators=(",", ":"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (namespace, key, payload, time.time()),
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM cache_entries WHERE rowid IN ("
+                    "SELECT rowid FROM cache_entries ORDER BY accessed_at ASC LIMIT ?)",
+                    (overflow,),
+                )
+
+    async def aget(self, namespace: str, key: str) -> Optional[Any]:
+        """`get` from async code: the SQLite read runs in a worker thread."""
+        return await asyncio.to_thread(self.get, namespace, key)
+
+    async def aput(self, namespace: str, key: str, value: Any) -> None:
+        """`put` from async code: serialization and the write run in a worker thread."""
+        await asyncio.to_thread(self.put, namespace, key, value)
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            )
+
+    def clear_namespace(self, namespace: str) -> int:
+        """Drop every entry in a namespace. Returns the number of rows removed."""
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ?", (namespace,)
+            )
+            return cur.rowcount
+
+    def clear_namespace_prefix(self, prefix: str, keep: Optional[str] = None) -> int:
+        """Drop every namespace starting with `prefix` except `keep` (e.g. old versions)."""
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM cache_entries WHERE substr(namespace, 1, ?) = ? AND namespace != ?",
+                (len(prefix), prefix, keep or ""),
+            )
+            return cur.rowcount
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+
+
+@lru_cache()
+def get_result_cache() -> DiskLRUCache:
+    settings = get_settings()
+    return DiskLRUCache(settings.result_cache_path, settings.result_cache_max_entries)
@@ -11,40 +11,44 @@ from __future__ import annotations
 import asyncio
 import hashlib
 from datetime import datetime
-from io import StringIO
 from typing import Optional
 
-import chess
-import chess.engine
-import chess.pgn
 import httpx
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.admission import PRIORITY_ANONYMOUS, AdmissionRejected, client_ip, get_engine_admission
 from app.auth import require_user
 from app.config import get_settings
-from app.db.models import Game, GameAnalysis, MoveEvaluation, OpeningRepertoire, Puzzle, User
+from app.db.models import Game, GameAnalysis, MoveEvaluation, Puzzle, User
 from app.db.session import get_db
 from app.analysis_core import (
-    win_probability,
-    move_accuracy,
-    compute_game_accuracy,
-    classify_move,
-    detect_phase,
-    count_material,
-    generate_puzzle_data,
-    compute_solution_line,
+    ANALYSIS_VERSION,
+    Mainline,
     extract_opening_name,
     avg,
-    parse_clock_comment,
-    classify_blunder_subtype,
 )
+from app.engine_evals import ensure_solution_lines, evaluate_game, new_plies
+from app.engine_service import start_engine
+from app.engine_supervisor import EngineUnavailable
+from app.cpu_pool import derive_analysis, map_cpu, movetext_hashes, read_mainline, run_cpu
+from app.metrics import CACHE_LOOKUPS, GAMES_ANALYZED, STAGE_SECONDS
+from app.pgn_headers import LazyGame, iter_games
+from app.repertoire import RepertoireDelta
+from app.streaming import SSE_HEADERS, disconnect_aware
+from app.result_cache import get_result_cache
 
 router = APIRouter()
 
+ANALYSIS_CACHE_NAMESPACE = "anon_analysis"
+
+# GameAnalysisOut fields that come from the PGN headers / request rather than
+# the engine. They are refreshed on every cache hit and never taken from cache.
+_HEADER_FIELDS = ("game_index", "white", "black", "result", "opening", "eco", "date", "time_control", "color")
+
 
 # ═══════════════════════════════════════════════════════════
 # Schemas
@@ -131,6 +135,8 @@ class GameAnalysisOut(BaseModel):
     time_trouble_blunders: int = 0
     moves: list[MoveEvalOut]
     puzzle_candidates: list[PuzzleCandidateOut] = []
+    cache_key: Optional[str] = None  # server-side analysis cache entry
+    pgn: Optional[str] = None  # source PGN, sent back on claim to recompute cache_key
 
 
 class AnonAnalysisResponse(BaseModel):
@@ -188,6 +194,7 @@ class ClaimGameIn(BaseModel):
     time_trouble_blunders: int = 0
     moves: list[ClaimMoveIn]
     puzzle_candidates: list[ClaimPuzzleCandidateIn] = []
+    pgn: Optional[str] = None
 
 
 class ClaimResultsRequest(BaseModel):
@@ -202,10 +209,13 @@ class ClaimResultsRequest(BaseModel):
 
 
 @router.post("/analyze")
-async def anonymous_analyze(body: AnonFetchRequest):
+async def anonymous_analyze(body: AnonFetchRequest, request: Request):
     """
     Fetch games and analyze them with Stockfish in real-time.
     Returns an SSE stream with progress updates and final results.
+    Engine work goes through admission control: the stream reports
+    `queued` events while waiting, and excess anonymous load gets a 429.
+    Closing the tab cancels the engine; games finished so far stay cached.
     """
     import json
 
@@ -231,43 +241,78 @@ async def anonymous_analyze(body: AnonFetchRequest):
     if not pgn_text.strip():
         raise HTTPException(404, "No games found")
 
-    # 2. Parse all games first to get total count
-    parsed_games = _parse_all_pgn(pgn_text, username)
+    # 2. Split all games first to get total count
+    parsed_games = await _parse_all_pgn(pgn_text, username)
     if not parsed_games:
         raise HTTPException(404, "Could not parse any games from the PGN data")
 
     total = len(parsed_games)
 
+    # 3. Shed excess load before opening the stream (only if something
+    #    actually needs Stockfish), so overload is a real 429.
+    #    Each game's cache entry is looked up once, here, and reused below.
+    cached_games = [
+        await _cached_game_analysis(lazy, color, movetext_key, i)
+        for i, (lazy, color, movetext_key) in enumerate(parsed_games)
+    ]
+    admission = get_engine_admission()
+    client_key = f"ip:{client_ip(request)}"
+    if any(analysis is None for analysis in cached_games):
+        try:
+            admission.check(PRIORITY_ANONYMOUS, client_key)
+        except AdmissionRejected as e:
+            raise HTTPException(
+                status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)}
+            )
+
     async def event_stream():
-        settings = get_settings()
         results: list[GameAnalysisOut] = []
 
         # Send initial event with total count
         yield f"data: {json.dumps({'type': 'start', 'total': total})}\n\n"
 
+        engine = None
+        ticket = None
         try:
-            transport, engine = await chess.engine.popen_uci(settings.stockfish_path)
-
-            for idx, (pgn_game, color_guess) in enumerate(parsed_games):
-                # Analyze each game
-                analysis = await _analyze_game(engine, pgn_game, color_guess, idx)
+            for idx, (lazy, color_guess, movetext_key) in enumerate(parsed_games):
+                # Cached games are returned straight from disk; Stockfish is
+                # only started once the first uncached game shows up.
+                analysis = cached_games[idx]
+                CACHE_LOOKUPS.inc(cache="anonymous", result="miss" if analysis is None else "hit")
+                if analysis is None:
+                    if engine is None:
+                        ticket = admission.enqueue(PRIORITY_ANONYMOUS, client_key)
+                        async for position in ticket.wait():
+                            yield f"data: {json.dumps({'type': 'queued', 'position': position})}\n\n"
+                        engine = await start_engine("interactive", pipeline="anonymous", priority=PRIORITY_ANONYMOUS)
+                    try:
+                        analysis = await _analyze_game(engine, lazy, color_guess, movetext_key, idx)
+                    except EngineUnavailable as e:
+                        # Stockfish kept dying on this game: skip it, keep the rest
+                        GAMES_ANALYZED.inc(pipeline="anonymous", outcome="error")
+                        yield f"data: {json.dumps({'type': 'game_error', 'game_index': idx, 'message': str(e)[:200]})}\n\n"
+                        continue
+                    GAMES_ANALYZED.inc(pipeline="anonymous", outcome="ok")
                 results.append(analysis)
 
                 # Send progress
                 yield f"data: {json.dumps({'type': 'progress', 'completed': idx + 1, 'total': total, 'game_cpl': analysis.overall_cpl})}\n\n"
 
-            await engine.quit()
-
         except Exception as e:
             yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
             return
+        finally:
+            if engine is not None:
+                await engine.close()
+            if ticket is not None:
+                ticket.release()
 
         # Compute aggregate stats
         all_cpls = [g.overall_cpl for g in results]
         overall_cpl = round(sum(all_cpls) / len(all_cpls), 1) if all_cpls else None
 
         wins = sum(1 for g in results if g.result == "win")
-        win_rate = round((wins / total) * 100, 1) if total > 0 else None
+        win_rate = round((wins / len(results)) * 100, 1) if results else None
 
         total_blunders = sum(g.blunders for g in results)
         total_moves = sum(len(g.moves) for g in results)
@@ -276,7 +321,7 @@ async def anonymous_analyze(body: AnonFetchRequest):
         response = AnonAnalysisResponse(
             username=username,
             platform=body.platform,
-            total_games=total,
+            total_games=len(results),
             games=[g.model_dump() for g in results],
             overall_cpl=overall_cpl,
             win_rate=win_rate,
@@ -286,13 +331,9 @@ async def anonymous_analyze(body: AnonFetchRequest):
         yield f"data: {json.dumps({'type': 'complete', 'results': response.model_dump()})}\n\n"
 
     return StreamingResponse(
-        event_stream(),
+        disconnect_aware(request, event_stream()),
         media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",
-        },
+        headers=SSE_HEADERS,
     )
 
 
@@ -311,6 +352,8 @@ async def claim_anonymous_results(
     Persist anonymous analysis results into the authenticated user's account.
     Creates Game + GameAnalysis + MoveEvaluation rows and updates OpeningRepertoire.
     Called by the frontend after the user signs up/in with cached results.
+    Only games whose analysis is still in the server-side cache are imported;
+    the rest are counted as `skipped`.
     """
     user_id = user.id
     platform = body.platform
@@ -333,9 +376,17 @@ async def claim_anonymous_results(
     }
 
     imported = 0
-    opening_stats: dict[tuple[str, str], dict] = {}  # (opening, color) → stats
+    skipped = 0
+    repertoire = RepertoireDelta()
+
+    movetext_keys = await map_cpu(movetext_hashes, [g.pgn or "" for g in body.games])
+
+    for g, movetext_key in zip(body.games, movetext_keys):
+        g = await _with_cached_analysis(g, movetext_key)
+        if g is None:
+            skipped += 1
+            continue
 
-    for g in body.games:
         # Parse date
         dt = datetime.utcnow()
         if g.date:
@@ -408,6 +459,8 @@ async def claim_anonymous_results(
             await db.flush()  # get game_row.id
         except Exception:
             await db.rollback()
+            # The rollback also dropped the games flushed so far
+            repertoire = RepertoireDelta()
             continue
 
         # Create GameAnalysis row
@@ -428,6 +481,7 @@ async def claim_anonymous_results(
             average_move_time=g.average_move_time,
             time_trouble_blunders=g.time_trouble_blunders,
             analysis_depth=12,
+            analysis_version=ANALYSIS_VERSION,
         )
         db.add(analysis_row)
 
@@ -484,71 +538,31 @@ async def claim_anonymous_results(
         existing_ids.add(game_hash)
         imported += 1
 
-        # Accumulate opening stats
-        if g.opening:
-            key = (g.opening, g.color)
-            if key not in opening_stats:
-                opening_stats[key] = {
-                    "eco": g.eco,
-                    "games": 0,
-                    "wins": 0,
-                    "draws": 0,
-                    "losses": 0,
-                    "cpl_sum": 0.0,
-                    "cpl_count": 0,
-                }
-            stats = opening_stats[key]
-            stats["games"] += 1
-            if result == "win":
-                stats["wins"] += 1
-            elif result == "draw":
-                stats["draws"] += 1
-            else:
-                stats["losses"] += 1
-            stats["cpl_sum"] += g.overall_cpl
-            stats["cpl_count"] += 1
-
-    # Update OpeningRepertoire
-    for (opening_name, color), stats in opening_stats.items():
-        existing_q = await db.execute(
-            select(OpeningRepertoire).where(
-                OpeningRepertoire.user_id == user_id,
-                OpeningRepertoire.opening_name == opening_name,
-                OpeningRepertoire.color == color,
-            )
-        )
-        existing_row = existing_q.scalar_one_or_none()
-
-        if existing_row:
-            existing_row.games_played += stats["games"]
-            existing_row.games_won += stats["wins"]
-            existing_row.games_drawn += stats["draws"]
-            existing_row.games_lost += stats["losses"]
-            total_cpl_games = (existing_row.games_played - stats["games"])
-            if existing_row.average_cpl and total_cpl_games > 0:
-                old_total = existing_row.average_cpl * total_cpl_games
-                existing_row.average_cpl = round(
-                    (old_total + stats["cpl_sum"]) / existing_row.games_played, 2
-                )
-            else:
-                existing_row.average_cpl = round(stats["cpl_sum"] / stats["cpl_count"], 2) if stats["cpl_count"] else None
-        else:
-            new_row = OpeningRepertoire(
-                user_id=user_id,
-                opening_name=opening_name,
-                eco_code=stats["eco"],
-                color=color,
-                games_played=stats["games"],
-                games_won=stats["wins"],
-                games_drawn=stats["draws"],
-                games_lost=stats["losses"],
-                average_cpl=round(stats["cpl_sum"] / stats["cpl_count"], 2) if stats["cpl_count"] else None,
-            )
-            db.add(new_row)
+        repertoire.add_game(user_id, g.opening, g.color, result, eco_code=g.eco, played_at=dt)
+        repertoire.add_analysis(user_id, g.opening, g.color, g.overall_cpl)
 
+    await repertoire.apply(db)
     await db.commit()
 
-    return {"imported": imported, "total_submitted": len(body.games)}
+    return {"imported": imported, "skipped": skipped, "total_submitted": len(body.games)}
+
+
+async def _with_cached_analysis(g: ClaimGameIn, movetext_key: str) -> ClaimGameIn | None:
+    """
+    Rebuild a claimed game from the server-side cached analysis. The cache key
+    and header fields are recomputed from the submitted PGN, so the client
+    payload only selects a game and side — none of its analysis is trusted.
+    Returns None when the game has no cached analysis (never analysed here,
+    or evicted since); the client has to re-run the analysis to claim it.
+    """
+    if not g.pgn or g.color not in ("white", "black"):
+        return None
+    lazy = LazyGame(g.pgn)
+    header_fields, _, cache_key = _game_context(lazy, g.color, movetext_key, g.game_index)
+    cached = await get_result_cache().aget(ANALYSIS_CACHE_NAMESPACE, cache_key)
+    if not cached:
+        return None
+    return ClaimGameIn.model_validate({**cached, **header_fields, "pgn": g.pgn})
 
 
 def _result_pgn(result: str, color: str) -> str:
@@ -571,7 +585,7 @@ async def _fetch_lichess_pgn(username: str, max_games: int) -> str:
         "max": min(max_games, 50),
         "pgnInBody": "true",
         "clocks": "true",
-        "evals": "false",
+        "evals": "true",
         "opening": "true",
     }
     headers = {"Accept": "application/x-chess-pgn"}
@@ -630,38 +644,42 @@ async def _fetch_chesscom_pgn(username: str, max_games: int) -> str:
     return "\n\n".join(all_pgn_parts)
 
 
-def _parse_all_pgn(pgn_text: str, username: str | None) -> list[tuple]:
-    """Parse PGN text and return list of (pgn_game, color) tuples."""
-    pgn_io = StringIO(pgn_text)
+async def _parse_all_pgn(pgn_text: str, username: str | None) -> list[tuple]:
+    """
+    Split PGN text into a list of (LazyGame, color, movetext_key) tuples.
+    Colors come from the headers; the movetext hashes (result-cache keys)
+    need a full parse and are computed in the CPU pool.
+    """
     games = []
 
-    while True:
-        game = chess.pgn.read_game(pgn_io)
-        if game is None:
-            break
-
-        headers = game.headers
-        white = headers.get("White", "")
-        black = headers.get("Black", "")
+    for lazy in iter_games(pgn_text):
+        black = lazy.headers.get("Black", "")
 
         # Determine which color the user is playing
         color = "white"
         if username and username.lower() == black.lower():
             color = "black"
 
-        games.append((game, color))
+        games.append((lazy, color))
 
-    return games
+    keys = await map_cpu(movetext_hashes, [lazy.text for lazy, _ in games])
+    return [(lazy, color, key) for (lazy, color), key in zip(games, keys)]
 
 
-async def _analyze_game(
-    engine, pgn_game, color: str, game_index: int
-) -> GameAnalysisOut:
-    """Analyze a single game with the Stockfish engine."""
+def _analysis_depth() -> int:
     settings = get_settings()
-    depth = min(settings.default_analysis_depth, 12)
+    return min(settings.default_analysis_depth, 12)
 
-    headers = pgn_game.headers
+
+def _game_context(
+    lazy: LazyGame, color: str, movetext_key: str, game_index: int
+) -> tuple[dict, int | None, str]:
+    """
+    Return (header_fields, player_elo, cache_key) for a game.
+    The cache key combines the analysis tier (depth), the player's side and
+    rating — both affect classification — and the normalized movetext hash.
+    """
+    headers = lazy.headers
     white = headers.get("White", "?")
     black = headers.get("Black", "?")
     result_raw = headers.get("Result", "*")
@@ -685,270 +703,73 @@ async def _analyze_game(
     else:
         result = "draw"
 
-    board = pgn_game.board()
-    move_evals = []
-    total_cp_loss = 0
-    player_accuracies = []
-    phase_losses = {"opening": [], "middlegame": [], "endgame": []}
-    blunders = 0
-    mistakes = 0
-    inaccuracies = 0
-    best_moves_count = 0
-    great_moves_count = 0
-    brilliant_moves_count = 0
-    missed_wins_count = 0
-    player_move_count = 0
-    total_move_count = 0
-    move_num = 0
-    prev_score_cp = 0
-    prev_is_mate = False
-    prev_mate_in = None
-    castled_white = False
-    castled_black = False
-    puzzle_candidates: list[dict] = []
-
-    prev_clock: float | None = None
-    move_times: list[float] = []
-    time_trouble_blunders_count = 0
-
-    for node in pgn_game.mainline():
-        move = node.move
-        move_num += 1
-        mv_color = "white" if board.turn == chess.WHITE else "black"
-        san = board.san(move)
-        fen_before = board.fen()
-        is_player_move = (mv_color == color)
-
-        # Parse clock annotation
-        clock_remaining = parse_clock_comment(node.comment) if node.comment else None
-        time_remaining_val = clock_remaining
-
-        # Track castling
-        if board.is_castling(move):
-            if mv_color == "white":
-                castled_white = True
-            else:
-                castled_black = True
-
-        # Pre-move engine query for player moves
-        best_move_san = None
-        best_move_uci = None
-        best_move_obj = None
-        best_second_gap_cp = None
-        is_only_legal = (board.legal_moves.count() == 1)
-
-        if is_player_move:
-            multi_info = await engine.analyse(
-                board, chess.engine.Limit(depth=depth),
-                multipv=2, info=chess.engine.INFO_ALL
-            )
-            pre_info = multi_info[0] if multi_info else {}
-            pv = pre_info.get("pv")
-            if pv and len(pv) > 0:
-                best_move_obj = pv[0]
-                best_move_uci = pv[0].uci()
-                best_move_san = board.san(pv[0])
-
-            # Compute gap between best and 2nd-best move
-            # for puzzle quality filtering
-            if len(multi_info) >= 2:
-                s1 = multi_info[0].get("score")
-                s2 = multi_info[1].get("score")
-                if s1 and s2:
-                    pov1 = s1.pov(board.turn)
-                    pov2 = s2.pov(board.turn)
-                    cp1 = 10000 if pov1.is_mate() and (pov1.mate() or 0) > 0 else (-10000 if pov1.is_mate() else (pov1.score() or 0))
-                    cp2 = 10000 if pov2.is_mate() and (pov2.mate() or 0) > 0 else (-10000 if pov2.is_mate() else (pov2.score() or 0))
-                    best_second_gap_cp = cp1 - cp2
-
-        board.push(move)
-
-        info = await engine.analyse(board, chess.engine.Limit(depth=depth))
-
-        score = info.get("score")
-        score_cp = 0
-        is_mate = False
-        mate_in = None
-        if score:
-            pov = score.pov(chess.WHITE)
-            if pov.is_mate():
-                is_mate = True
-                mate_in = pov.mate()
-                score_cp = 1500 if (mate_in and mate_in > 0) else -1500
-            else:
-                score_cp = max(-1500, min(1500, pov.score() or 0))
-
-        # CP loss
-        if prev_is_mate and is_mate:
-            cp_loss = 0
-        elif mv_color == "white":
-            cp_loss = max(0, prev_score_cp - score_cp)
-        else:
-            cp_loss = max(0, score_cp - prev_score_cp)
-        cp_loss = min(cp_loss, 800)
-
-        # Win probability
-        wp_before = win_probability(prev_score_cp, prev_is_mate, prev_mate_in)
-        wp_after = win_probability(score_cp, is_mate, mate_in)
-
-        # Per-move accuracy
-        mv_accuracy = move_accuracy(wp_before, wp_after, mv_color)
-
-        # Phase
-        phase = detect_phase(board, move_num, castled_white, castled_black)
-
-        # Classification
-        if is_player_move:
-            board.pop()
-            quality = classify_move(
-                cp_loss=cp_loss,
-                win_prob_before=wp_before,
-                win_prob_after=wp_after,
-                color=mv_color,
-                board_before=board,
-                move=move,
-                best_move=best_move_obj,
-                is_only_legal=is_only_legal,
-                eval_before_cp=prev_score_cp,
-                eval_after_cp=score_cp,
-                is_mate_before=prev_is_mate,
-                is_mate_after=is_mate,
-                mate_before=prev_mate_in,
-                mate_after=mate_in,
-                player_elo=player_elo,
-            )
-            board.push(move)
-        else:
-            if cp_loss == 0:
-                quality = "Best"
-            elif cp_loss <= 10:
-                quality = "Excellent"
-            elif cp_loss <= 25:
-                quality = "Good"
-            elif cp_loss <= 100:
-                quality = "Inaccuracy"
-            elif cp_loss <= 300:
-                quality = "Mistake"
-            else:
-                quality = "Blunder"
-
-        # Aggregate metrics for player's moves
-        blunder_sub = None
-        if is_player_move:
-            player_move_count += 1
-            player_accuracies.append(mv_accuracy)
-            phase_losses[phase].append(cp_loss)
-            total_cp_loss += cp_loss
-
-            if quality == "Best":
-                best_moves_count += 1
-            elif quality == "Great":
-                great_moves_count += 1
-            elif quality == "Brilliant":
-                brilliant_moves_count += 1
-            elif quality == "Missed Win":
-                missed_wins_count += 1
-            elif quality == "Inaccuracy":
-                inaccuracies += 1
-            elif quality == "Mistake":
-                mistakes += 1
-            elif quality == "Blunder":
-                blunders += 1
-
-            # ── Blunder subtype classification ──
-            blunder_sub = None
-            if quality == "Blunder":
-                board.pop()  # undo for classification context
-                blunder_sub = classify_blunder_subtype(board, move, best_move_obj, phase)
-                board.push(move)  # re-push
-                if time_remaining_val is not None and time_remaining_val < 30:
-                    time_trouble_blunders_count += 1
-
-            # ── Track move time for player moves ──
-            if clock_remaining is not None and prev_clock is not None:
-                mt = prev_clock - clock_remaining
-                if mt > 0:
-                    move_times.append(mt)
-
-            if is_player_move and clock_remaining is not None:
-                prev_clock = clock_remaining
-
-            # Collect puzzle candidates (filtered by quality)
-            puzzle_data = generate_puzzle_data(
-                fen_before=fen_before,
-                san=san,
-                best_move_san=best_move_san,
-                best_move_uci=best_move_uci,
-                cp_loss=cp_loss,
-                phase=phase,
-                move_quality=quality,
-                move_number=move_num,
-                best_second_gap_cp=best_second_gap_cp,
-                is_only_legal=is_only_legal,
-                eval_before_cp=prev_score_cp,
-            )
-            if puzzle_data:
-                # Compute multi-move solution line
-                sol_line = await compute_solution_line(
-                    fen_before, engine, depth=depth, max_moves=6
-                )
-                puzzle_data["solution_line"] = sol_line
-                puzzle_candidates.append(puzzle_data)
-
-        move_evals.append(MoveEvalOut(
-            move_number=move_num,
-            color=mv_color,
-            san=san,
-            cp_loss=cp_loss,
-            phase=phase,
-            move_quality=quality,
-            eval_before=prev_score_cp,
-            eval_after=score_cp,
-            fen_before=fen_before,
-            best_move_san=best_move_san if is_player_move else None,
-            best_move_uci=best_move_uci if is_player_move else None,
-            win_prob_before=round(wp_before, 4),
-            win_prob_after=round(wp_after, 4),
-            accuracy=round(mv_accuracy, 1),
-            time_remaining=time_remaining_val,
-            blunder_subtype=blunder_sub if is_player_move else None,
-        ))
-
-        prev_score_cp = score_cp
-        prev_is_mate = is_mate
-        prev_mate_in = mate_in
-        total_move_count += 1
-
-    overall_cpl = round(total_cp_loss / player_move_count, 1) if player_move_count > 0 else 0
-    game_acc = compute_game_accuracy(player_accuracies)
-
-    return GameAnalysisOut(
-        game_index=game_index,
-        white=white,
-        black=black,
-        result=result,
-        opening=extract_opening_name(headers),
-        eco=headers.get("ECO"),
-        date=headers.get("UTCDate", headers.get("Date")),
-        time_control=headers.get("TimeControl"),
-        color=color,
+    header_fields = {
+        "game_index": game_index,
+        "white": white,
+        "black": black,
+        "result": result,
+        "opening": extract_opening_name(headers),
+        "eco": headers.get("ECO"),
+        "date": headers.get("UTCDate", headers.get("Date")),
+        "time_control": headers.get("TimeControl"),
+        "color": color,
+    }
+    cache_key = f"d{_analysis_depth()}:{color}:{player_elo or 0}:{movetext_key}"
+    return header_fields, player_elo, cache_key
+
+
+async def _cached_game_analysis(
+    lazy: LazyGame, color: str, movetext_key: str, game_index: int
+) -> GameAnalysisOut | None:
+    """Return the cached analysis for this game, or None if it must be analysed."""
+    header_fields, _, cache_key = _game_context(lazy, color, movetext_key, game_index)
+    cached = await get_result_cache().aget(ANALYSIS_CACHE_NAMESPACE, cache_key)
+    if not cached:
+        return None
+    return GameAnalysisOut.model_validate(
+        {**cached, **header_fields, "cache_key": cache_key, "pgn": lazy.text}
+    )
+
+
+async def _analyze_game(
+    engine, lazy: LazyGame, color: str, movetext_key: str, game_index: int
+) -> GameAnalysisOut:
+    """
+    Analyze a single game with the Stockfish engine and store the result in
+    the on-disk cache (keyed by movetext + analysis tier). Callers check the
+    cache first via `_cached_game_analysis`.
+    """
+    depth = _analysis_depth()
+    header_fields, player_elo, cache_key = _game_context(lazy, color, movetext_key, game_index)
+
+    with STAGE_SECONDS.time(pipeline="anonymous", stage="parse"):
+        parsed = await run_cpu(read_mainline, lazy.text)
+        pgn_game = Mainline(lazy.game) if parsed is None else parsed[0]
+        plies = new_plies(pgn_game)
+    with STAGE_SECONDS.time(pipeline="anonymous", stage="engine"):
+        await evaluate_game(engine, pgn_game, plies, depth, color, game_key=movetext_key)
+    with STAGE_SECONDS.time(pipeline="anonymous", stage="classify"):
+        derived = await run_cpu(derive_analysis, lazy.text, plies, color, player_elo)
+    puzzle_candidates = derived.pop("puzzle_candidates")
+    with STAGE_SECONDS.time(pipeline="anonymous", stage="engine"):
+        await ensure_solution_lines(engine, plies, puzzle_candidates, depth, game_key=movetext_key)
+
+    player_cp_losses = derived.pop("player_cp_losses")
+    overall_cpl = round(sum(player_cp_losses) / len(player_cp_losses), 1) if player_cp_losses else 0
+
+    analysis = GameAnalysisOut(
+        **header_fields,
+        **derived,
         overall_cpl=overall_cpl,
-        accuracy=game_acc,
-        phase_opening_cpl=avg(phase_losses["opening"]),
-        phase_middlegame_cpl=avg(phase_losses["middlegame"]),
-        phase_endgame_cpl=avg(phase_losses["endgame"]),
-        blunders=blunders,
-        mistakes=mistakes,
-        inaccuracies=inaccuracies,
-        best_moves=best_moves_count,
-        great_moves=great_moves_count,
-        brilliant_moves=brilliant_moves_count,
-        missed_wins=missed_wins_count,
-        average_move_time=round(sum(move_times) / len(move_times), 1) if move_times else None,
-        time_trouble_blunders=time_trouble_blunders_count,
-        moves=move_evals,
-        puzzle_candidates=[PuzzleCandidateOut(**p) for p in puzzle_candidates],
+        puzzle_candidates=[PuzzleCandidateOut(**p) for _, p in puzzle_candidates],
+        cache_key=cache_key,
+        pgn=lazy.text,
+    )
+
+    await get_result_cache().aput(
+        ANALYSIS_CACHE_NAMESPACE, cache_key, analysis.model_dump(exclude={"cache_key", "pgn", *_HEADER_FIELDS})
     )
+    return analysis
 
 
 def _avg(lst: list) -> float | None:
@@ -7,22 +7,27 @@ The coach produces deterministic-style structured feedback (not vague chat).
 
 from __future__ import annotations
 
+import json
 from datetime import datetime
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.auth import require_user
+from app.auth import require_stream_user, require_user
 from app.config import get_settings
 from app.db.models import Game, GameAnalysis, MoveEvaluation, User
-from app.db.session import get_db
+from app.db.session import analysis_session, get_db
+from app.llm import LLMError, chat_completion, stream_chat_completion
+from app.streaming import SSE_HEADERS, disconnect_aware
 
 router = APIRouter()
 
 FREE_MONTHLY_LIMIT = 3
+COACH_MODEL = "gpt-4o-mini"
 
 
 class CoachReviewRequest(BaseModel):
@@ -48,6 +53,122 @@ async def get_coach_review(
     Generate an AI Coach review for a specific analyzed game.
     Uses GPT-4o-mini for cost efficiency.
     """
+    game, prompt, is_pro = await _prepare_review(body, user, db)
+
+    # ── Call OpenAI ─────────────────────────────────────
+    try:
+        review_text = await chat_completion(
+            model=COACH_MODEL,
+            messages=_review_messages(prompt),
+            temperature=0.3,
+            max_tokens=1500,
+            timeout=60,
+        )
+    except LLMError as e:
+        raise HTTPException(status_code=502, detail=e.detail)
+
+    # ── Update quota ────────────────────────────────────
+    user.ai_coach_reviews_used += 1
+    db.add(user)
+    await db.commit()
+
+    # ── Parse sections from the review ──────────────────
+    sections = _parse_sections(review_text)
+
+    return CoachReviewResponse(
+        game_id=game.id,
+        review=review_text,
+        sections=sections,
+        reviews_used=user.ai_coach_reviews_used,
+        reviews_limit=None if is_pro else FREE_MONTHLY_LIMIT,
+    )
+
+
+@router.post("/review/stream")
+async def stream_coach_review(
+    body: CoachReviewRequest,
+    request: Request,
+    user: User = Depends(require_stream_user),
+    db: AsyncSession = Depends(get_db, scope="function"),
+):
+    """
+    Streaming variant of /review (SSE). Emits `section` events as headings
+    appear and `delta` events with each section's text as tokens arrive,
+    then `complete` with the CoachReviewResponse fields. The review only
+    counts against the quota once the upstream answer has finished.
+    """
+    game, prompt, is_pro = await _prepare_review(body, user, db)
+    await db.commit()  # persist a monthly quota reset before streaming
+    user_id = user.id
+    game_id = game.id
+
+    async def event_stream():
+        parser = SectionStream()
+        try:
+            async for delta in stream_chat_completion(
+                model=COACH_MODEL,
+                messages=_review_messages(prompt),
+                temperature=0.3,
+                max_tokens=1500,
+            ):
+                for event in parser.feed(delta):
+                    yield f"data: {json.dumps(event)}\n\n"
+        except LLMError as e:
+            yield f"data: {json.dumps({'type': 'error', 'message': e.detail})}\n\n"
+            return
+        for event in parser.close():
+            yield f"data: {json.dumps(event)}\n\n"
+
+        # ── Update quota (complete reviews only) ────────────
+        async with analysis_session() as save_db:
+            result = await save_db.execute(
+                update(User)
+                .where(User.id == user_id)
+                .values(ai_coach_reviews_used=User.ai_coach_reviews_used + 1)
+                .returning(User.ai_coach_reviews_used)
+            )
+            reviews_used = result.scalar_one()
+            await save_db.commit()
+
+        response = CoachReviewResponse(
+            game_id=game_id,
+            review=parser.text,
+            sections=_parse_sections(parser.text),
+            reviews_used=reviews_used,
+            reviews_limit=None if is_pro else FREE_MONTHLY_LIMIT,
+        )
+        yield f"data: {json.dumps({'type': 'complete', 'result': response.model_dump()})}\n\n"
+
+    return StreamingResponse(
+        disconnect_aware(request, event_stream()),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
+@router.get("/quota")
+async def get_quota(
+    user: User = Depends(require_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Check how many AI Coach reviews the user has left."""
+    if _reset_coach_quota_if_new_month(user):
+        db.add(user)
+        await db.commit()
+
+    is_pro = user.subscription_tier == "pro"
+    return {
+        "reviews_used": user.ai_coach_reviews_used,
+        "reviews_limit": None if is_pro else FREE_MONTHLY_LIMIT,
+        "reviews_remaining": None if is_pro else max(0, FREE_MONTHLY_LIMIT - user.ai_coach_reviews_used),
+        "is_pro": is_pro,
+    }
+
+
+async def _prepare_review(
+    body: CoachReviewRequest, user: User, db: AsyncSession
+) -> tuple[Game, str, bool]:
+    """Config + quota checks and prompt building shared by /review and /review/stream."""
     settings = get_settings()
 
     if not settings.openai_api_key:
@@ -98,73 +219,7 @@ async def get_coach_review(
     # ── Build the prompt ────────────────────────────────
     prompt = _build_review_prompt(game, analysis, moves, body.focus)
 
-    # ── Call OpenAI ─────────────────────────────────────
-    import httpx
-
-    async with httpx.AsyncClient(timeout=60) as client:
-        resp = await client.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {settings.openai_api_key}",
-                "Content-Type": "application/json",
-            },
-            json={
-                "model": "gpt-4o-mini",
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": SYSTEM_PROMPT,
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt,
-                    },
-                ],
-                "temperature": 0.3,
-                "max_tokens": 1500,
-            },
-        )
-
-    if resp.status_code != 200:
-        raise HTTPException(status_code=502, detail="AI Coach service error")
-
-    data = resp.json()
-    review_text = data["choices"][0]["message"]["content"]
-
-    # ── Update quota ────────────────────────────────────
-    user.ai_coach_reviews_used += 1
-    db.add(user)
-    await db.commit()
-
-    # ── Parse sections from the review ──────────────────
-    sections = _parse_sections(review_text)
-
-    return CoachReviewResponse(
-        game_id=game.id,
-        review=review_text,
-        sections=sections,
-        reviews_used=user.ai_coach_reviews_used,
-        reviews_limit=None if is_pro else FREE_MONTHLY_LIMIT,
-    )
-
-
-@router.get("/quota")
-async def get_quota(
-    user: User = Depends(require_user),
-    db: AsyncSession = Depends(get_db),
-):
-    """Check how many AI Coach reviews the user has left."""
-    if _reset_coach_quota_if_new_month(user):
-        db.add(user)
-        await db.commit()
-
-    is_pro = user.subscription_tier == "pro"
-    return {
-        "reviews_used": user.ai_coach_reviews_used,
-        "reviews_limit": None if is_pro else FREE_MONTHLY_LIMIT,
-        "reviews_remaining": None if is_pro else max(0, FREE_MONTHLY_LIMIT - user.ai_coach_reviews_used),
-        "is_pro": is_pro,
-    }
+    return game, prompt, is_pro
 
 
 def _month_context(dt: Optional[datetime] = None) -> str:
@@ -216,6 +271,13 @@ Rules:
 - Use plain language, not engine jargon"""
 
 
+def _review_messages(prompt: str) -> list[dict]:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+
+
 def _build_review_prompt(
     game: Game, analysis: GameAnalysis, moves: list, focus: Optional[str]
 ) -> str:
@@ -279,3 +341,57 @@ def _parse_sections(text: str) -> list[dict]:
         })
 
     return sections
+
+
+class SectionStream:
+    """
+    Incremental counterpart of `_parse_sections` for streamed reviews.
+
+    Text is emitted as soon as it can't be part of a "## " heading, so most
+    tokens pass straight through; only a line that may still turn into a
+    heading is held back until its newline arrives. Text before the first
+    heading is dropped, as in `_parse_sections`.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._line = ""
+        self._sent = 0  # chars of the current line already emitted
+        self._section = -1
+
+    def feed(self, delta: str) -> list[dict]:
+        self.text += delta
+        events: list[dict] = []
+        *complete, self._line = (self._line + delta).split("\n")
+        if complete:
+            # The first complete line continues the partially sent one
+            events += self._finish_line(complete[0])
+            for line in complete[1:]:
+                self._sent = 0
+                events += self._finish_line(line)
+            self._sent = 0
+        if self._line and not _may_be_heading(self._line):
+            events += self._content(self._line[self._sent:])
+            self._sent = len(self._line)
+        return events
+
+    def close(self) -> list[dict]:
+        events = self._finish_line(self._line) if self._line else []
+        self._line = ""
+        self._sent = 0
+        return events
+
+    def _finish_line(self, line: str) -> list[dict]:
+        if line.startswith("## "):
+            self._section += 1
+            return [{"type": "section", "index": self._section, "title": line[3:].strip()}]
+        return self._content(line[self._sent:] + "\n")
+
+    def _content(self, text: str) -> list[dict]:
+        if self._section < 0 or not text:
+            return []
+        return [{"type": "delta", "index": self._section, "text": text}]
+
+
+def _may_be_heading(partial_line: str) -> bool:
+    return partial_line.startswith("## ") or "## ".startswith(partial_line)
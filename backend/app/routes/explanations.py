@@ -6,31 +6,53 @@ Uses a hybrid approach:
 2. GPT-4o-mini to produce a readable explanation
 
 Free users get 10 explanations/month. Pro users get unlimited.
+
+Explanations are cached on disk by a hash of the full prompt (every input
+the model sees) under a namespace carrying the model and prompt version, so repeat
+views are served without an upstream call and don't count against the
+quota. Concurrent identical requests share one upstream call.
 """
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import json
 from datetime import datetime
+from functools import lru_cache
 from typing import Optional
 
 import chess
-import httpx
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.auth import require_user
+from app.auth import require_stream_user, require_user
 from app.config import get_settings
 from app.db.models import Streak, User
-from app.db.session import get_db
+from app.db.session import analysis_session, get_db
 from app.analysis_core import describe_board_for_ai
+from app.llm import LLMError, chat_completion, stream_chat_completion
+from app.result_cache import get_result_cache
+from app.streaming import SSE_HEADERS, disconnect_aware
 
 router = APIRouter()
 
 FREE_MONTHLY_LIMIT = 10  # free users get 10 move explanations / month
 EXPLANATIONS_STREAK_TYPE = "ai_explanations"
 
+EXPLANATION_MODEL = "gpt-4o-mini"
+# Bump whenever the system prompt or _build_explanation_prompt changes:
+# cached explanations from older versions are dropped.
+EXPLANATION_PROMPT_VERSION = 2
+EXPLANATION_CACHE_PREFIX = "explanations:"
+
+# In-flight upstream calls by cache key (single-flight for identical requests).
+# Values are tasks (one-shot) or futures resolved when a streamed answer completes.
+_inflight: dict[str, asyncio.Future] = {}
+
 
 # ═══════════════════════════════════════════════════════════
 # Schemas
@@ -90,52 +112,35 @@ async def explain_move(
             detail="AI explanations not configured (missing OpenAI API key)",
         )
 
-    # ── Quota check ─────────────────────────────────────
+    # ── Quota usage ─────────────────────────────────────
     is_pro = user.subscription_tier == "pro"
     usage_row, used_count = await _get_monthly_explanations_usage(db, user.id)
-    if not is_pro and used_count >= FREE_MONTHLY_LIMIT:
-        raise HTTPException(
-            status_code=403,
-            detail=f"Free plan limit reached ({FREE_MONTHLY_LIMIT} explanations/month). Upgrade to Pro for unlimited explanations.",
-        )
 
     # ── Concept extraction (deterministic) ──────────────
     concepts = _extract_concepts(body)
     severity = _determine_severity(body)
 
-    # ── Build prompt ────────────────────────────────────
+    # ── Cache / in-flight lookup (free of charge) ───────
     prompt = _build_explanation_prompt(body, concepts)
-
-    # ── Call OpenAI ─────────────────────────────────────
-    try:
-        async with httpx.AsyncClient(timeout=30) as client:
-            resp = await client.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {settings.openai_api_key}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": "gpt-4o-mini",
-                    "messages": [
-                        {"role": "system", "content": EXPLANATION_SYSTEM_PROMPT},
-                        {"role": "user", "content": prompt},
-                    ],
-                    "temperature": 0.2,
-                    "max_tokens": 400,
-                },
+    namespace = _explanation_cache_namespace()
+    cache_key = _explanation_cache_key(prompt)
+    explanation_text = await get_result_cache().aget(namespace, cache_key)
+    if explanation_text is None and cache_key in _inflight:
+        explanation_text = await asyncio.shield(_inflight[cache_key])
+    charged = explanation_text is None
+
+    if charged:
+        if not is_pro and used_count >= FREE_MONTHLY_LIMIT:
+            raise HTTPException(
+                status_code=403,
+                detail=f"Free plan limit reached ({FREE_MONTHLY_LIMIT} explanations/month). Upgrade to Pro for unlimited explanations.",
             )
-    except httpx.HTTPError:
-        raise HTTPException(status_code=502, detail="AI explanation service unavailable")
 
-    if resp.status_code != 200:
-        raise HTTPException(status_code=502, detail="AI explanation service error")
-
-    try:
-        data = resp.json()
-        explanation_text = data["choices"][0]["message"]["content"]
-    except (KeyError, IndexError, ValueError):
-        raise HTTPException(status_code=502, detail="Unexpected AI response format")
+        # ── Call OpenAI (shared with identical requests) ──
+        task = asyncio.create_task(_request_explanation(prompt, namespace, cache_key))
+        _inflight[cache_key] = task
+        task.add_done_callback(lambda _: _inflight.pop(cache_key, None))
+        explanation_text = await asyncio.shield(task)
 
     # Parse alternative suggestion from the response
     alternative = None
@@ -143,21 +148,7 @@ async def explain_move(
         alternative = _extract_alternative(explanation_text, body.best_move_san)
 
     # ── Persist per-user monthly usage ──────────────────
-    if usage_row:
-        usage_row.current_count += 1
-    else:
-        usage_row = Streak(
-            user_id=user.id,
-            streak_type=EXPLANATIONS_STREAK_TYPE,
-            context=_month_context(),
-            current_count=1,
-            best_count=1,
-            started_at=datetime.utcnow(),
-        )
-        db.add(usage_row)
-
-    await db.commit()
-    new_used_count = usage_row.current_count
+    new_used_count = await _record_explanation_use(db, user.id, usage_row) if charged else used_count
 
     return ExplainMoveResponse(
         explanation=explanation_text,
@@ -169,6 +160,117 @@ async def explain_move(
     )
 
 
+@router.post("/explain-move/stream")
+async def explain_move_stream(
+    body: ExplainMoveRequest,
+    request: Request,
+    user: User = Depends(require_stream_user),
+    db: AsyncSession = Depends(get_db, scope="function"),
+):
+    """
+    Streaming variant of /explain-move (SSE). Emits `token` events as the
+    explanation is generated, then `complete` with the ExplainMoveResponse
+    fields. Quota is only charged once the answer has arrived in full;
+    cached or in-flight explanations arrive as a single token, free.
+    """
+    settings = get_settings()
+
+    if not settings.openai_api_key:
+        raise HTTPException(
+            status_code=503,
+            detail="AI explanations not configured (missing OpenAI API key)",
+        )
+
+    is_pro = user.subscription_tier == "pro"
+    _, used_count = await _get_monthly_explanations_usage(db, user.id)
+    concepts = _extract_concepts(body)
+    severity = _determine_severity(body)
+    prompt = _build_explanation_prompt(body, concepts)
+    namespace = _explanation_cache_namespace()
+    cache_key = _explanation_cache_key(prompt)
+    cached = await get_result_cache().aget(namespace, cache_key)
+
+    if cached is None and cache_key not in _inflight:
+        if not is_pro and used_count >= FREE_MONTHLY_LIMIT:
+            raise HTTPException(
+                status_code=403,
+                detail=f"Free plan limit reached ({FREE_MONTHLY_LIMIT} explanations/month). Upgrade to Pro for unlimited explanations.",
+            )
+
+    async def event_stream():
+        explanation_text = cached
+        charged = False
+        try:
+            if explanation_text is None and cache_key not in _inflight:
+                # An in-flight call seen at request time may have finished since
+                explanation_text = await get_result_cache().aget(namespace, cache_key)
+            if explanation_text is None and cache_key in _inflight:
+                explanation_text = await asyncio.shield(_inflight[cache_key])
+            if explanation_text is not None:
+                yield f"data: {json.dumps({'type': 'token', 'text': explanation_text})}\n\n"
+            else:
+                # Only now is this request charged: the quota check above may
+                # have been skipped for an in-flight call that has since failed
+                if not is_pro and used_count >= FREE_MONTHLY_LIMIT:
+                    raise HTTPException(
+                        status_code=403,
+                        detail=f"Free plan limit reached ({FREE_MONTHLY_LIMIT} explanations/month). Upgrade to Pro for unlimited explanations.",
+                    )
+                charged = True
+                parts: list[str] = []
+                done = asyncio.get_running_loop().create_future()
+                done.add_done_callback(lambda f: f.cancelled() or f.exception())
+                _inflight[cache_key] = done
+                try:
+                    async for delta in stream_chat_completion(
+                        model=EXPLANATION_MODEL,
+                        messages=_explanation_messages(prompt),
+                        temperature=0.2,
+                        max_tokens=400,
+                    ):
+                        parts.append(delta)
+                        yield f"data: {json.dumps({'type': 'token', 'text': delta})}\n\n"
+                    explanation_text = "".join(parts)
+                    await get_result_cache().aput(namespace, cache_key, explanation_text)
+                    done.set_result(explanation_text)
+                except LLMError as e:
+                    done.set_exception(HTTPException(status_code=502, detail=e.detail))
+                    raise
+                finally:
+                    if not done.done():
+                        done.set_exception(HTTPException(status_code=503, detail="Explanation was interrupted, please retry"))
+                    # Leave single-flight only once the cache has the answer
+                    if _inflight.get(cache_key) is done:
+                        del _inflight[cache_key]
+        except (LLMError, HTTPException) as e:
+            yield f"data: {json.dumps({'type': 'error', 'message': e.detail})}\n\n"
+            return
+
+        used = used_count
+        if charged:
+            async with analysis_session() as save_db:
+                used = await _record_explanation_use(save_db, user.id)
+
+        alternative = None
+        if body.best_move_san and body.best_move_san != body.san and body.best_move_san != "?":
+            alternative = _extract_alternative(explanation_text, body.best_move_san)
+        response = ExplainMoveResponse(
+            explanation=explanation_text,
+            concepts=concepts,
+            severity=severity,
+            alternative=alternative,
+            explanations_used=used,
+            explanations_limit=None if is_pro else FREE_MONTHLY_LIMIT,
+        )
+        yield f"data: {json.dumps({'type': 'complete', 'result': response.model_dump()})}\n\n"
+
+    return StreamingResponse(
+        disconnect_aware(request, event_stream()),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
 @router.get("/quota")
 async def get_explanation_quota(
     user: User = Depends(require_user),
@@ -185,6 +287,69 @@ async def get_explanation_quota(
     )
 
 
+def _explanation_messages(prompt: str) -> list[dict]:
+    return [
+        {"role": "system", "content": EXPLANATION_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+
+
+async def _request_explanation(prompt: str, namespace: str, cache_key: str) -> str:
+    """Call the chat completion API and cache the explanation text."""
+    try:
+        explanation_text = await chat_completion(
+            model=EXPLANATION_MODEL,
+            messages=_explanation_messages(prompt),
+            temperature=0.2,
+            max_tokens=400,
+        )
+    except LLMError as e:
+        raise HTTPException(status_code=502, detail=e.detail)
+
+    await get_result_cache().aput(namespace, cache_key, explanation_text)
+    return explanation_text
+
+
+@lru_cache()
+def _explanation_cache_namespace() -> str:
+    """Current versioned namespace; entries from older prompt versions are purged once."""
+    namespace = f"{EXPLANATION_CACHE_PREFIX}{EXPLANATION_MODEL}:v{EXPLANATION_PROMPT_VERSION}"
+    get_result_cache().clear_namespace_prefix(EXPLANATION_CACHE_PREFIX, keep=namespace)
+    return namespace
+
+
+def _explanation_cache_key(prompt: str) -> str:
+    """
+    Hash of the user prompt sent to the model. The model, system prompt and
+    prompt template are covered by the namespace, so two requests share an
+    entry exactly when the model would be asked the same question.
+    """
+    return hashlib.sha256(prompt.encode()).hexdigest()
+
+
+async def _record_explanation_use(
+    db: AsyncSession, user_id: str, usage_row: Optional[Streak] = None
+) -> int:
+    """Count one explanation against this month's quota; returns the new count."""
+    if usage_row is None:
+        usage_row, _ = await _get_monthly_explanations_usage(db, user_id)
+    if usage_row:
+        usage_row.current_count += 1
+    else:
+        usage_row = Streak(
+            user_id=user_id,
+            streak_type=EXPLANATIONS_STREAK_TYPE,
+            context=_month_context(),
+            current_count=1,
+            best_count=1,
+            started_at=datetime.utcnow(),
+        )
+        db.add(usage_row)
+
+    await db.commit()
+    return usage_row.current_count
+
+
 def _month_context(dt: Optional[datetime] = None) -> str:
     now = dt or datetime.utcnow()
     return now.strftime("%Y-%m")
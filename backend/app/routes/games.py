@@ -4,21 +4,22 @@ Games routes – Fetch from Lichess, import Chess.com PGN, list user games.
 
 from __future__ import annotations
 
-from io import StringIO
 from typing import Optional
 
-import chess.pgn
 import httpx
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
 from pydantic import BaseModel
 from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import defer, selectinload
 
 from app.auth import require_user
 from app.db.models import Game, User
 from app.db.session import get_db
 from app.analysis_core import extract_opening_name
+from app.cpu_pool import map_cpu, normalize_games
+from app.pgn_headers import HEADER_PREFIX_CHARS, iter_games, read_headers
+from app.repertoire import RepertoireDelta
 
 router = APIRouter()
 
@@ -100,30 +101,25 @@ async def list_games(
     count_q = select(func.count()).select_from(query.subquery())
     total = (await db.execute(count_q)).scalar() or 0
 
-    # Paginate — eagerly load analysis relationship to avoid lazy-load in async
+    # Paginate — eagerly load analysis relationship to avoid lazy-load in async.
+    # The movetext is never needed for a listing, so it is not loaded.
     query = (
-        query.options(selectinload(Game.analysis))
+        query.options(selectinload(Game.analysis), defer(Game.moves_pgn))
         .order_by(Game.date.desc())
         .offset((page - 1) * per_page)
         .limit(per_page)
     )
     rows = (await db.execute(query)).scalars().all()
+    fallback_names = await _header_player_names(
+        db, [g.id for g in rows if not g.white_player or not g.black_player]
+    )
 
     games_out = []
     for g in rows:
-        # Extract player names from PGN if not stored in DB
-        wp = g.white_player
-        bp = g.black_player
-        if (not wp or not bp) and g.moves_pgn:
-            try:
-                import chess.pgn as cpgn
-                from io import StringIO as SIO
-                _pg = cpgn.read_game(SIO(g.moves_pgn))
-                if _pg:
-                    wp = wp or _pg.headers.get("White")
-                    bp = bp or _pg.headers.get("Black")
-            except Exception:
-                pass
+        # Player names from PGN headers if not stored in DB
+        hw, hb = fallback_names.get(g.id, (None, None))
+        wp = g.white_player or hw
+        bp = g.black_player or hb
         games_out.append(
             GameOut(
                 id=g.id,
@@ -161,7 +157,7 @@ async def fetch_lichess_games(
         "max": min(body.max_games, 100),
         "pgnInBody": "true",
         "clocks": "true",
-        "evals": "false",
+        "evals": "true",
         "opening": "true",
     }
     headers = {"Accept": "application/x-chess-pgn"}
@@ -325,7 +321,7 @@ async def auto_sync(
                 "max": 30,
                 "pgnInBody": "true",
                 "clocks": "true",
-                "evals": "false",
+                "evals": "true",
                 "opening": "true",
             }
             headers = {"Accept": "application/x-chess-pgn"}
@@ -397,19 +393,13 @@ async def get_game(
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
 
-    # Extract player names from PGN if not stored in DB
+    # Player names from PGN headers if not stored in DB
     wp = game.white_player
     bp = game.black_player
     if (not wp or not bp) and game.moves_pgn:
-        try:
-            import chess.pgn as cpgn
-            from io import StringIO as SIO
-            _pg = cpgn.read_game(SIO(game.moves_pgn))
-            if _pg:
-                wp = wp or _pg.headers.get("White")
-                bp = bp or _pg.headers.get("Black")
-        except Exception:
-            pass
+        headers = read_headers(game.moves_pgn)
+        wp = wp or headers.get("White")
+        bp = bp or headers.get("Black")
 
     resp = {
         "id": game.id,
@@ -449,6 +439,24 @@ async def get_game(
 # ═══════════════════════════════════════════════════════════
 
 
+async def _header_player_names(db: AsyncSession, game_ids: list[int]) -> dict[int, tuple]:
+    """
+    {game_id: (White, Black)} read from the tag section of the stored PGN.
+    Only a prefix of moves_pgn is fetched; rows backfilled by
+    scripts/backfill_player_names.py never get here.
+    """
+    if not game_ids:
+        return {}
+    rows = await db.execute(
+        select(Game.id, func.left(Game.moves_pgn, HEADER_PREFIX_CHARS)).where(Game.id.in_(game_ids))
+    )
+    names = {}
+    for game_id, prefix in rows:
+        headers = read_headers(prefix or "")
+        names[game_id] = (headers.get("White"), headers.get("Black"))
+    return names
+
+
 async def _import_pgn_games(
     db: AsyncSession, user: User, pgn_text: str, platform: str
 ) -> int:
@@ -456,7 +464,6 @@ async def _import_pgn_games(
     from datetime import datetime
     import hashlib
 
-    pgn_io = StringIO(pgn_text)
     imported = 0
 
     # Eagerly read user attributes to avoid lazy-loading issues after rollback.
@@ -476,13 +483,10 @@ async def _import_pgn_games(
         row[0] for row in existing_ids_result.fetchall() if row[0]
     }
 
-    while True:
-        game = chess.pgn.read_game(pgn_io)
-        if game is None:
-            break
-
-        headers = game.headers
-        moves_pgn = str(game)
+    # Header pass: metadata and URL-based de-duplication, no move parsing
+    pending: list[tuple[str, dict]] = []
+    for lazy in iter_games(pgn_text):
+        headers = lazy.headers
 
         # Determine color and result
         white = headers.get("White", "")
@@ -514,25 +518,19 @@ async def _import_pgn_games(
         except (ValueError, AttributeError):
             dt = datetime.utcnow()
 
-        # Platform-specific game ID
+        # Platform-specific game ID. Games with a platform URL are
+        # de-duplicated from the headers alone, before the movetext is parsed.
         site = headers.get("Site", "")
         platform_game_id = None
         if "lichess.org" in site:
             platform_game_id = site.split("/")[-1]
         elif "chess.com" in site:
             platform_game_id = site.split("/")[-1]
-        else:
-            # Use a hash of the PGN
-            platform_game_id = hashlib.md5(moves_pgn.encode()).hexdigest()[:16]
 
         # Skip duplicates without touching the DB
         if platform_game_id and platform_game_id in existing_ids:
             continue
 
-        # Count moves
-        moves_list = list(game.mainline_moves())
-        moves_count = len(moves_list)
-
         # ELO
         try:
             white_elo = int(headers.get("WhiteElo", 0))
@@ -550,7 +548,7 @@ async def _import_pgn_games(
         eco = headers.get("ECO", None)
         time_control = headers.get("TimeControl", None)
 
-        game_row = Game(
+        pending.append((lazy.text, dict(
             user_id=user_id,
             platform=platform,
             platform_game_id=platform_game_id,
@@ -564,9 +562,22 @@ async def _import_pgn_games(
             time_control=time_control,
             player_elo=player_elo,
             opponent_elo=opponent_elo,
-            moves_count=moves_count,
-            moves_pgn=moves_pgn,
-        )
+        )))
+
+    # Full parses (normalized PGN + move count) run in the CPU pool, in
+    # chunks, so a large import doesn't stall the event loop.
+    normalized = await map_cpu(normalize_games, [text for text, _ in pending])
+    repertoire = RepertoireDelta()
+
+    for (_, fields), (moves_pgn, moves_count) in zip(pending, normalized):
+        if fields["platform_game_id"] is None:
+            # Use a hash of the PGN
+            fields["platform_game_id"] = hashlib.md5(moves_pgn.encode()).hexdigest()[:16]
+        platform_game_id = fields["platform_game_id"]
+        if platform_game_id in existing_ids:
+            continue
+
+        game_row = Game(**fields, moves_count=moves_count, moves_pgn=moves_pgn)
 
         try:
             db.add(game_row)
@@ -577,7 +588,15 @@ async def _import_pgn_games(
                 existing_ids.add(platform_game_id)
         except Exception:
             await db.rollback()
+            # The rollback also dropped the games flushed so far
+            repertoire = RepertoireDelta()
             continue
 
+        repertoire.add_game(
+            user_id, fields["opening_name"], fields["color"], fields["result"],
+            eco_code=fields["eco_code"], played_at=fields["date"],
+        )
+
+    await repertoire.apply(db)
     await db.commit()
     return imported
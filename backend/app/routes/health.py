@@ -1,6 +1,9 @@
-"""Health check endpoint."""
+"""Health check and metrics endpoints."""
 
 from fastapi import APIRouter
+from fastapi.responses import Response
+
+from app.metrics import CONTENT_TYPE, REGISTRY
 
 router = APIRouter()
 
@@ -13,3 +16,9 @@ async def root():
 @router.get("/health")
 async def health():
     return {"status": "healthy"}
+
+
+@router.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of this process's analysis metrics."""
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
@@ -22,9 +22,11 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.auth import require_user
-from app.config import get_settings
 from app.db.models import Game, MoveEvaluation, OpeningRepertoire, User
 from app.db.session import get_db
+from app.admission import user_priority
+from app.engine_service import start_engine
+from app.cpu_pool import run_cpu
 
 router = APIRouter()
 
@@ -263,18 +265,64 @@ async def opening_tree(
             key = (ev.fen_before, ev.san)
             cpl_by_move.setdefault(key, []).append(ev.cp_loss)
 
-    # Build a trie of moves from all PGNs
+    # Build a trie of moves from all PGNs (parsing runs in the CPU pool)
+    root = await run_cpu(
+        _build_opening_trie, [(g.moves_pgn, g.result) for g in games if g.moves_pgn], max_depth
+    )
+
+    # Convert trie to response format (prune branches with < 2 games)
+    def to_tree_nodes(node: dict, min_games: int = 2) -> list[dict]:
+        result = []
+        for child_data in sorted(
+            node["children"].values(),
+            key=lambda c: c["games"],
+            reverse=True,
+        ):
+            if child_data["games"] < min_games:
+                continue
+
+            total = child_data["games"]
+            wr = round((child_data["wins"] / total) * 100, 1) if total > 0 else 0
+
+            # Cross-reference engine eval data
+            fen = child_data.get("fen_before")
+            ev_data = eval_by_fen.get(fen, {}) if fen else {}
+
+            # Compute average CPL for this specific move
+            cpl_key = (fen, child_data["san"]) if fen else None
+            cpl_values = cpl_by_move.get(cpl_key, []) if cpl_key else []
+            avg_cpl = round(sum(cpl_values) / len(cpl_values), 1) if cpl_values else None
+
+            result.append({
+                "san": child_data["san"],
+                "uci": child_data.get("uci"),
+                "games": total,
+                "wins": child_data["wins"],
+                "draws": child_data["draws"],
+                "losses": child_data["losses"],
+                "win_rate": wr,
+                "best_move_san": ev_data.get("best_move_san"),
+                "eval_cp": ev_data.get("eval_before"),
+                "average_cpl": avg_cpl,
+                "children": to_tree_nodes(child_data, min_games),
+            })
+        return result
+
+    tree = to_tree_nodes(root)
+
+    return {"tree": tree, "total_games": len(games), "color": color}
+
+
+def _build_opening_trie(games: list[tuple[str, str]], max_depth: int) -> dict:
+    """Move trie (with per-node W/D/L counts) over the first `max_depth` plies of (pgn, result) pairs."""
     import chess.pgn
     from io import StringIO
 
     root: dict = {"children": {}, "games": 0, "wins": 0, "draws": 0, "losses": 0}
 
-    for game in games:
-        if not game.moves_pgn:
-            continue
-
+    for moves_pgn, result in games:
         try:
-            pgn_io = StringIO(game.moves_pgn)
+            pgn_io = StringIO(moves_pgn)
             pgn_game = chess.pgn.read_game(pgn_io)
             if not pgn_game:
                 continue
@@ -307,9 +355,9 @@ async def opening_tree(
 
                 child = node["children"][san]
                 child["games"] += 1
-                if game.result == "win":
+                if result == "win":
                     child["wins"] += 1
-                elif game.result == "draw":
+                elif result == "draw":
                     child["draws"] += 1
                 else:
                     child["losses"] += 1
@@ -319,47 +367,7 @@ async def opening_tree(
         except Exception:
             continue
 
-    # Convert trie to response format (prune branches with < 2 games)
-    def to_tree_nodes(node: dict, min_games: int = 2) -> list[dict]:
-        result = []
-        for child_data in sorted(
-            node["children"].values(),
-            key=lambda c: c["games"],
-            reverse=True,
-        ):
-            if child_data["games"] < min_games:
-                continue
-
-            total = child_data["games"]
-            wr = round((child_data["wins"] / total) * 100, 1) if total > 0 else 0
-
-            # Cross-reference engine eval data
-            fen = child_data.get("fen_before")
-            ev_data = eval_by_fen.get(fen, {}) if fen else {}
-
-            # Compute average CPL for this specific move
-            cpl_key = (fen, child_data["san"]) if fen else None
-            cpl_values = cpl_by_move.get(cpl_key, []) if cpl_key else []
-            avg_cpl = round(sum(cpl_values) / len(cpl_values), 1) if cpl_values else None
-
-            result.append({
-                "san": child_data["san"],
-                "uci": child_data.get("uci"),
-                "games": total,
-                "wins": child_data["wins"],
-                "draws": child_data["draws"],
-                "losses": child_data["losses"],
-                "win_rate": wr,
-                "best_move_san": ev_data.get("best_move_san"),
-                "eval_cp": ev_data.get("eval_before"),
-                "average_cpl": avg_cpl,
-                "children": to_tree_nodes(child_data, min_games),
-            })
-        return result
-
-    tree = to_tree_nodes(root)
-
-    return {"tree": tree, "total_games": len(games), "color": color}
+    return root
 
 
 # ═══════════════════════════════════════════════════════════
@@ -539,8 +547,6 @@ async def validate_move(
     Check whether a move is viable (<= max_cp_loss cp loss) using Stockfish.
     Used by the opening drill to accept any reasonable move.
     """
-    settings = get_settings()
-
     try:
         board = chess.Board(body.fen)
     except (ValueError, TypeError):
@@ -554,7 +560,7 @@ async def validate_move(
     turn = board.turn
 
     try:
-        transport, engine = await chess.engine.popen_uci(settings.stockfish_path)
+        engine = await start_engine("quick", pipeline="openings", priority=user_priority(user))
     except Exception:
         raise HTTPException(503, "Stockfish engine unavailable")
 
@@ -578,7 +584,7 @@ async def validate_move(
         )
         eval_after = _pov_to_cp(info_after["score"], turn)
     finally:
-        await engine.quit()
+        await engine.close()
 
     cp_loss = max(0, eval_before - eval_after)
     viable = cp_loss <= body.max_cp_loss
@@ -606,7 +612,6 @@ async def best_move(
     user: User = Depends(require_user),
 ):
     """Return the engine's best move for a given FEN (used for opponent replies in drill)."""
-    settings = get_settings()
 
     try:
         board = chess.Board(body.fen)
@@ -614,7 +619,7 @@ async def best_move(
         raise HTTPException(400, "Invalid FEN")
 
     try:
-        transport, engine = await chess.engine.popen_uci(settings.stockfish_path)
+        engine = await start_engine("quick", pipeline="openings", priority=user_priority(user))
     except Exception:
         raise HTTPException(503, "Stockfish engine unavailable")
 
@@ -629,6 +634,6 @@ async def best_move(
             raise HTTPException(500, "Engine returned no move")
         san = board.san(pv[0])
     finally:
-        await engine.quit()
+        await engine.close()
 
     return BestMoveResponse(best_move_san=san)
@@ -0,0 +1,65 @@
+"""
+SSE helpers – disconnect-aware streaming for long-running engine work.
+
+Starlette only notices a closed connection when the next chunk is sent, so a
+generator that is busy in `engine.analyse` keeps burning CPU for a tab that
+is already gone. `disconnect_aware` runs the event generator in its own task
+and polls `request.is_disconnected()`; on disconnect the task is cancelled,
+which interrupts the in-flight engine call and runs the generator's
+`finally` / `except CancelledError` cleanup.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import AsyncIterator
+
+from fastapi import Request
+
+from app.metrics import SSE_SEND_SECONDS
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+
+_DONE = object()
+
+
+async def disconnect_aware(
+    request: Request,
+    events: AsyncIterator[str],
+    poll_interval: float = 0.5,
+) -> AsyncIterator[str]:
+    """Re-yield `events`, cancelling the producer as soon as the client disconnects."""
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def produce() -> None:
+        try:
+            async for chunk in events:
+                queue.put_nowait(chunk)
+        finally:
+            queue.put_nowait(_DONE)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            try:
+                chunk = await asyncio.wait_for(queue.get(), timeout=poll_interval)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                continue
+            if chunk is _DONE:
+                break
+            # The generator resumes once the server has written the chunk.
+            with SSE_SEND_SECONDS.time():
+                yield chunk
+    finally:
+        if not producer.done():
+            producer.cancel()
+        try:
+            await producer
+        except asyncio.CancelledError:
+            pass
@@ -7,185 +7,283 @@ Run with: arq app.worker.WorkerSettings
 from __future__ import annotations
 
 import asyncio
+import logging
 from datetime import datetime
 from typing import List
 
-from sqlalchemy import select
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.config import get_settings
 from app.db.models import AnalysisJob, Game, GameAnalysis, MoveEvaluation
 from app.db.session import async_session
+from app.engine_service import start_engine
+from app.engine_supervisor import EngineUnavailable
+from app.job_scheduler import ENGINE_PRIORITY, claim_next_job, requeue, requeue_stale_jobs, should_yield
+from app.metrics import ENGINE_SEARCH_SECONDS, ENGINE_SEARCHES, GAMES_ANALYZED, STAGE_SECONDS
+from app.repertoire import RepertoireDelta
+
+logger = logging.getLogger(__name__)
 
 
 async def run_analysis(ctx: dict, job_id: int, game_ids: List[int], depth: int = 12):
     """
-    Background task: Run Stockfish analysis on a list of games.
-    Updates the AnalysisJob row with progress.
+    Background task, enqueued once per AnalysisJob by /analysis/start.
+
+    Jobs are taken from the analysis_jobs table in scheduling order (see
+    app/job_scheduler.py), not arq order, so this call may run other jobs
+    first; it keeps claiming work until nothing is claimable. The arguments
+    only fill in jobs queued before game_ids / depth were stored on the row.
+    """
+    async with async_session() as db:
+        await requeue_stale_jobs(db)
+        job = await db.get(AnalysisJob, job_id)
+        if job is not None and job.game_ids is None and job.status == "pending":
+            job.game_ids, job.depth = list(game_ids), depth
+        await db.commit()
+
+    while True:
+        async with async_session() as db:
+            job = await claim_next_job(db)
+            if job is None:
+                return
+            await _run_job(db, job)
+
+
+async def _run_job(db: AsyncSession, job: AnalysisJob) -> None:
+    """
+    Analyse `job` game by game until it is finished, or until a more urgent
+    job is waiting – then hand it back to the queue with the games left.
+    """
+    engine = None
+    try:
+        # Open Stockfish engine (local and supervised, or the host's engine service)
+        engine = await start_engine("batch", pipeline="worker", priority=ENGINE_PRIORITY[job.priority_class])
+
+        remaining = list(job.game_ids or [])
+        while remaining:
+            await _analyse_game(db, engine, job, remaining[0])
+            remaining = remaining[1:]
+            job.game_ids = remaining
+            job.heartbeat_at = func.now()
+            await db.commit()
+            if remaining and await should_yield(db, job):
+                requeue(job)
+                await db.commit()
+                return
+
+        # Mark job complete
+        job.status = "completed"
+        job.completed_at = datetime.utcnow()
+        db.add(job)
+        await db.commit()
+
+    except Exception as e:
+        # Logged rather than raised so the claim loop moves on to the next job
+        logger.exception("Analysis job %s failed", job.id)
+        await db.rollback()
+        await db.refresh(job)
+        job.status = "failed"
+        job.error = str(e)[:500]
+        job.completed_at = datetime.utcnow()
+        db.add(job)
+        await db.commit()
+    finally:
+        if engine is not None:
+            await engine.close()
+
+
+async def _analyse_game(db: AsyncSession, engine, job: AnalysisJob, game_id: int) -> None:
+    """
+    Analyse one game of `job` and commit its rows with the job's progress.
+    Games that can't be analysed are skipped (see `_skip_game`).
     """
     import chess
     import chess.engine
     import chess.pgn
     from io import StringIO
 
-    settings = get_settings()
+    depth = job.depth
 
-    async with async_session() as db:
-        # Mark job as processing
-        result = await db.execute(select(AnalysisJob).where(AnalysisJob.id == job_id))
-        job = result.scalar_one_or_none()
-        if not job:
-            return
+    game_result = await db.execute(select(Game).where(Game.id == game_id))
+    game = game_result.scalar_one_or_none()
+    if not game:
+        _skip_game(job, game_id, "game not found")
+        return
 
-        job.status = "processing"
-        job.started_at = datetime.utcnow()
-        db.add(job)
-        await db.commit()
+    # A queued or requeued job can outlive its snapshot of game_ids:
+    # /analysis/run may have analysed the game in the meantime
+    if await _has_analysis(db, game_id):
+        _skip_game(job, game_id, "already analysed")
+        return
 
-        try:
-            # Open Stockfish engine
-            transport, engine = await chess.engine.popen_uci(settings.stockfish_path)
-
-            for game_id in game_ids:
-                game_result = await db.execute(select(Game).where(Game.id == game_id))
-                game = game_result.scalar_one_or_none()
-                if not game:
-                    continue
-
-                # Parse PGN
-                pgn_game = chess.pgn.read_game(StringIO(game.moves_pgn))
-                if not pgn_game:
-                    continue
-
-                board = pgn_game.board()
-                move_evals = []
-                total_cp_loss = 0
-                phase_losses = {"opening": [], "middlegame": [], "endgame": []}
-                blunders = 0
-                mistakes = 0
-                inaccuracies = 0
-                best_moves = 0
-                move_num = 0
-
-                prev_score_cp = 0
-
-                for move in pgn_game.mainline_moves():
-                    move_num += 1
-                    color = "white" if board.turn == chess.WHITE else "black"
-                    san = board.san(move)
-
-                    board.push(move)
-
-                    # Adaptive depth: deeper for positions with big eval swings
-                    current_depth = depth
-
-                    info = await engine.analyse(board, chess.engine.Limit(depth=current_depth))
-
-                    # Extract score
-                    score = info.get("score")
-                    score_cp = 0
-                    is_mate = False
-                    if score:
-                        pov = score.pov(chess.WHITE)
-                        if pov.is_mate():
-                            is_mate = True
-                            mate_val = pov.mate()
-                            score_cp = 10000 if (mate_val and mate_val > 0) else -10000
-                        else:
-                            score_cp = pov.score() or 0
-
-                    # CP loss (from the player's perspective)
-                    if color == "white":
-                        cp_loss = max(0, prev_score_cp - score_cp)
-                    else:
-                        cp_loss = max(0, score_cp - prev_score_cp)
-
-                    # Move quality classification
-                    if cp_loss == 0:
-                        quality = "Best"
-                        best_moves += 1
-                    elif cp_loss <= 10:
-                        quality = "Excellent"
-                    elif cp_loss <= 25:
-                        quality = "Good"
-                    elif cp_loss <= 100:
-                        quality = "Inaccuracy"
-                        inaccuracies += 1
-                    elif cp_loss <= 300:
-                        quality = "Mistake"
-                        mistakes += 1
-                    else:
-                        quality = "Blunder"
-                        blunders += 1
-
-                    # Phase classification (simplified)
-                    total_material = _count_material(board)
-                    if move_num <= 10:
-                        phase = "opening"
-                    elif total_material <= 13:
-                        phase = "endgame"
-                    else:
-                        phase = "middlegame"
-
-                    phase_losses[phase].append(cp_loss)
-                    total_cp_loss += cp_loss
-
-                    move_evals.append(MoveEvaluation(
-                        game_id=game_id,
-                        move_number=move_num,
-                        color=color,
-                        san=san,
-                        cp_loss=cp_loss,
-                        phase=phase,
-                        move_quality=quality,
-                        eval_before=prev_score_cp,
-                        eval_after=score_cp,
-                        is_mate_before=False,
-                        is_mate_after=is_mate,
-                    ))
-
-                    prev_score_cp = score_cp
-
-                # Save analysis
-                overall_cpl = total_cp_loss / move_num if move_num > 0 else 0
-
-                analysis = GameAnalysis(
-                    game_id=game_id,
-                    overall_cpl=round(overall_cpl, 2),
-                    phase_opening_cpl=_avg(phase_losses["opening"]),
-                    phase_middlegame_cpl=_avg(phase_losses["middlegame"]),
-                    phase_endgame_cpl=_avg(phase_losses["endgame"]),
-                    blunders_count=blunders,
-                    mistakes_count=mistakes,
-                    inaccuracies_count=inaccuracies,
-                    best_moves_count=best_moves,
-                    analysis_depth=depth,
-                )
-
-                db.add(analysis)
-                for me in move_evals:
-                    db.add(me)
-
-                # Update job progress
-                job.games_completed += 1
-                db.add(job)
-                await db.commit()
+    # Parse PGN
+    pgn_game = chess.pgn.read_game(StringIO(game.moves_pgn))
+    if not pgn_game:
+        _skip_game(job, game_id, "unreadable PGN")
+        return
 
-            await engine.quit()
+    board = pgn_game.board()
+    move_evals = []
+    total_cp_loss = 0
+    phase_losses = {"opening": [], "middlegame": [], "endgame": []}
+    blunders = 0
+    mistakes = 0
+    inaccuracies = 0
+    best_moves = 0
+    move_num = 0
 
-            # Mark job complete
-            job.status = "completed"
-            job.completed_at = datetime.utcnow()
-            db.add(job)
-            await db.commit()
+    prev_score_cp = 0
+
+    for move in pgn_game.mainline_moves():
+        move_num += 1
+        color = "white" if board.turn == chess.WHITE else "black"
+        san = board.san(move)
+
+        board.push(move)
 
-        except Exception as e:
-            job.status = "failed"
-            job.error = str(e)[:500]
-            job.completed_at = datetime.utcnow()
-            db.add(job)
+        # Adaptive depth: deeper for positions with big eval swings
+        current_depth = depth
+
+        try:
+            with ENGINE_SEARCH_SECONDS.time(kind="post"):
+                info = await engine.analyse(board, chess.engine.Limit(depth=current_depth), game=game_id)
+        except EngineUnavailable as e:
+            # Stockfish kept failing here even after restarts:
+            # give up on this game rather than the whole job
+            skip_reason = f"engine unavailable: {e}"
+            move_evals = None
+            break
+        ENGINE_SEARCHES.inc(kind="post")
+
+        # Extract score
+        score = info.get("score")
+        score_cp = 0
+        is_mate = False
+        if score:
+            pov = score.pov(chess.WHITE)
+            if pov.is_mate():
+                is_mate = True
+                mate_val = pov.mate()
+                score_cp = 10000 if (mate_val and mate_val > 0) else -10000
+            else:
+                score_cp = pov.score() or 0
+
+        # CP loss (from the player's perspective)
+        if color == "white":
+            cp_loss = max(0, prev_score_cp - score_cp)
+        else:
+            cp_loss = max(0, score_cp - prev_score_cp)
+
+        # Move quality classification
+        if cp_loss == 0:
+            quality = "Best"
+            best_moves += 1
+        elif cp_loss <= 10:
+            quality = "Excellent"
+        elif cp_loss <= 25:
+            quality = "Good"
+        elif cp_loss <= 100:
+            quality = "Inaccuracy"
+            inaccuracies += 1
+        elif cp_loss <= 300:
+            quality = "Mistake"
+            mistakes += 1
+        else:
+            quality = "Blunder"
+            blunders += 1
+
+        # Phase classification (simplified)
+        total_material = _count_material(board)
+        if move_num <= 10:
+            phase = "opening"
+        elif total_material <= 13:
+            phase = "endgame"
+        else:
+            phase = "middlegame"
+
+        phase_losses[phase].append(cp_loss)
+        total_cp_loss += cp_loss
+
+        move_evals.append(MoveEvaluation(
+            game_id=game_id,
+            move_number=move_num,
+            color=color,
+            san=san,
+            cp_loss=cp_loss,
+            phase=phase,
+            move_quality=quality,
+            eval_before=prev_score_cp,
+            eval_after=score_cp,
+            is_mate_before=False,
+            is_mate_after=is_mate,
+        ))
+
+        prev_score_cp = score_cp
+
+    if move_evals is None:
+        GAMES_ANALYZED.inc(pipeline="worker", outcome="error")
+        _skip_game(job, game_id, skip_reason)
+        return
+
+    # Save analysis
+    overall_cpl = total_cp_loss / move_num if move_num > 0 else 0
+
+    analysis = GameAnalysis(
+        game_id=game_id,
+        overall_cpl=round(overall_cpl, 2),
+        phase_opening_cpl=_avg(phase_losses["opening"]),
+        phase_middlegame_cpl=_avg(phase_losses["middlegame"]),
+        phase_endgame_cpl=_avg(phase_losses["endgame"]),
+        blunders_count=blunders,
+        mistakes_count=mistakes,
+        inaccuracies_count=inaccuracies,
+        best_moves_count=best_moves,
+        analysis_depth=depth,
+    )
+
+    db.add(analysis)
+    for me in move_evals:
+        db.add(me)
+
+    repertoire = RepertoireDelta()
+    repertoire.add_analysis(game.user_id, game.opening_name, game.color, analysis.overall_cpl)
+    await repertoire.apply(db)
+
+    # Update job progress
+    job.games_completed += 1
+    db.add(job)
+    with STAGE_SECONDS.time(pipeline="worker", stage="save"):
+        try:
             await db.commit()
-            raise
+        except IntegrityError:
+            # Analysed elsewhere while this job was searching
+            await db.rollback()
+            await db.refresh(job)
+            if not await _has_analysis(db, game_id):
+                raise
+            _skip_game(job, game_id, "already analysed")
+            return
+    GAMES_ANALYZED.inc(pipeline="worker", outcome="ok")
+
+
+async def _has_analysis(db: AsyncSession, game_id: int) -> bool:
+    result = await db.execute(select(GameAnalysis.id).where(GameAnalysis.game_id == game_id))
+    return result.first() is not None
+
+
+def _skip_game(job: AnalysisJob, game_id: int, reason: str) -> None:
+    """
+    Count a game that produced no analysis, so progress still reaches
+    total_games, and record it: the per-game reasons go in
+    job.result["skipped_games"], a summary in job.error. The caller commits.
+    """
+    logger.warning("Analysis job %s: skipped game %s (%s)", job.id, game_id, reason)
+    result = dict(job.result or {})
+    skipped = [*result.get("skipped_games", []), {"game_id": game_id, "reason": reason[:200]}]
+    job.result = {**result, "skipped_games": skipped}
+    job.error = f"{len(skipped)} game(s) skipped; see result.skipped_games"
+    job.games_completed += 1
 
 
 def _count_material(board) -> int:
@@ -0,0 +1,8 @@
+"""
+Offline benchmarks for app/analysis_core.py and the per-game analysis pipeline.
+
+Run `python -m benchmarks --help` from backend/. No database, network or
+Stockfish needed: games come from the checked-in fixtures and engine output
+from benchmarks.stub_engine. bench_classification.py and bench_tactics.py are
+the older single-purpose scripts.
+"""
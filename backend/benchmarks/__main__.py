@@ -0,0 +1,133 @@
+"""
+Run the analysis-core benchmarks.
+
+Usage (from backend/):
+    python -m benchmarks                          # all benchmarks, table only
+    python -m benchmarks --json bench.json        # also write machine-readable results
+    python -m benchmarks --compare baseline.json  # diff against a saved run
+    python -m benchmarks --only classify_move detect_phase --repeat 10
+
+Typical before/after check for an optimisation:
+    git stash && python -m benchmarks --json /tmp/base.json && git stash pop
+    python -m benchmarks --compare /tmp/base.json
+
+--compare exits with status 1 when any benchmark's median is more than
+--threshold slower than the baseline, so it can gate CI.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import chess
+
+from benchmarks.suite import BENCHMARKS, Inputs, run
+
+SCHEMA_VERSION = 1
+
+
+def _git_revision() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parent, capture_output=True, text=True, timeout=5,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return out.stdout.strip() or None
+
+
+def _meta(inputs: Inputs, repeat: int) -> dict:
+    return {
+        "schema": SCHEMA_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "python_chess": chess.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeat": repeat,
+        "corpus": inputs.summary(),
+    }
+
+
+def _print_result(name: str, result: dict) -> None:
+    print(
+        f"{name:<26} {result['median_us']:>11.1f} µs/{result['unit']:<10} "
+        f"(best {result['best_us']:.1f}, ±{result['stdev_us']:.1f}, {result['ops']} ops × {result['runs']})",
+        flush=True,
+    )
+
+
+def compare(results: dict[str, dict], baseline: dict, threshold: float, out=sys.stdout) -> int:
+    """Print the per-benchmark change in median time; returns the number of regressions."""
+    base = baseline.get("results", {})
+    print(f"\n📊 vs baseline {baseline.get('meta', {}).get('git_revision') or '?'} "
+          f"(threshold ±{threshold:.0%})", file=out)
+    regressions = 0
+    for name, result in results.items():
+        old = base.get(name)
+        if old is None or not old.get("median_us"):
+            print(f"   {name:<26} {'new':>11}", file=out)
+            continue
+        change = result["median_us"] / old["median_us"] - 1
+        if change > threshold:
+            mark = "⚠️  slower"
+            regressions += 1
+        elif change < -threshold:
+            mark = "✅ faster"
+        else:
+            mark = ""
+        print(f"   {name:<26} {old['median_us']:>11.1f} → {result['median_us']:>11.1f} µs  {change:>+7.1%}  {mark}", file=out)
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Analysis-core benchmarks")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), metavar="NAME",
+                        help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--repeat", type=int, default=5, help="timed passes per benchmark")
+    parser.add_argument("--json", metavar="PATH", help="write results as JSON ('-' for stdout)")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON from an earlier --json run")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative median change reported as slower/faster (default 0.10)")
+    parser.add_argument("--list", action="store_true", help="list benchmarks and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, bench in BENCHMARKS.items():
+            print(f"{name:<26} per {bench.unit}")
+        return 0
+
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    quiet = args.json == "-"
+    inputs = Inputs()
+    results = run(
+        args.only or list(BENCHMARKS), args.repeat, inputs,
+        on_result=None if quiet else _print_result,
+    )
+    report = {"meta": _meta(inputs, args.repeat), "results": results}
+
+    if args.json == "-":
+        print(json.dumps(report, indent=2))
+    elif args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2) + "\n")
+        print(f"\n💾 Results written to {args.json}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold, out=sys.stderr if quiet else sys.stdout)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
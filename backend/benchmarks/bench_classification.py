@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Per-game classification CPU benchmark (no engine).
+
+Derives both players' analyses for every game in fixtures/games.pgn with
+`derive_game_analysis`, using the games' embedded [%eval] annotations as the
+post-move scores and a deterministic best move per ply. This is the work
+left on the request path once engine time is cached or shared. The
+fixture games are synthetic (random legal moves, invented evals; see
+benchmarks/corpus.py), so use it for before/after comparisons only.
+
+Usage:
+    python benchmarks/bench_classification.py [--repeat 3]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import chess
+import chess.pgn
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.analysis_core import derive_game_analysis
+from app.engine_evals import new_plies, seed_from_annotations
+
+FIXTURE = Path(__file__).resolve().parent / "fixtures" / "games.pgn"
+
+
+def load_games() -> list[tuple[chess.pgn.Game, list[dict]]]:
+    games = []
+    with FIXTURE.open() as fh:
+        while True:
+            game = chess.pgn.read_game(fh)
+            if game is None:
+                break
+            plies = new_plies(game)
+            seed_from_annotations(game, plies)
+            board = game.board()
+            prev_cp = 0
+            for ply, move in zip(plies, game.mainline_moves()):
+                ply.setdefault("cp", prev_cp)
+                ply.setdefault("mate", None)
+                # Played move counts as best unless it dropped the eval
+                drop = (prev_cp - ply["cp"]) if board.turn == chess.WHITE else (ply["cp"] - prev_cp)
+                best = move if drop <= 30 else min(board.legal_moves, key=lambda m: m.uci())
+                ply.update(pre=True, best=best.uci(), gap=200)
+                prev_cp = ply["cp"]
+                board.push(move)
+            games.append((game, plies))
+    return games
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    games = load_games()
+    total_plies = sum(len(p) for _, p in games)
+    best = float("inf")
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        for game, plies in games:
+            for color in ("white", "black"):
+                derive_game_analysis(game, plies, color, 1500)
+        best = min(best, time.perf_counter() - start)
+
+    runs = len(games) * 2
+    print(
+        f"derive_game_analysis  {best / runs * 1000:8.2f} ms/game-side  "
+        f"{best / (total_plies * 2) * 1e6:7.1f} µs/ply  "
+        f"({len(games)} games, {total_plies} plies, best of {args.repeat})"
+    )
+
+
+if __name__ == "__main__":
+    main()
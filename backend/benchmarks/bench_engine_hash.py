@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+What per-game `game` keys change about Stockfish's hash between games.
+
+Searches every position of the fixture games at a fixed depth twice, each
+time with a fresh engine started with the given profile:
+
+    shared    game=None, as before per-game keys: python-chess sends
+              `ucinewgame` only on the first search, so the hash carries
+              over from one game into the next
+    per-game  one game key per game (what evaluate_game passes now):
+              `ucinewgame` between games, hash kept from ply to ply
+
+and reports nodes and wall time per game for both, plus the difference.
+Within a game both passes keep the hash warm; what differs is whether
+entries from earlier games are kept (more hits on shared openings, but
+results depend on what was analysed before) or cleared.
+Needs a real Stockfish; scripts/fake_stockfish.py only checks the plumbing
+(it has no hash, so both passes come out the same).
+
+With --service N the games are also searched all at once through an
+in-process engine-service pool of N engines (what ENGINE_SERVICE_SOCKET
+setups do), and the pool's `new_games` count – `ucinewgame`s sent – is
+checked against the number of games: each game's plies must stay on one
+engine instead of clearing its hash between interleaved searches. That
+check works with fake_stockfish.py too.
+
+Usage (from backend/):
+    python benchmarks/bench_engine_hash.py [--depth 14] [--games 5] [--profile batch] [--service 4]
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from io import StringIO
+from pathlib import Path
+
+import chess
+import chess.engine
+import chess.pgn
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.config import DEFAULT_ENGINE_PROFILES, get_settings
+from app.engine_evals import close_engine, open_engine
+from app.engine_service import PRIORITY_BATCH, EngineServer, _encode_board, _encode_limit
+from app.pgn_headers import split_games
+from benchmarks.corpus import CORPUS_FILES, FIXTURES
+
+
+def load_games(limit: int) -> list[tuple[str, list[chess.Board]]]:
+    """(name, positions before each move and after the last) for the fixture games."""
+    games = []
+    for filename in CORPUS_FILES:
+        for text in split_games((FIXTURES / filename).read_text()):
+            game = chess.pgn.read_game(StringIO(text))
+            board = game.board()
+            boards = [board.copy()]
+            for move in game.mainline_moves():
+                board.push(move)
+                boards.append(board.copy())
+            h = game.headers
+            games.append((f"{h.get('White', '?')} - {h.get('Black', '?')}", boards))
+    return games[:limit] if limit else games
+
+
+async def search_game(engine, boards: list[chess.Board], depth: int, per_game: bool) -> tuple[int, float]:
+    """Total nodes and seconds for one game's positions."""
+    key = object() if per_game else None
+    nodes = 0
+    start = time.perf_counter()
+    for board in boards:
+        if board.is_game_over():
+            continue
+        info = await engine.analyse(board, chess.engine.Limit(depth=depth), game=key)
+        nodes += info.get("nodes", 0)
+    return nodes, time.perf_counter() - start
+
+
+async def run_pass(args, games, per_game: bool) -> list[tuple[int, float]]:
+    transport, engine = await open_engine(args.profile, path=args.stockfish)
+    try:
+        return [await search_game(engine, boards, args.depth, per_game) for _, boards in games]
+    finally:
+        await close_engine(transport, engine)
+
+
+async def run_service_pass(args, games) -> tuple[dict, float]:
+    """Every game at once through an in-process pool; its stats and wall time."""
+    server = EngineServer(args.profile, args.service, path=args.stockfish)
+    await server.start()
+    limit = chess.engine.Limit(depth=args.depth)
+    try:
+        start = time.perf_counter()
+        jobs = [
+            server.submit(PRIORITY_BATCH, _encode_board(board, f"bench:{i}"), chess.engine.Limit(**_encode_limit(limit)), None)
+            for i, (_, boards) in enumerate(games)
+            for board in boards
+            if not board.is_game_over()
+        ]
+        await asyncio.gather(*(job.result for job in jobs))
+        return server.stats(), time.perf_counter() - start
+    finally:
+        await server.close()
+
+
+async def main_async(args) -> None:
+    games = load_games(args.games)
+    profile = get_settings().engine_profile(args.profile)
+    print(
+        f"🔧 {len(games)} games, depth {args.depth}, profile {args.profile} "
+        f"(threads {profile.threads}, hash {profile.hash_mb} MB)"
+    )
+    shared = await run_pass(args, games, per_game=False)
+    per_game = await run_pass(args, games, per_game=True)
+
+    print(f"\n{'game':<40} {'shared nodes':>13} {'per-game':>12} {'change':>7} {'shared s':>9} {'per-game s':>11}")
+    for (name, _), (sn, st), (pn, pt) in zip(games, shared, per_game):
+        change = pn / sn - 1 if sn else 0.0
+        print(f"{name[:40]:<40} {sn:>13,} {pn:>12,} {change:>+7.1%} {st:>9.2f} {pt:>11.2f}")
+
+    shared_nodes, shared_time = sum(n for n, _ in shared), sum(t for _, t in shared)
+    game_nodes, game_time = sum(n for n, _ in per_game), sum(t for _, t in per_game)
+    n = len(games) or 1
+    print(
+        f"\n📊 Per game, per-game keys vs shared: {(game_nodes - shared_nodes) / n:+,.0f} nodes "
+        f"({game_nodes / shared_nodes - 1 if shared_nodes else 0:+.1%}) and "
+        f"{(game_time - shared_time) / n:+.2f}s ({game_time / shared_time - 1 if shared_time else 0:+.1%})"
+    )
+
+    if args.service:
+        stats, seconds = await run_service_pass(args, games)
+        ok = "✅" if stats["new_games"] == len(games) else "❌"
+        print(
+            f"\n{ok} Service pool ({args.service} engines, all games at once): {stats['new_games']} ucinewgame "
+            f"for {len(games)} games, {stats['restarts']} restarts, {seconds:.2f}s"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--stockfish", default=get_settings().stockfish_path)
+    parser.add_argument("--depth", type=int, default=14)
+    parser.add_argument("--games", type=int, default=5, help="first N fixture games (0 = all)")
+    parser.add_argument("--service", type=int, default=0, metavar="N",
+                        help="also run every game at once through an N-engine service pool")
+    parser.add_argument("--profile", default="batch",
+                        choices=sorted({*DEFAULT_ENGINE_PROFILES, *get_settings().engine_profiles}))
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
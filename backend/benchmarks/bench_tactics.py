@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the tactic detectors in app/analysis_core.py.
+
+Times `classify_blunder_subtype` and `detect_puzzle_tactics` over the fixed
+position set in fixtures/tactic_positions.txt (FEN;played_uci;best_uci).
+
+Usage:
+    python benchmarks/bench_tactics.py [--repeat 5]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import chess
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.analysis_core import classify_blunder_subtype, detect_puzzle_tactics
+
+FIXTURE = Path(__file__).resolve().parent / "fixtures" / "tactic_positions.txt"
+
+
+def load_fixture() -> list[tuple[chess.Board, chess.Move, chess.Move, str]]:
+    cases = []
+    for line in FIXTURE.read_text().splitlines():
+        if not line or line.startswith("#"):
+            continue
+        fen, played, best = line.split(";")
+        board = chess.Board(fen)
+        phase = "endgame" if len(board.piece_map()) <= 12 else "middlegame"
+        cases.append((board, chess.Move.from_uci(played), chess.Move.from_uci(best), phase))
+    return cases
+
+
+def bench(label: str, fn, cases, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for case in cases:
+            fn(*case)
+        best = min(best, time.perf_counter() - start)
+    per_call_us = best / len(cases) * 1e6
+    print(f"{label:<28} {per_call_us:9.1f} µs/call  ({len(cases)} positions, best of {repeat})")
+    return per_call_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    cases = load_fixture()
+    bench(
+        "classify_blunder_subtype",
+        lambda board, played, best, phase: classify_blunder_subtype(board, played, best, phase),
+        cases, args.repeat,
+    )
+    bench(
+        "detect_puzzle_tactics",
+        lambda board, played, best, phase: detect_puzzle_tactics(board.fen(), best.uci()),
+        cases, args.repeat,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Benchmark corpus – the checked-in PGN fixtures and the inputs derived from them.
+
+fixtures/classics.pgn holds real master games without annotations: short
+mates (Opera Game, Fool's Mate), sacrificial attacks, long technical games
+and a quiet 55-move draw. fixtures/games.pgn is a synthetic stand-in for
+annotated online games: 30 games of random legal moves (players w0/b0 …)
+with generated [%clk] values and invented [%eval] scores on every move, in
+Lichess export layout. They exercise clock parsing and the annotation fast
+path, but their positions and evals are not realistic, so classification
+and tactic timings on them are not representative; a real export (e.g.
+Lichess with clocks and server evals) should replace them when one can be
+checked in. fixtures/split_*.pgn are PGN layouts that game
+splitting and header scanning must get right (`;` comments containing `{`,
+tagless games, a missing or `*` Result tag); they are only used by the
+pgn_split benchmark, which checks its game counts and every game's headers
+against chess.pgn before timing.
+
+`load_corpus` parses every game and runs the engine pass once with the stub
+engine (both players' pre-move searches), which gives every benchmark the
+same evaluated plies. `positions` flattens the corpus into per-move inputs
+for the single-function benchmarks.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+from io import StringIO
+from pathlib import Path
+from typing import Optional
+
+import chess
+import chess.pgn
+
+from app.analysis_core import win_probability
+from app.engine_evals import evaluate_game, new_plies
+from app.pgn_headers import split_games
+from benchmarks.stub_engine import StubEngine
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+CORPUS_FILES = ("classics.pgn", "games.pgn")
+SPLIT_FILES = ("split_semicolon_comment.pgn", "split_tagless.pgn", "split_missing_result.pgn")
+TACTIC_POSITIONS = FIXTURES / "tactic_positions.txt"
+DEPTH = 12
+
+
+@dataclass
+class CorpusGame:
+    name: str
+    pgn_text: str
+    game: chess.pgn.Game
+    plies: list[dict] = field(default_factory=list)
+
+
+@dataclass
+class Position:
+    """One mainline move with the evaluations around it."""
+
+    board: chess.Board          # before the move
+    board_after: chess.Board
+    move: chess.Move
+    san: str
+    best: Optional[chess.Move]
+    gap: Optional[int]
+    move_number: int            # ply, 1-based
+    color: str
+    castled_white: bool
+    castled_black: bool
+    eval_before: int
+    eval_after: int
+    mate_before: Optional[int]
+    mate_after: Optional[int]
+
+    @property
+    def cp_loss(self) -> int:
+        if self.color == "white":
+            return min(800, max(0, self.eval_before - self.eval_after))
+        return min(800, max(0, self.eval_after - self.eval_before))
+
+    @property
+    def win_prob_before(self) -> float:
+        return win_probability(self.eval_before, self.mate_before is not None, self.mate_before)
+
+    @property
+    def win_prob_after(self) -> float:
+        return win_probability(self.eval_after, self.mate_after is not None, self.mate_after)
+
+
+def _game_name(game: chess.pgn.Game) -> str:
+    h = game.headers
+    return f"{h.get('White', '?')} - {h.get('Black', '?')} ({h.get('Event', '?')}, {h.get('Date', '?')[:4]})"
+
+
+async def _evaluate(engine: StubEngine, games: list[CorpusGame]) -> None:
+    for g in games:
+        for color in ("white", "black"):
+            await evaluate_game(engine, g.game, g.plies, DEPTH, color)
+
+
+def load_corpus(engine: Optional[StubEngine] = None) -> list[CorpusGame]:
+    """Every fixture game, parsed, with both players' plies evaluated."""
+    games = []
+    for filename in CORPUS_FILES:
+        for text in split_games((FIXTURES / filename).read_text()):
+            game = chess.pgn.read_game(StringIO(text))
+            games.append(CorpusGame(_game_name(game), text, game, new_plies(game)))
+    asyncio.run(_evaluate(engine or StubEngine(), games))
+    return games
+
+
+def positions(games: list[CorpusGame]) -> list[Position]:
+    out = []
+    for g in games:
+        board = g.game.board()
+        castled = {"white": False, "black": False}
+        prev_cp, prev_mate = 0, None
+        for node, ply in zip(g.game.mainline(), g.plies):
+            move = node.move
+            color = "white" if board.turn == chess.WHITE else "black"
+            if board.is_castling(move):
+                castled[color] = True
+            before = board.copy(stack=False)
+            san = board.san(move)
+            board.push(move)
+            out.append(Position(
+                board=before,
+                board_after=board.copy(stack=False),
+                move=move,
+                san=san,
+                best=chess.Move.from_uci(ply["best"]) if ply.get("best") else None,
+                gap=ply.get("gap"),
+                move_number=board.ply(),
+                color=color,
+                castled_white=castled["white"],
+                castled_black=castled["black"],
+                eval_before=prev_cp,
+                eval_after=ply["cp"],
+                mate_before=prev_mate,
+                mate_after=ply.get("mate"),
+            ))
+            prev_cp, prev_mate = ply["cp"], ply.get("mate")
+    return out
+
+
+def tactic_positions() -> list[tuple[chess.Board, chess.Move, chess.Move]]:
+    """fixtures/tactic_positions.txt as (board, played, best)."""
+    cases = []
+    for line in TACTIC_POSITIONS.read_text().splitlines():
+        if not line or line.startswith("#"):
+            continue
+        fen, played, best = line.split(";")
+        cases.append((chess.Board(fen), chess.Move.from_uci(played), chess.Move.from_uci(best)))
+    return cases
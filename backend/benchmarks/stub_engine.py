@@ -0,0 +1,94 @@
+"""
+In-process stand-in for Stockfish with the slice of the UciProtocol API the
+analysis pipeline uses (`analyse`, with and without multipv).
+
+Scores are a static material count plus the best free capture available to
+the side to move, so hanging pieces show up as real eval swings and the
+pipeline classifies blunders and generates puzzles as it would with an engine.
+Results are memoized per position: after the warm-up run an `analyse` call
+costs a dict lookup, which keeps the benchmark about our code rather than
+the stub's.
+"""
+
+from __future__ import annotations
+
+import chess
+import chess.engine
+
+PIECE_CP = {
+    chess.PAWN: 100,
+    chess.KNIGHT: 300,
+    chess.BISHOP: 320,
+    chess.ROOK: 500,
+    chess.QUEEN: 900,
+    chess.KING: 0,
+}
+
+
+def _static_cp(board: chess.Board) -> int:
+    """Material plus the best undefended capture, side-to-move POV."""
+    us, them = board.turn, not board.turn
+    material = 0
+    free_capture = 0
+    for square, piece in board.piece_map().items():
+        value = PIECE_CP[piece.piece_type]
+        if piece.color == us:
+            material += value
+        else:
+            material -= value
+            if (
+                value > free_capture
+                and board.is_attacked_by(us, square)
+                and not board.is_attacked_by(them, square)
+            ):
+                free_capture = value
+    return material + free_capture
+
+
+def _score(board: chess.Board) -> chess.engine.Score:
+    """Score of `board` for the side to move."""
+    if board.is_checkmate():
+        return chess.engine.Mate(0)
+    if board.is_stalemate() or board.is_insufficient_material():
+        return chess.engine.Cp(0)
+    return chess.engine.Cp(_static_cp(board))
+
+
+class StubEngine:
+    """One-ply material engine with memoized answers."""
+
+    def __init__(self):
+        self._cache: dict[tuple[str, int], list[chess.engine.InfoDict]] = {}
+        self.searches = 0
+
+    def _lines(self, board: chess.Board, multipv: int) -> list[chess.engine.InfoDict]:
+        key = (board.fen(), multipv)
+        lines = self._cache.get(key)
+        if lines is None:
+            ranked = []
+            for move in board.legal_moves:
+                board.push(move)
+                score = chess.engine.Mate(1) if board.is_checkmate() else -_score(board)
+                board.pop()
+                ranked.append((score, move))
+            ranked.sort(key=lambda item: (item[0], item[1].uci()), reverse=True)
+            if not ranked:
+                ranked = [(_score(board), None)]
+            lines = [
+                {
+                    "multipv": i + 1,
+                    "depth": 1,
+                    "nodes": len(ranked),
+                    "score": chess.engine.PovScore(score, board.turn),
+                    "pv": [move] if move else [],
+                }
+                for i, (score, move) in enumerate(ranked[:multipv])
+            ]
+            self._cache[key] = lines
+        return lines
+
+    async def analyse(self, board: chess.Board, limit: chess.engine.Limit, *, multipv=None, **kwargs):
+        self.searches += 1
+        if multipv is None:
+            return self._lines(board, 1)[0]
+        return self._lines(board, multipv)
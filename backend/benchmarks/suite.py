@@ -0,0 +1,299 @@
+"""
+Benchmark definitions and the timing loop.
+
+Each benchmark is a setup function registered with `@benchmark`: it receives
+the shared `Inputs` and returns a zero-argument callable that does one pass
+over its cases, plus the number of operations in that pass. `run` times
+`repeat` passes after a warm-up pass and reports per-operation times.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import statistics
+import time
+from dataclasses import dataclass
+from functools import cached_property
+from io import StringIO
+from typing import Callable
+
+import chess
+import chess.pgn
+
+from app.analysis_core import (
+    classify_blunder_subtype,
+    classify_move,
+    derive_game_analysis,
+    describe_board_for_ai,
+    detect_phase,
+    detect_puzzle_tactics,
+    generate_puzzle_data,
+)
+from app.engine_evals import ensure_solution_lines, evaluate_game, new_plies
+from app.pgn_headers import read_headers, split_games
+from benchmarks.corpus import (
+    CORPUS_FILES, DEPTH, FIXTURES, SPLIT_FILES, CorpusGame, Position, load_corpus, positions, tactic_positions,
+)
+from benchmarks.stub_engine import StubEngine
+
+Setup = Callable[["Inputs"], tuple[Callable[[], None], int]]
+
+
+@dataclass
+class Benchmark:
+    name: str
+    unit: str
+    setup: Setup
+
+
+BENCHMARKS: dict[str, Benchmark] = {}
+
+
+def benchmark(name: str, unit: str):
+    def register(setup: Setup) -> Setup:
+        BENCHMARKS[name] = Benchmark(name, unit, setup)
+        return setup
+    return register
+
+
+class Inputs:
+    """Corpus-derived inputs, built on first use and shared by all benchmarks."""
+
+    def __init__(self):
+        self.engine = StubEngine()
+
+    @cached_property
+    def games(self) -> list[CorpusGame]:
+        return load_corpus(self.engine)
+
+    @cached_property
+    def positions(self) -> list[Position]:
+        return positions(self.games)
+
+    @cached_property
+    def missed(self) -> list[tuple[chess.Board, chess.Move, chess.Move, str]]:
+        """(board, played, best, phase) wherever the played move wasn't the best one."""
+        cases = []
+        for p in self.positions:
+            if p.best is not None and p.best != p.move:
+                cases.append((p.board, p.move, p.best, "endgame" if len(p.board.piece_map()) <= 12 else "middlegame"))
+        for board, played, best in tactic_positions():
+            cases.append((board, played, best, "endgame" if len(board.piece_map()) <= 12 else "middlegame"))
+        return cases
+
+    def summary(self) -> dict:
+        return {
+            "games": len(self.games),
+            "plies": len(self.positions),
+            "clocked_games": sum(1 for g in self.games if "[%clk" in g.pgn_text),
+            "missed_best_cases": len(self.missed),
+        }
+
+
+# ═══════════════════════════════════════════════════════════
+# Benchmarks
+# ═══════════════════════════════════════════════════════════
+
+
+@benchmark("pgn_parse", unit="game")
+def _pgn_parse(inputs: Inputs):
+    texts = [g.pgn_text for g in inputs.games]
+
+    def run():
+        for text in texts:
+            chess.pgn.read_game(StringIO(text))
+    return run, len(texts)
+
+
+@benchmark("pgn_read_headers", unit="game")
+def _pgn_read_headers(inputs: Inputs):
+    texts = [g.pgn_text for g in inputs.games]
+
+    def run():
+        for text in texts:
+            read_headers(text)
+    return run, len(texts)
+
+
+@benchmark("pgn_split", unit="file")
+def _pgn_split(inputs: Inputs):
+    texts = [(FIXTURES / name).read_text() for name in (*CORPUS_FILES, *SPLIT_FILES)]
+    for name, text in zip((*CORPUS_FILES, *SPLIT_FILES), texts):
+        handle, expected = StringIO(text), []
+        while (game := chess.pgn.read_game(handle)) is not None:
+            expected.append(dict(game.headers))
+        found = [dict(read_headers(game_text)) for game_text in split_games(text)]
+        if len(found) != len(expected):
+            raise AssertionError(f"split_games found {len(found)} games in {name}, chess.pgn {len(expected)}")
+        for i, (ours, theirs) in enumerate(zip(found, expected)):
+            if ours != theirs:
+                raise AssertionError(f"read_headers differs from chess.pgn on game {i} of {name}: {ours} != {theirs}")
+
+    def run():
+        for text in texts:
+            for _ in split_games(text):
+                pass
+    return run, len(texts)
+
+
+@benchmark("detect_phase", unit="ply")
+def _detect_phase(inputs: Inputs):
+    cases = [(p.board_after, p.move_number, p.castled_white, p.castled_black) for p in inputs.positions]
+
+    def run():
+        for board, move_number, castled_white, castled_black in cases:
+            detect_phase(board, move_number, castled_white, castled_black)
+    return run, len(cases)
+
+
+@benchmark("classify_move", unit="ply")
+def _classify_move(inputs: Inputs):
+    cases = [
+        dict(
+            cp_loss=p.cp_loss,
+            win_prob_before=p.win_prob_before,
+            win_prob_after=p.win_prob_after,
+            color=p.color,
+            board_before=p.board,
+            move=p.move,
+            best_move=p.best,
+            is_only_legal=p.board.legal_moves.count() == 1,
+            eval_before_cp=p.eval_before,
+            eval_after_cp=p.eval_after,
+            is_mate_before=p.mate_before is not None,
+            is_mate_after=p.mate_after is not None,
+            mate_before=p.mate_before,
+            mate_after=p.mate_after,
+            player_elo=1500,
+        )
+        for p in inputs.positions
+    ]
+
+    def run():
+        for kwargs in cases:
+            classify_move(**kwargs)
+    return run, len(cases)
+
+
+@benchmark("classify_blunder_subtype", unit="position")
+def _classify_blunder_subtype(inputs: Inputs):
+    cases = inputs.missed
+
+    def run():
+        for board, played, best, phase in cases:
+            classify_blunder_subtype(board, played, best, phase)
+    return run, len(cases)
+
+
+@benchmark("detect_puzzle_tactics", unit="position")
+def _detect_puzzle_tactics(inputs: Inputs):
+    cases = [(board.fen(), best.uci()) for board, _, best, _ in inputs.missed]
+
+    def run():
+        for fen, best_uci in cases:
+            detect_puzzle_tactics(fen, best_uci)
+    return run, len(cases)
+
+
+@benchmark("generate_puzzle_data", unit="position")
+def _generate_puzzle_data(inputs: Inputs):
+    # Every case passes the quality / gap / eval filters, so the whole
+    # function runs (including tactic detection), not just the early exits.
+    cases = [
+        dict(
+            fen_before=board.fen(),
+            san=board.san(played),
+            best_move_san=board.san(best),
+            best_move_uci=best.uci(),
+            cp_loss=350,
+            phase=phase,
+            move_quality="Blunder",
+            move_number=board.ply() + 1,
+            best_second_gap_cp=400,
+            eval_before_cp=0,
+        )
+        for board, played, best, phase in inputs.missed
+    ]
+
+    def run():
+        for kwargs in cases:
+            generate_puzzle_data(**kwargs)
+    return run, len(cases)
+
+
+@benchmark("describe_board_for_ai", unit="ply")
+def _describe_board_for_ai(inputs: Inputs):
+    cases = [(p.board.fen(), p.san) for p in inputs.positions]
+
+    def run():
+        for fen, san in cases:
+            describe_board_for_ai(fen, san)
+    return run, len(cases)
+
+
+@benchmark("derive_game_analysis", unit="game-side")
+def _derive_game_analysis(inputs: Inputs):
+    games = inputs.games
+
+    def run():
+        for g in games:
+            for color in ("white", "black"):
+                derive_game_analysis(g.game, g.plies, color, 1500)
+    return run, len(games) * 2
+
+
+@benchmark("game_pipeline", unit="game-side")
+def _game_pipeline(inputs: Inputs):
+    """
+    What /analysis/run does per game and player, minus the database: parse,
+    engine pass (stub, memoized), derive, solution lines for puzzle candidates.
+    """
+    texts = [g.pgn_text for g in inputs.games]
+    engine = inputs.engine
+
+    async def analyse_all():
+        for text in texts:
+            game = chess.pgn.read_game(StringIO(text))
+            plies = new_plies(game)
+            for color in ("white", "black"):
+                await evaluate_game(engine, game, plies, DEPTH, color)
+                derived = derive_game_analysis(game, plies, color, 1500)
+                await ensure_solution_lines(engine, plies, derived["puzzle_candidates"], DEPTH)
+
+    def run():
+        asyncio.run(analyse_all())
+    return run, len(texts) * 2
+
+
+# ═══════════════════════════════════════════════════════════
+# Timing
+# ═══════════════════════════════════════════════════════════
+
+
+def measure(fn: Callable[[], None], ops: int, repeat: int) -> dict:
+    """Best / median / stdev of `repeat` passes (after one warm-up), in µs per op."""
+    fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) / ops * 1e6)
+    return {
+        "ops": ops,
+        "runs": repeat,
+        "best_us": round(min(samples), 3),
+        "median_us": round(statistics.median(samples), 3),
+        "stdev_us": round(statistics.stdev(samples), 3) if len(samples) > 1 else 0.0,
+    }
+
+
+def run(names: list[str], repeat: int, inputs: Inputs | None = None, on_result=None) -> dict[str, dict]:
+    inputs = inputs or Inputs()
+    results = {}
+    for name in names:
+        bench = BENCHMARKS[name]
+        fn, ops = bench.setup(inputs)
+        results[name] = {"unit": bench.unit, **measure(fn, ops, repeat)}
+        if on_result:
+            on_result(name, results[name])
+    return results
@@ -0,0 +1,21 @@
+-- Migration 003: Shared per-game engine evaluations
+-- Run with: psql $DATABASE_URL -f migrations/003_shared_engine_evals.sql
+--
+-- The same Lichess/Chess.com game imported by both players is searched once.
+-- Per-ply Stockfish output is keyed by a hash of the mainline movetext plus
+-- the search depth and reused for every user's analysis of that game.
+
+CREATE TABLE IF NOT EXISTS game_engine_evals (
+    id               SERIAL PRIMARY KEY,
+    movetext_hash    TEXT NOT NULL,
+    platform         TEXT,
+    platform_game_id TEXT,
+    depth            INTEGER NOT NULL,
+    plies            JSONB NOT NULL DEFAULT '[]'::jsonb,
+    created_at       TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at       TIMESTAMPTZ NOT NULL DEFAULT now(),
+    CONSTRAINT uq_engine_evals_movetext_depth UNIQUE (movetext_hash, depth)
+);
+
+CREATE INDEX IF NOT EXISTS ix_engine_evals_platform_game
+    ON game_engine_evals (platform, platform_game_id);
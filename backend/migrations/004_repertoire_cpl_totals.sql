@@ -0,0 +1,15 @@
+-- Migration 004: Incremental opening repertoire aggregates
+-- Run with: psql $DATABASE_URL -f migrations/004_repertoire_cpl_totals.sql
+--
+-- opening_repertoire is now maintained by batched upserts on every import
+-- and analysis path (app/repertoire.py). average_cpl can't be updated
+-- incrementally on its own, so the running sum and the number of analysed
+-- games are stored next to it.
+--
+-- After applying, fill the new columns (and all games imported before this
+-- change) with:
+--     python scripts/rebuild_repertoire.py
+
+ALTER TABLE opening_repertoire
+    ADD COLUMN IF NOT EXISTS cpl_sum   DOUBLE PRECISION NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS cpl_games INTEGER NOT NULL DEFAULT 0;
@@ -0,0 +1,22 @@
+-- Migration 005: Priority classes for background analysis jobs
+-- Run with: psql $DATABASE_URL -f migrations/005_analysis_job_scheduling.sql
+--
+-- The worker no longer runs jobs in arrival order: it claims the pending
+-- job with the best priority class (interactive < batch < background, aged
+-- by time waited), analyses one game at a time and hands a batch job back
+-- to the queue when something more urgent is waiting (app/job_scheduler.py).
+-- The remaining game list and depth live on the row so a preempted job can
+-- be resumed by any worker.
+
+ALTER TABLE analysis_jobs
+    ADD COLUMN IF NOT EXISTS priority_class TEXT NOT NULL DEFAULT 'batch',
+    ADD COLUMN IF NOT EXISTS game_ids       JSONB,
+    ADD COLUMN IF NOT EXISTS depth          INTEGER NOT NULL DEFAULT 12,
+    ADD COLUMN IF NOT EXISTS queued_at      TIMESTAMPTZ DEFAULT now(),
+    ADD COLUMN IF NOT EXISTS queue_wait_s   DOUBLE PRECISION NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS heartbeat_at   TIMESTAMPTZ;
+
+UPDATE analysis_jobs SET priority_class = 'interactive' WHERE job_type = 'single_game';
+UPDATE analysis_jobs SET queued_at = created_at WHERE status = 'pending';
+
+CREATE INDEX IF NOT EXISTS ix_jobs_status_queued ON analysis_jobs(status, queued_at);
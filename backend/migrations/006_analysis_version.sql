@@ -0,0 +1,16 @@
+-- Migration 006: Analysis version for background re-analysis
+-- Run with: psql $DATABASE_URL -f migrations/006_analysis_version.sql
+--
+-- Rows written by the full pipeline (/analysis/run, claimed anonymous
+-- results) record analysis_core.ANALYSIS_VERSION; the worker's eval-only
+-- rows stay NULL. app/reanalysis.py re-analyses rows whose version or depth
+-- is below the current target while the host is idle.
+
+ALTER TABLE game_analysis
+    ADD COLUMN IF NOT EXISTS analysis_version INTEGER;
+
+-- Only the full pipeline fills accuracy, so it marks the version-1 rows
+UPDATE game_analysis SET analysis_version = 1
+WHERE analysis_version IS NULL AND accuracy IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS ix_analysis_version_depth ON game_analysis(analysis_version, analysis_depth);
@@ -0,0 +1,11 @@
+-- Migration 007: Mate distances on move evaluations
+-- Run with: psql $DATABASE_URL -f migrations/007_move_mate_distance.sql
+--
+-- is_mate_before / is_mate_after only say that a mate was on the board;
+-- scripts/reclassify_moves.py needs the distance (White POV) to re-run
+-- classify_move exactly. Rows written before this stay NULL and fall back
+-- to the sign of the clamped eval.
+
+ALTER TABLE move_evaluations
+    ADD COLUMN IF NOT EXISTS mate_before INTEGER,
+    ADD COLUMN IF NOT EXISTS mate_after  INTEGER;
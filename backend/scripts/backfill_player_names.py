@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Fill games.white_player / games.black_player from the stored PGN headers.
+
+Older imports left the denormalized name columns empty, so the listing and
+detail endpoints had to fall back to the PGN on every request. This walks
+those games in keyset-paginated batches, reads only the tag section of each
+stored PGN (a prefix of moves_pgn, scanned with app.pgn_headers) and writes
+the names back with one bulk UPDATE and one commit per batch. Empty columns
+are filled; stored names are never overwritten.
+
+Usage:
+    DATABASE_URL=... python backfill_player_names.py [--batch-size 5000]
+        [--checkpoint backfill_player_names.ckpt] [--resume] [--dry-run]
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from sqlalchemy import text
+
+from app.pgn_headers import HEADER_PREFIX_CHARS, read_headers
+from batch_utils import Checkpoint, Progress, bulk_update, count_rows, session_factory
+
+WHERE = "WHERE id > :after AND (white_player IS NULL OR white_player = '' OR black_player IS NULL OR black_player = '')"
+DIFF_SAMPLE = 10  # changed rows printed in --dry-run
+
+
+def _known(name: str | None) -> str | None:
+    """PGN uses "?" for an unknown player; keep the column NULL instead."""
+    return name if name and name != "?" else None
+
+
+def names_update(game_id: int, white: str | None, black: str | None, prefix: str) -> dict | None:
+    """Row for bulk_update, or None if the headers add nothing."""
+    headers = read_headers(prefix or "")
+    new_white = white or _known(headers.get("White"))
+    new_black = black or _known(headers.get("Black"))
+    if new_white == (white or None) and new_black == (black or None):
+        return None
+    return {"id": game_id, "white_player": new_white, "black_player": new_black}
+
+
+async def main(args) -> None:
+    engine, async_session = session_factory()
+    checkpoint = Checkpoint(args.checkpoint)
+    after_id = checkpoint.get("after", 0) if args.resume else 0
+
+    try:
+        async with async_session() as db:
+            total = await count_rows(db, f"SELECT count(*) FROM games {WHERE}", {"after": after_id})
+            print(f"📊 {total:,} games missing player names" + (f" (resuming after id {after_id})" if after_id else ""))
+            progress = Progress("games", total)
+            updated = 0
+            shown = 0
+
+            while True:
+                rows = (await db.execute(
+                    text(
+                        f"SELECT id, white_player, black_player, left(moves_pgn, {HEADER_PREFIX_CHARS}) "
+                        f"FROM games {WHERE} ORDER BY id LIMIT :limit"
+                    ),
+                    {"after": after_id, "limit": args.batch_size},
+                )).fetchall()
+                if not rows:
+                    break
+                changed = [u for u in (names_update(*r) for r in rows) if u is not None]
+                updated += len(changed)
+                after_id = rows[-1][0]
+
+                if args.dry_run:
+                    for c in changed[:max(0, DIFF_SAMPLE - shown)]:
+                        print(f"   ~ game {c['id']}: {c['white_player']!r} vs {c['black_player']!r}")
+                    shown = min(DIFF_SAMPLE, shown + len(changed))
+                else:
+                    await bulk_update(db, "games", changed, {"white_player": "text", "black_player": "text"})
+                    await db.commit()
+                    checkpoint.save(after=after_id)
+
+                progress.advance(len(rows), updated=updated)
+
+            progress.finish(updated=updated)
+    finally:
+        await engine.dispose()
+
+    if args.dry_run:
+        print("\nℹ️  Dry run — nothing written")
+    else:
+        print(f"\n🎉 Player names filled on {updated:,} games")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill player names from stored PGN headers")
+    parser.add_argument("--batch-size", type=int, default=5000, help="games per page")
+    parser.add_argument("--checkpoint", default="backfill_player_names.ckpt")
+    parser.add_argument("--resume", action="store_true", help="continue after the checkpointed id")
+    parser.add_argument("--dry-run", action="store_true", help="report changes without writing")
+    asyncio.run(main(parser.parse_args()))
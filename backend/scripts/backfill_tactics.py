@@ -7,129 +7,222 @@ This script:
 2. Updates difficulty to 'standard' for all puzzles
 3. Re-classifies blunder subtypes on existing move evaluations
 
+Both tables are walked in keyset-paginated batches (id > last id), the
+detectors run in a process pool, and only rows whose output changed are
+written back — one bulk UPDATE and one commit per batch. The last id of each
+stage is checkpointed so an interrupted run can continue with --resume.
+
 Usage:
-    DATABASE_URL=... python backfill_tactics.py
+    DATABASE_URL=... python backfill_tactics.py [--batch-size 2000] [--workers N]
+        [--only puzzles|blunders] [--checkpoint backfill_tactics.ckpt] [--resume] [--dry-run]
 """
 
+import argparse
 import asyncio
 import json
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import chess
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
 
 from sqlalchemy import text
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
 
 from app.analysis_core import detect_puzzle_tactics, classify_blunder_subtype
-
-DATABASE_URL = os.getenv("DATABASE_URL", "")
-
-
-async def backfill_puzzle_tactics():
-    if not DATABASE_URL:
-        print("❌ DATABASE_URL not set")
-        sys.exit(1)
-
-    db_url = DATABASE_URL
-    if db_url.startswith("postgres://"):
-        db_url = db_url.replace("postgres://", "postgresql+asyncpg://", 1)
-    elif db_url.startswith("postgresql://"):
-        db_url = db_url.replace("postgresql://", "postgresql+asyncpg://", 1)
-
-    engine = create_async_engine(db_url)
-    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-
-    async with async_session() as db:
-        # 1. Fetch all puzzles
-        result = await db.execute(
-            text("SELECT id, fen, best_move_uci, solution_line, themes FROM puzzles")
-        )
-        puzzles = result.fetchall()
-        print(f"📊 Found {len(puzzles)} puzzles to backfill")
-
-        updated = 0
-        for p in puzzles:
-            pid, fen, best_move_uci, solution_line, old_themes = p
-
-            if not fen or not best_move_uci:
-                continue
-
-            # Parse solution_line
-            sol = []
-            if solution_line:
-                if isinstance(solution_line, str):
-                    try:
-                        sol = json.loads(solution_line)
-                    except Exception:
-                        sol = []
-                elif isinstance(solution_line, list):
-                    sol = solution_line
-
-            # Detect new tactic tags
-            new_tags = detect_puzzle_tactics(fen, best_move_uci, sol)
-
-            if new_tags != old_themes:
-                await db.execute(
-                    text("UPDATE puzzles SET themes = :themes, difficulty = 'standard' WHERE id = :id"),
-                    {"themes": json.dumps(new_tags), "id": pid}
-                )
-                updated += 1
-            else:
-                # Keep deprecated field normalized for compatibility.
-                await db.execute(
-                    text("UPDATE puzzles SET difficulty = 'standard' WHERE id = :id"),
-                    {"id": pid}
-                )
-
+from batch_utils import Checkpoint, Progress, bulk_update, count_rows, session_factory
+
+CHUNK_SIZE = 500  # rows per process-pool task
+DIFF_SAMPLE = 10  # changed rows printed per stage in --dry-run
+
+
+# ═══════════════════════════════════════════════════════════
+# Workers (run in the process pool)
+# ═══════════════════════════════════════════════════════════
+
+
+def _as_list(value) -> list:
+    """JSONB columns come back as text through raw SQL."""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except Exception:
+            return []
+    return value if isinstance(value, list) else []
+
+
+def tag_puzzles(rows: list[tuple]) -> list[tuple[int, list[str]]]:
+    """
+    (id, fen, best_move_uci, solution_line) -> (id, themes). Rows without a
+    position are skipped; rows the detector fails on are logged and skipped,
+    so one bad puzzle doesn't abort the batch.
+    """
+    out = []
+    for pid, fen, best_move_uci, solution_line in rows:
+        if not fen or not best_move_uci:
+            continue
+        try:
+            out.append((pid, detect_puzzle_tactics(fen, best_move_uci, _as_list(solution_line))))
+        except Exception as e:
+            print(f"   ⚠️  puzzle {pid} skipped: {type(e).__name__}: {e}", file=sys.stderr, flush=True)
+    return out
+
+
+def classify_blunders(rows: list[tuple]) -> list[tuple[int, str | None]]:
+    """(id, fen_before, san, best_move_uci, phase) -> (id, blunder_subtype); unparsable rows are skipped."""
+    out = []
+    for bid, fen_before, san, best_move_uci, phase in rows:
+        try:
+            board = chess.Board(fen_before)
+            move = board.parse_san(san)
+            best_move = chess.Move.from_uci(best_move_uci) if best_move_uci else None
+            out.append((bid, classify_blunder_subtype(board, move, best_move, phase or "middlegame")))
+        except Exception:
+            continue
+    return out
+
+
+async def _run_pool(pool: ProcessPoolExecutor | None, fn, rows: list[tuple]) -> list:
+    if pool is None:
+        return fn(rows)
+    loop = asyncio.get_running_loop()
+    chunks = [rows[i:i + CHUNK_SIZE] for i in range(0, len(rows), CHUNK_SIZE)]
+    results = await asyncio.gather(*(loop.run_in_executor(pool, fn, c) for c in chunks))
+    return [r for chunk in results for r in chunk]
+
+
+# ═══════════════════════════════════════════════════════════
+# Stages
+# ═══════════════════════════════════════════════════════════
+
+
+async def _run_stage(
+    db, pool, checkpoint: Checkpoint, args, *,
+    name: str, count_sql: str, page_sql: str, worker, diff, table: str, columns: dict,
+) -> int:
+    """
+    Page through `page_sql` (which must select id first and filter on
+    `id > :after`), run `worker` over each page in the pool and bulk-write
+    the rows `diff` reports as changed. Returns the number of changed rows.
+    """
+    after_id = checkpoint.get(f"{name}_after", 0) if args.resume else 0
+    total = await count_rows(db, count_sql, {"after": after_id})
+    print(f"\n📊 {name}: {total:,} rows to check" + (f" (resuming after id {after_id})" if after_id else ""))
+    progress = Progress(name, total)
+    changed_total = 0
+    shown = 0
+
+    while True:
+        rows = (await db.execute(text(page_sql), {"after": after_id, "limit": args.batch_size})).fetchall()
+        if not rows:
+            break
+        stored = {r[0]: r for r in rows}
+        results = await _run_pool(pool, worker, [tuple(r[:-1]) for r in rows])
+        changed = [diff(stored[row_id], value) for row_id, value in results]
+        changed = [c for c in changed if c is not None]
+        changed_total += len(changed)
+        after_id = rows[-1][0]
+
+        if args.dry_run:
+            for c in changed[:max(0, DIFF_SAMPLE - shown)]:
+                print(f"   ~ {table} {c['id']}: {stored[c['id']][-1]!r} → {c[next(iter(columns))]!r}")
+            shown = min(DIFF_SAMPLE, shown + len(changed))
+        else:
+            await bulk_update(db, table, changed, columns)
+            await db.commit()
+            checkpoint.save(**{f"{name}_after": after_id})
+
+        progress.advance(len(rows), changed=changed_total)
+
+    progress.finish(changed=changed_total)
+    return changed_total
+
+
+async def backfill_puzzle_tactics(db, pool, checkpoint: Checkpoint, args) -> None:
+    def diff(stored, themes):
+        if themes == _as_list(stored[-1]):
+            return None
+        return {"id": stored[0], "themes": json.dumps(themes)}
+
+    where = "WHERE id > :after AND fen IS NOT NULL AND best_move_uci IS NOT NULL"
+    await _run_stage(
+        db, pool, checkpoint, args,
+        name="puzzles",
+        count_sql=f"SELECT count(*) FROM puzzles {where}",
+        page_sql=(
+            "SELECT id, fen, best_move_uci, solution_line, themes "
+            f"FROM puzzles {where} ORDER BY id LIMIT :limit"
+        ),
+        worker=tag_puzzles,
+        diff=diff,
+        table="puzzles",
+        columns={"themes": "jsonb"},
+    )
+
+    # Keep deprecated field normalized for compatibility (set-based, no detection needed)
+    stale = await count_rows(db, "SELECT count(*) FROM puzzles WHERE difficulty IS DISTINCT FROM 'standard'")
+    if stale and not args.dry_run:
+        await db.execute(text("UPDATE puzzles SET difficulty = 'standard' WHERE difficulty IS DISTINCT FROM 'standard'"))
         await db.commit()
-        print(f"✅ Updated {updated} puzzles with new tactic tags")
-
-        # 2. Re-classify blunder subtypes
-        result2 = await db.execute(
-            text("""
-                SELECT me.id, me.fen_before, me.san, me.best_move_uci, me.phase
-                FROM move_evaluations me
-                WHERE me.move_quality = 'Blunder'
-                  AND me.fen_before IS NOT NULL
-                  AND me.san IS NOT NULL
-            """)
-        )
-        blunders = result2.fetchall()
-        print(f"\n📊 Found {len(blunders)} blunders to re-classify")
-
-        reclassified = 0
-        for b in blunders:
-            bid, fen_before, san, best_move_uci, phase = b
-
-            if not fen_before:
-                continue
-
-            try:
-                board = chess.Board(fen_before)
-                move = board.parse_san(san)
-                best_move = chess.Move.from_uci(best_move_uci) if best_move_uci else None
-
-                new_subtype = classify_blunder_subtype(board, move, best_move, phase or "middlegame")
-
-                await db.execute(
-                    text("UPDATE move_evaluations SET blunder_subtype = :subtype WHERE id = :id"),
-                    {"subtype": new_subtype, "id": bid}
-                )
-                reclassified += 1
-            except Exception:
-                continue
-
-        await db.commit()
-        print(f"✅ Re-classified {reclassified} blunder subtypes")
-
-    await engine.dispose()
-    print("\n🎉 Backfill complete!")
+    print(f"✅ difficulty normalized on {stale:,} puzzles" + (" (dry run)" if args.dry_run else ""))
+
+
+async def backfill_blunder_subtypes(db, pool, checkpoint: Checkpoint, args) -> None:
+    def diff(stored, subtype):
+        if subtype == stored[-1]:
+            return None
+        return {"id": stored[0], "blunder_subtype": subtype}
+
+    where = (
+        "WHERE id > :after AND move_quality = 'Blunder' "
+        "AND fen_before IS NOT NULL AND san IS NOT NULL"
+    )
+    await _run_stage(
+        db, pool, checkpoint, args,
+        name="blunders",
+        count_sql=f"SELECT count(*) FROM move_evaluations {where}",
+        page_sql=(
+            "SELECT id, fen_before, san, best_move_uci, phase, blunder_subtype "
+            f"FROM move_evaluations {where} ORDER BY id LIMIT :limit"
+        ),
+        worker=classify_blunders,
+        diff=diff,
+        table="move_evaluations",
+        columns={"blunder_subtype": "text"},
+    )
+
+
+async def main(args) -> None:
+    engine, async_session = session_factory()
+    checkpoint = Checkpoint(args.checkpoint)
+    pool = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 1 else None
+
+    try:
+        async with async_session() as db:
+            if args.only in (None, "puzzles"):
+                await backfill_puzzle_tactics(db, pool, checkpoint, args)
+            if args.only in (None, "blunders"):
+                await backfill_blunder_subtypes(db, pool, checkpoint, args)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        await engine.dispose()
+
+    if args.dry_run:
+        print("\nℹ️  Dry run — nothing written")
+    else:
+        print("\n🎉 Backfill complete!")
 
 
 if __name__ == "__main__":
-    asyncio.run(backfill_puzzle_tactics())
+    parser = argparse.ArgumentParser(description="Backfill puzzle tactic tags and blunder subtypes")
+    parser.add_argument("--batch-size", type=int, default=2000, help="rows per page")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--only", choices=["puzzles", "blunders"])
+    parser.add_argument("--checkpoint", default="backfill_tactics.ckpt")
+    parser.add_argument("--resume", action="store_true", help="continue after the checkpointed ids")
+    parser.add_argument("--dry-run", action="store_true", help="report changed rows without writing")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,151 @@
+"""
+Shared plumbing for the offline batch scripts (reclassification, backfills).
+
+- `session_factory()`      – async engine/session from DATABASE_URL
+- `Checkpoint`             – small JSON file recording the last processed key
+- `KeyLog`                 – append-only set of finished item keys (per-item resume)
+- `bulk_update()`          – one UPDATE ... FROM unnest(...) per batch
+- `Progress`               – rows/sec + ETA reporting
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+
+def session_factory():
+    """Return (engine, sessionmaker) for DATABASE_URL, exiting if it is unset."""
+    db_url = os.getenv("DATABASE_URL", "")
+    if not db_url:
+        print("❌ DATABASE_URL not set")
+        sys.exit(1)
+    if db_url.startswith("postgres://"):
+        db_url = db_url.replace("postgres://", "postgresql+asyncpg://", 1)
+    elif db_url.startswith("postgresql://"):
+        db_url = db_url.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+    engine = create_async_engine(db_url)
+    return engine, sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+class Checkpoint:
+    """Resume marker stored as JSON next to the script (or wherever --checkpoint points)."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = Path(path) if path else None
+        self.state: dict[str, Any] = {}
+        if self.path and self.path.exists():
+            self.state = json.loads(self.path.read_text() or "{}")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.state.get(key, default)
+
+    def save(self, **values: Any) -> None:
+        self.state.update(values)
+        if not self.path:
+            return
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps(self.state))
+        tmp.replace(self.path)
+
+
+class KeyLog:
+    """Append-only file of completed keys, one per line; loaded into a set on open."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = Path(path) if path else None
+        self.keys: set[str] = set()
+        if self.path and self.path.exists():
+            self.keys = {line for line in self.path.read_text().splitlines() if line}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.keys
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add_many(self, keys: list[str]) -> None:
+        fresh = [k for k in keys if k not in self.keys]
+        self.keys.update(fresh)
+        if self.path and fresh:
+            with self.path.open("a") as fh:
+                fh.write("".join(f"{k}\n" for k in fresh))
+                fh.flush()
+                os.fsync(fh.fileno())
+
+
+async def bulk_update(
+    db: AsyncSession,
+    table: str,
+    rows: list[dict],
+    columns: dict[str, str],
+    key: str = "id",
+    key_type: str = "integer",
+) -> int:
+    """
+    Update many rows in one statement:
+        UPDATE table t SET col = v.col, ... FROM unnest(...) AS v(...) WHERE t.key = v.key
+    `columns` maps column name -> Postgres type for the array casts.
+    """
+    if not rows:
+        return 0
+    names = list(columns)
+    arrays = ", ".join(
+        f"CAST(:{name} AS {pg_type}[])" for name, pg_type in [(key, key_type), *columns.items()]
+    )
+    assignments = ", ".join(f"{name} = v.{name}" for name in names)
+    sql = (
+        f"UPDATE {table} AS t SET {assignments} "
+        f"FROM unnest({arrays}) AS v({', '.join([key, *names])}) "
+        f"WHERE t.{key} = v.{key}"
+    )
+    params = {name: [row[name] for row in rows] for name in [key, *names]}
+    await db.execute(text(sql), params)
+    return len(rows)
+
+
+class Progress:
+    """Prints throughput every `every` seconds and a summary at the end."""
+
+    def __init__(self, label: str, total: Optional[int] = None, every: float = 5.0):
+        self.label = label
+        self.total = total
+        self.every = every
+        self.done = 0
+        self.start = time.monotonic()
+        self._last = self.start
+
+    def advance(self, n: int, **extra: Any) -> None:
+        self.done += n
+        now = time.monotonic()
+        if now - self._last >= self.every:
+            self._last = now
+            self._print(now, extra)
+
+    def finish(self, **extra: Any) -> None:
+        self._print(time.monotonic(), extra, final=True)
+
+    def _print(self, now: float, extra: dict, final: bool = False) -> None:
+        elapsed = max(now - self.start, 1e-9)
+        rate = self.done / elapsed
+        parts = [f"{self.label}: {self.done:,}"]
+        if self.total:
+            parts[0] += f"/{self.total:,}"
+            if not final and rate > 0:
+                parts.append(f"ETA {max(self.total - self.done, 0) / rate:,.0f}s")
+        parts.append(f"{rate:,.0f}/s")
+        parts.extend(f"{k}={v:,}" if isinstance(v, int) else f"{k}={v}" for k, v in extra.items())
+        print(("✅ " if final else "   ") + "  ".join(parts), flush=True)
+
+
+async def count_rows(db: AsyncSession, sql: str, params: Optional[dict] = None) -> int:
+    return (await db.execute(text(sql), params or {})).scalar() or 0
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Deterministic stand-in for Stockfish that speaks enough UCI for the app.
+
+Point the app at it to load-test the web tier without paying for real
+engine search:
+
+    STOCKFISH_PATH=/path/to/backend/scripts/fake_stockfish.py uvicorn app.main:app
+
+Evaluations are material balance plus noise derived from a hash of the
+position, so the same position always gets the same score, best move and
+PV, and analyses are repeatable across runs. Candidate moves are ranked by
+the score of the position they lead to (a one-ply search), which keeps
+multipv gaps and cp losses plausible enough for move classification and
+puzzle generation to do their normal work.
+
+Each `go` answers after a simulated search time:
+
+    FAKE_UCI_LATENCY_MS      base time per search (default 5)
+    FAKE_UCI_MS_PER_DEPTH    extra time per requested depth (default 0)
+
+`go movetime N` waits N ms (capped by the simulated time when that is
+shorter), `go infinite` waits for `stop`, and `stop` interrupts any search.
+The same values are exposed as the UCI options FakeLatency / FakeMsPerDepth.
+
+Failure injection, for exercising app/engine_supervisor.py:
+
+    FAKE_UCI_CRASH_EVERY     exit mid-search on every Nth `go` (default off)
+    FAKE_UCI_HANG_EVERY      never answer every Nth `go`, ignoring `stop`
+"""
+
+import hashlib
+import os
+import select
+import sys
+import time
+
+import chess
+
+PIECE_CP = {chess.PAWN: 100, chess.KNIGHT: 300, chess.BISHOP: 320, chess.ROOK: 500, chess.QUEEN: 900}
+NOISE_CP = 30
+MAX_PV = 4
+NODES_PER_MS = 1000
+
+
+def _hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "big")
+
+
+def _position_hash(board: chess.Board) -> int:
+    """Stable across runs: ints and int tuples hash without the per-process str salt."""
+    return hash((
+        board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings,
+        board.occupied_co[chess.WHITE], board.turn, board.castling_rights, board.ep_square or 0,
+    )) & 0xFFFFFFFF
+
+
+def _static_cp(board: chess.Board) -> int:
+    """Material plus position-hash noise, from the side to move's point of view."""
+    score = 0
+    for piece_type, value in PIECE_CP.items():
+        score += value * (
+            chess.popcount(board.pieces_mask(piece_type, board.turn))
+            - chess.popcount(board.pieces_mask(piece_type, not board.turn))
+        )
+    return score + _position_hash(board) % (2 * NOISE_CP + 1) - NOISE_CP
+
+
+class Line:
+    __slots__ = ("move", "cp", "mate")
+
+    def __init__(self, move, cp=0, mate=None):
+        self.move, self.cp, self.mate = move, cp, mate
+
+    def sort_key(self):
+        if self.mate is not None:
+            return (1, -self.mate) if self.mate > 0 else (-1, -self.mate)
+        return (0, self.cp)
+
+    def uci_score(self) -> str:
+        return f"mate {self.mate}" if self.mate is not None else f"cp {self.cp}"
+
+
+def rank_moves(board: chess.Board) -> list[Line]:
+    """Legal moves, best first, each scored for the side to move."""
+    key = _position_hash(board)
+    lines = []
+    for move in board.legal_moves:
+        board.push(move)
+        if board.is_check() and board.is_checkmate():
+            line = Line(move, mate=1)
+        elif board.is_insufficient_material() or (not board.is_check() and board.is_stalemate()):
+            line = Line(move, cp=0)
+        else:
+            line = Line(move, cp=-_static_cp(board))
+        board.pop()
+        lines.append(line)
+    lines.sort(key=lambda l: (l.sort_key(), _hash(f"{key}{l.move.uci()}")), reverse=True)
+    return lines
+
+
+def principal_variation(board: chess.Board, first: chess.Move, length: int) -> list[str]:
+    """`first`, then moves picked by position hash (cheap and deterministic)."""
+    pv = [first.uci()]
+    board = board.copy(stack=False)
+    board.push(first)
+    while len(pv) < length:
+        moves = sorted(m.uci() for m in board.legal_moves)
+        if not moves:
+            break
+        reply = moves[_position_hash(board) % len(moves)]
+        pv.append(reply)
+        board.push_uci(reply)
+    return pv
+
+
+class Engine:
+    def __init__(self):
+        self.board = chess.Board()
+        self.options = {
+            "multipv": 1,
+            "fakelatency": int(os.environ.get("FAKE_UCI_LATENCY_MS", "5")),
+            "fakemsperdepth": int(os.environ.get("FAKE_UCI_MS_PER_DEPTH", "0")),
+        }
+        self.crash_every = int(os.environ.get("FAKE_UCI_CRASH_EVERY", "0"))
+        self.hang_every = int(os.environ.get("FAKE_UCI_HANG_EVERY", "0"))
+        self.searches = 0
+        self._buffer = b""
+        self._pending: list[str] = []
+
+    # ── I/O ──
+
+    def send(self, line: str) -> None:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+    def _fill(self, timeout) -> bool:
+        """Read whatever stdin has (waiting up to `timeout`); False on EOF."""
+        ready, _, _ = select.select([sys.stdin], [], [], timeout)
+        if not ready:
+            return True
+        chunk = os.read(sys.stdin.fileno(), 65536)
+        if not chunk:
+            return False
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split(b"\n")
+        self._pending.extend(l.decode().strip() for l in lines)
+        return True
+
+    def readline(self):
+        while not self._pending:
+            if not self._fill(None):
+                return None
+        return self._pending.pop(0)
+
+    def wait(self, seconds) -> None:
+        """Simulated search time; returns early when `stop` or `quit` arrives."""
+        deadline = None if seconds is None else time.monotonic() + seconds
+        while True:
+            if any(cmd in ("stop", "quit") for cmd in self._pending):
+                if "stop" in self._pending:
+                    self._pending.remove("stop")
+                return
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return
+            if not self._fill(remaining):
+                self._pending.append("quit")
+                return
+
+    # ── Commands ──
+
+    def uci(self) -> None:
+        self.send("id name FakeStockfish")
+        self.send("id author chess-analyzer")
+        self.send("option name Threads type spin default 1 min 1 max 1024")
+        self.send("option name Hash type spin default 16 min 1 max 33554432")
+        self.send("option name MultiPV type spin default 1 min 1 max 500")
+        self.send(f"option name FakeLatency type spin default {self.options['fakelatency']} min 0 max 600000")
+        self.send(f"option name FakeMsPerDepth type spin default {self.options['fakemsperdepth']} min 0 max 60000")
+        self.send("uciok")
+
+    def setoption(self, args: list[str]) -> None:
+        if "name" not in args:
+            return
+        rest = args[args.index("name") + 1:]
+        if "value" in rest:
+            i = rest.index("value")
+            name, value = " ".join(rest[:i]).lower(), " ".join(rest[i + 1:])
+        else:
+            name, value = " ".join(rest).lower(), ""
+        if name in self.options:
+            try:
+                self.options[name] = int(value)
+            except ValueError:
+                pass
+
+    def position(self, args: list[str]) -> None:
+        moves = args.index("moves") if "moves" in args else len(args)
+        if args and args[0] == "fen":
+            self.board = chess.Board(" ".join(args[1:moves]))
+        else:
+            self.board = chess.Board()
+        for uci in args[moves + 1:]:
+            self.board.push_uci(uci)
+
+    def go(self, args: list[str]) -> None:
+        self.searches += 1
+        if self.crash_every and self.searches % self.crash_every == 0:
+            os._exit(1)
+        if self.hang_every and self.searches % self.hang_every == 0:
+            while self._fill(None):  # swallow everything, `stop` included
+                self._pending.clear()
+            sys.exit(0)
+        params = {}
+        for key in ("depth", "movetime", "nodes"):
+            if key in args:
+                params[key] = int(args[args.index(key) + 1])
+        depth = params.get("depth", 20)
+        simulated = (self.options["fakelatency"] + self.options["fakemsperdepth"] * depth) / 1000
+        if "infinite" in args:
+            simulated = None
+        elif "movetime" in params:
+            simulated = min(simulated, params["movetime"] / 1000)
+
+        started = time.monotonic()
+        board = self.board
+        lines = rank_moves(board)
+        # Our own compute counts towards the simulated search time
+        self.wait(None if simulated is None else max(0.0, simulated - (time.monotonic() - started)))
+        if not lines:
+            self.send(f"info depth 0 score {'mate 0' if board.is_checkmate() else 'cp 0'}")
+            self.send("bestmove (none)")
+            return
+
+        elapsed_ms = max(1, int((time.monotonic() - started) * 1000))
+        nodes = params.get("nodes") or elapsed_ms * NODES_PER_MS
+        for k, line in enumerate(lines[:max(1, self.options["multipv"])], start=1):
+            pv = principal_variation(board, line.move, min(depth, MAX_PV))
+            self.send(
+                f"info depth {depth} seldepth {depth} multipv {k} score {line.uci_score()} "
+                f"nodes {nodes} nps {nodes * 1000 // elapsed_ms} time {elapsed_ms} pv {' '.join(pv)}"
+            )
+        best_pv = principal_variation(board, lines[0].move, 2)
+        ponder = f" ponder {best_pv[1]}" if len(best_pv) > 1 else ""
+        self.send(f"bestmove {best_pv[0]}{ponder}")
+
+    def run(self) -> None:
+        while True:
+            line = self.readline()
+            if line is None:
+                return
+            cmd, *args = line.split() or [""]
+            if cmd == "uci":
+                self.uci()
+            elif cmd == "isready":
+                self.send("readyok")
+            elif cmd == "setoption":
+                self.setoption(args)
+            elif cmd == "ucinewgame":
+                self.board = chess.Board()
+            elif cmd == "position":
+                self.position(args)
+            elif cmd == "go":
+                self.go(args)
+            elif cmd == "quit":
+                return
+
+
+if __name__ == "__main__":
+    Engine().run()
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test for the API: concurrent SSE analyses, PGN imports and
+dashboard loads against a running server.
+
+Run the app against a local Postgres with the fake engine, so the numbers
+measure the web tier and not Stockfish:
+
+    cd backend
+    DATABASE_URL=postgresql+asyncpg://localhost:5432/chess_analyzer_load \\
+    STOCKFISH_PATH=$PWD/scripts/fake_stockfish.py FAKE_UCI_LATENCY_MS=10 \\
+        uvicorn app.main:app --port 8000 --workers 2
+
+then, with the same NEXTAUTH_SECRET in the environment:
+
+    python scripts/load_test.py --base-url http://localhost:8000 --duration 60 \\
+        --analysis 8 --anonymous 8 --imports 2 --dashboard 16 [--json load.json]
+
+Each scenario runs N virtual users in a loop:
+  analysis   imports a few fresh games, then streams POST /api/analysis/run
+  anonymous  streams POST /api/anonymous/analyze with pasted PGN (one client
+             IP per user via X-Real-IP, as nginx sets it; only honoured when
+             the load generator is a trusted proxy, e.g. on localhost)
+  imports    POST /api/games/import-pgn with a batch of games
+  dashboard  loads the home-page endpoints in parallel, like the frontend
+
+Games are random legal games generated from --seed, so every request is a
+cache miss for the result cache and the shared evaluation store, and two
+runs with the same seed send the same requests. Users are created on first
+request from minted NextAuth tokens (sub = loadtest-<scenario>-<n>); point
+the server at a throwaway database.
+
+Reports requests/s, p50/p95/p99 latency (and time to first SSE event) per
+operation, status codes, and engine/DB pool saturation sampled from /metrics.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import chess
+import chess.pgn
+import httpx
+from jose import jwt
+
+from app.config import get_settings
+
+OPENINGS = [
+    ("C50", "Italian Game"), ("B20", "Sicilian Defense"), ("C00", "French Defense"),
+    ("B10", "Caro-Kann Defense"), ("D06", "Queen's Gambit"), ("A45", "Indian Game"),
+    ("C60", "Ruy Lopez"), ("B01", "Scandinavian Defense"),
+]
+DASHBOARD_PATHS = [
+    "/api/users/me",
+    "/api/insights/overview",
+    "/api/insights/recent-games",
+    "/api/games?page=1&per_page=20",
+    "/api/openings/personal",
+]
+SATURATION_METRICS = ("engine_slots_active", "engine_queue_depth", "db_pool_checked_out", "db_pool_size")
+_SAMPLE_RE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})?\s+(\S+)$')
+
+
+# ═══════════════════════════════════════════════════════════
+# Inputs
+# ═══════════════════════════════════════════════════════════
+
+
+def random_game(rng: random.Random, site_id: str, player: str, min_plies: int = 30, max_plies: int = 90) -> str:
+    """A random legal game (captures preferred) as PGN, unique per `site_id`."""
+    board = chess.Board()
+    game = chess.pgn.Game()
+    node = game
+    for _ in range(rng.randint(min_plies, max_plies)):
+        moves = list(board.legal_moves)
+        if not moves:
+            break
+        captures = [m for m in moves if board.is_capture(m)]
+        move = rng.choice(captures if captures and rng.random() < 0.4 else moves)
+        node = node.add_variation(move)
+        board.push(move)
+    outcome = board.outcome()
+    eco, opening = rng.choice(OPENINGS)
+    game.headers.update({
+        "Event": "Load test",
+        "Site": f"https://lichess.org/{site_id}",
+        "Date": f"2025.{rng.randint(1, 12):02d}.{rng.randint(1, 28):02d}",
+        "White": player,
+        "Black": f"opponent{rng.randint(1, 500)}",
+        "Result": outcome.result() if outcome else rng.choice(["1-0", "0-1", "1/2-1/2"]),
+        "WhiteElo": str(rng.randint(900, 2200)),
+        "BlackElo": str(rng.randint(900, 2200)),
+        "TimeControl": "300+0",
+        "ECO": eco,
+        "Opening": opening,
+    })
+    return str(game)
+
+
+def mint_token(secret: str, user_id: str) -> str:
+    return jwt.encode({"sub": user_id, "email": f"{user_id}@loadtest.local"}, secret, algorithm="HS256")
+
+
+# ═══════════════════════════════════════════════════════════
+# Recording
+# ═══════════════════════════════════════════════════════════
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[k]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.first_event: dict[str, list[float]] = defaultdict(list)
+        self.ok: Counter[str] = Counter()
+        self.failed: Counter[str] = Counter()
+        self.statuses: dict[str, Counter] = defaultdict(Counter)
+        self.queued: Counter[str] = Counter()
+        self.errors: dict[str, Counter] = defaultdict(Counter)
+
+    def record(self, op: str, seconds: float, status, ok: bool, first_event: float | None = None, error: str | None = None):
+        self.latencies[op].append(seconds)
+        self.statuses[op][status] += 1
+        if first_event is not None:
+            self.first_event[op].append(first_event)
+        if ok:
+            self.ok[op] += 1
+        else:
+            self.failed[op] += 1
+            if error:
+                self.errors[op][error[:80]] += 1
+
+    def summary(self, elapsed: float) -> dict:
+        out = {}
+        for op in sorted(self.latencies):
+            lat = sorted(self.latencies[op])
+            row = {
+                "requests": len(lat),
+                "ok": self.ok[op],
+                "failed": self.failed[op],
+                "throughput_rps": round(self.ok[op] / elapsed, 3) if elapsed else 0.0,
+                "p50_s": round(percentile(lat, 50), 4),
+                "p95_s": round(percentile(lat, 95), 4),
+                "p99_s": round(percentile(lat, 99), 4),
+                "mean_s": round(statistics.fmean(lat), 4),
+                "statuses": {str(k): v for k, v in self.statuses[op].items()},
+            }
+            first = sorted(self.first_event.get(op, []))
+            if first:
+                row["first_event_p50_s"] = round(percentile(first, 50), 4)
+                row["first_event_p95_s"] = round(percentile(first, 95), 4)
+                row["first_event_p99_s"] = round(percentile(first, 99), 4)
+            if self.queued[op]:
+                row["queued_events"] = self.queued[op]
+            if self.errors[op]:
+                row["errors"] = dict(self.errors[op].most_common(5))
+            out[op] = row
+        return out
+
+
+class SaturationSampler:
+    """Polls /metrics and keeps every sample of the pool gauges."""
+
+    def __init__(self, client: httpx.AsyncClient, interval: float):
+        self.client = client
+        self.interval = interval
+        self.samples: dict[str, list[float]] = defaultdict(list)
+        self.scrape_errors = 0
+
+    async def run(self) -> None:
+        while True:
+            try:
+                resp = await self.client.get("/metrics", timeout=5)
+                self._ingest(resp.text)
+            except httpx.HTTPError:
+                self.scrape_errors += 1
+            await asyncio.sleep(self.interval)
+
+    def _ingest(self, text: str) -> None:
+        for line in text.splitlines():
+            m = _SAMPLE_RE.match(line)
+            if m and m.group(1) in SATURATION_METRICS:
+                self.samples[m.group(1) + (m.group(2) or "")].append(float(m.group(3)))
+
+    def summary(self) -> dict:
+        out = {}
+        for key, values in sorted(self.samples.items()):
+            out[key] = {"max": max(values), "mean": round(statistics.fmean(values), 2), "samples": len(values)}
+        # Share of samples where every pooled connection was checked out
+        for key, checked_out in self.samples.items():
+            if key.startswith("db_pool_checked_out"):
+                size = self.samples.get(key.replace("checked_out", "size"))
+                if size:
+                    full = sum(1 for c, s in zip(checked_out, size) if c >= s > 0)
+                    out[key]["saturated_pct"] = round(100 * full / len(checked_out), 1)
+        return out
+
+
+# ═══════════════════════════════════════════════════════════
+# Scenarios
+# ═══════════════════════════════════════════════════════════
+
+
+class VirtualUser:
+    def __init__(self, scenario: str, n: int, args, secret: str, recorder: Recorder):
+        self.scenario = scenario
+        self.n = n
+        self.args = args
+        self.recorder = recorder
+        self.user_id = f"loadtest-{scenario}-{n}"
+        self.headers = {"Authorization": f"Bearer {mint_token(secret, self.user_id)}"}
+        self.rng = random.Random(f"{args.seed}:{scenario}:{n}")
+        self.games_made = 0
+
+    def games(self, count: int) -> str:
+        pgns = []
+        for _ in range(count):
+            self.games_made += 1
+            site = f"lt{self.args.seed}x{self.scenario[:3]}{self.n}x{self.games_made}"
+            pgns.append(random_game(self.rng, site, self.user_id))
+        return "\n\n".join(pgns)
+
+    async def request(self, client: httpx.AsyncClient, op: str, method: str, url: str, **kwargs) -> bool:
+        start = time.perf_counter()
+        try:
+            resp = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            self.recorder.record(op, time.perf_counter() - start, "exception", False, error=type(e).__name__)
+            return False
+        ok = resp.status_code < 400
+        self.recorder.record(
+            op, time.perf_counter() - start, resp.status_code, ok,
+            error=None if ok else resp.text,
+        )
+        return ok
+
+    async def stream(self, client: httpx.AsyncClient, op: str, url: str, body: dict, headers: dict) -> bool:
+        """POST an SSE endpoint and read it to the end."""
+        start = time.perf_counter()
+        first_event = None
+        outcome, error = None, None
+        try:
+            async with client.stream("POST", url, json=body, headers=headers, timeout=None) as resp:
+                if resp.status_code >= 400:
+                    error = (await resp.aread()).decode(errors="replace")
+                    self.recorder.record(op, time.perf_counter() - start, resp.status_code, False, error=error)
+                    return False
+                async for line in resp.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    if first_event is None:
+                        first_event = time.perf_counter() - start
+                    event = json.loads(line[6:])
+                    kind = event.get("type")
+                    if kind == "queued":
+                        self.recorder.queued[op] += 1
+                    elif kind in ("complete", "error"):
+                        outcome = kind
+                        error = event.get("message")
+                status = resp.status_code
+        except httpx.HTTPError as e:
+            self.recorder.record(op, time.perf_counter() - start, "exception", False, first_event, type(e).__name__)
+            return False
+        ok = outcome == "complete"
+        self.recorder.record(
+            op, time.perf_counter() - start, status, ok, first_event,
+            error=None if ok else (error or "stream ended without complete"),
+        )
+        return ok
+
+    async def setup(self, client: httpx.AsyncClient) -> None:
+        if self.scenario == "dashboard":
+            # Something to show: a page of games for this user
+            await self.request(
+                client, "dashboard.setup_import", "POST", "/api/games/import-pgn",
+                json={"pgn_text": self.games(20), "platform": "lichess"}, headers=self.headers,
+            )
+
+    async def step(self, client: httpx.AsyncClient) -> None:
+        args = self.args
+        if self.scenario == "analysis":
+            imported = await self.request(
+                client, "analysis.import", "POST", "/api/games/import-pgn",
+                json={"pgn_text": self.games(args.games_per_analysis), "platform": "lichess"},
+                headers=self.headers,
+            )
+            if imported:
+                await self.stream(client, "analysis.run", "/api/analysis/run", {"depth": args.depth}, self.headers)
+        elif self.scenario == "anonymous":
+            await self.stream(
+                client, "anonymous.analyze", "/api/anonymous/analyze",
+                {"platform": "pgn", "pgn_text": self.games(args.games_per_analysis), "max_games": args.games_per_analysis},
+                {"X-Real-IP": f"10.{self.n // 65536 % 256}.{self.n // 256 % 256}.{self.n % 256}"},
+            )
+        elif self.scenario == "imports":
+            await self.request(
+                client, "imports.import_pgn", "POST", "/api/games/import-pgn",
+                json={"pgn_text": self.games(args.import_batch), "platform": "lichess"}, headers=self.headers,
+            )
+        elif self.scenario == "dashboard":
+            start = time.perf_counter()
+            results = await asyncio.gather(*(
+                self.request(client, f"dashboard{path.split('?')[0]}", "GET", path, headers=self.headers)
+                for path in DASHBOARD_PATHS
+            ))
+            self.recorder.record("dashboard.page", time.perf_counter() - start, "ok" if all(results) else "partial", all(results))
+            await asyncio.sleep(self.rng.uniform(0, args.think_time * 2))
+
+    async def run(self, client: httpx.AsyncClient, start_delay: float, deadline: float) -> None:
+        await asyncio.sleep(start_delay)
+        await self.setup(client)
+        while time.monotonic() < deadline:
+            await self.step(client)
+
+
+# ═══════════════════════════════════════════════════════════
+# Main
+# ═══════════════════════════════════════════════════════════
+
+
+def _print_report(report: dict) -> None:
+    print(f"\n📊 {report['elapsed_s']:.1f}s, seed {report['config']['seed']}")
+    print(f"   {'operation':<32} {'ok':>6} {'fail':>5} {'req/s':>7} {'p50':>8} {'p95':>8} {'p99':>8}  first event p50/p95")
+    for op, row in report["operations"].items():
+        first = (
+            f"  {row['first_event_p50_s']:.3f}/{row['first_event_p95_s']:.3f}"
+            if "first_event_p50_s" in row else ""
+        )
+        print(
+            f"   {op:<32} {row['ok']:>6} {row['failed']:>5} {row['throughput_rps']:>7.2f} "
+            f"{row['p50_s']:>8.3f} {row['p95_s']:>8.3f} {row['p99_s']:>8.3f}{first}"
+        )
+        if row.get("errors"):
+            for message, count in row["errors"].items():
+                print(f"      ❌ {count}× {message}")
+    if report["saturation"]:
+        print("\n🔧 Pool saturation (from /metrics)")
+        for key, row in report["saturation"].items():
+            extra = f", saturated {row['saturated_pct']}% of samples" if "saturated_pct" in row else ""
+            print(f"   {key:<44} max {row['max']:g}, mean {row['mean']:g}{extra}")
+    else:
+        print("\n⚠️  No /metrics samples (is the metrics endpoint reachable?)")
+
+
+async def main(args) -> None:
+    secret = args.secret or get_settings().nextauth_secret
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        try:
+            (await client.get("/health", timeout=5)).raise_for_status()
+        except httpx.HTTPError as e:
+            print(f"❌ {args.base_url} is not healthy: {e}")
+            sys.exit(1)
+
+        users = [
+            VirtualUser(scenario, n, args, secret, recorder)
+            for scenario in ("analysis", "anonymous", "imports", "dashboard")
+            for n in range(getattr(args, scenario))
+        ]
+        if not users:
+            print("❌ No virtual users — pass --analysis/--anonymous/--imports/--dashboard")
+            sys.exit(1)
+        print(
+            f"🚀 {len(users)} virtual users against {args.base_url} for {args.duration}s "
+            f"(ramp {args.ramp}s): {args.analysis} analysis, {args.anonymous} anonymous, "
+            f"{args.imports} imports, {args.dashboard} dashboard"
+        )
+
+        sampler = SaturationSampler(client, args.metrics_interval)
+        sampler_task = asyncio.create_task(sampler.run())
+        started = time.monotonic()
+        deadline = started + args.ramp + args.duration
+        await asyncio.gather(*(
+            u.run(client, args.ramp * i / len(users), deadline) for i, u in enumerate(users)
+        ))
+        elapsed = time.monotonic() - started
+        sampler_task.cancel()
+
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k != "secret"},
+        "elapsed_s": round(elapsed, 2),
+        "operations": recorder.summary(elapsed),
+        "saturation": sampler.summary(),
+    }
+    _print_report(report)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2) + "\n")
+        print(f"\n💾 Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the API with concurrent analyses, imports and dashboards")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of steady load after the ramp")
+    parser.add_argument("--ramp", type=float, default=5, help="seconds over which virtual users start")
+    parser.add_argument("--analysis", type=int, default=4, help="users streaming /api/analysis/run")
+    parser.add_argument("--anonymous", type=int, default=4, help="users streaming /api/anonymous/analyze")
+    parser.add_argument("--imports", type=int, default=1, help="users importing PGN batches")
+    parser.add_argument("--dashboard", type=int, default=8, help="users loading the dashboard")
+    parser.add_argument("--games-per-analysis", type=int, default=2)
+    parser.add_argument("--import-batch", type=int, default=50, help="games per import request")
+    parser.add_argument("--depth", type=int, default=12, help="depth sent to /api/analysis/run")
+    parser.add_argument("--think-time", type=float, default=1.0, help="mean pause between dashboard loads (s)")
+    parser.add_argument("--timeout", type=float, default=60, help="timeout for non-streaming requests (s)")
+    parser.add_argument("--metrics-interval", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--secret", help="NEXTAUTH_SECRET of the server (default: from settings)")
+    parser.add_argument("--json", help="write the report as JSON")
+    asyncio.run(main(parser.parse_args()))
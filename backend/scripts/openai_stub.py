@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Minimal local stand-in for the OpenAI chat completions API.
+
+Answers POST /v1/chat/completions with a canned answer after an optional
+delay and counts requests, so caching, de-duplication and streaming of the
+AI routes can be exercised without network access or API spend. Requests
+with "stream": true get server-sent chunks, one word every --token-delay
+seconds; coach prompts (asking for "## " sections) get a sectioned review.
+
+    python scripts/openai_stub.py --port 8765 --delay 1.5 --token-delay 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=stub uvicorn app.main:app
+
+GET /stats returns {"requests": N}.
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_lock = threading.Lock()
+_requests = 0
+
+
+REVIEW_TEXT = """## Summary
+A solid game with one costly lapse in the middlegame.
+
+## Critical Moments
+- Move 18: the knight retreat left the e5 pawn undefended.
+
+## Phase Analysis
+Opening play was accurate; the middlegame CPL rose sharply after move 15.
+
+## Actionable Advice
+1. Check every capture before retreating a defender.
+2. Review the opening line up to move 12.
+3. Practise rook endgames with an extra pawn."""
+
+
+def _answer(request: dict, n: int) -> str:
+    messages = request.get("messages", [{}])
+    if "## Summary" in messages[0].get("content", ""):
+        return REVIEW_TEXT
+    prompt = messages[-1].get("content", "")
+    return f"Stub explanation #{n} ({len(prompt)} prompt chars)."
+
+
+def make_handler(delay: float, token_delay: float):
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, payload: dict) -> None:
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self._send_json(200, {"requests": _requests})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            global _requests
+            if not self.path.endswith("/chat/completions"):
+                self._send_json(404, {"error": "not found"})
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            with _lock:
+                _requests += 1
+                n = _requests
+            time.sleep(delay)
+            text = _answer(request, n)
+            if request.get("stream"):
+                self._stream(text, request.get("model"), n)
+                return
+            self._send_json(200, {
+                "id": f"stub-{n}",
+                "object": "chat.completion",
+                "model": request.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            })
+
+        def _stream(self, text: str, model: str, n: int) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            words = text.split(" ")
+            for i, word in enumerate(words):
+                chunk = {
+                    "id": f"stub-{n}",
+                    "object": "chat.completion.chunk",
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": word + (" " if i < len(words) - 1 else "")}}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+                time.sleep(token_delay)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI chat completions stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=1.0, help="seconds before each reply")
+    parser.add_argument("--token-delay", type=float, default=0.05, help="seconds between streamed words")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.delay, args.token_delay))
+    print(f"🔧 OpenAI stub on http://{args.host}:{args.port}/v1 (delay {args.delay}s)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
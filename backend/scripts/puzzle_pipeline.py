@@ -0,0 +1,473 @@
+#!/usr/bin/env python3
+"""
+Puzzle generation pipeline: fetch → PGN queue → engine pool → batched inserts.
+
+Stages (all asyncio tasks in one process; each engine is its own process):
+1. Sources feed a bounded PGN queue — chess.com usernames (from a file or a
+   DB query, fetched asynchronously) or local PGN files for offline runs.
+2. N analysis workers, each owning a Stockfish process, run the same
+   evaluate_game → derive_game_analysis → ensure_solution_lines path as
+   the app, so classification and tactic tags come from app.analysis_core.
+3. A writer batches puzzles into INSERT ... ON CONFLICT (puzzle_key) DO
+   NOTHING (or a JSONL file with --output) and then records each source
+   game as done, so --resume skips finished games only.
+
+Throughput (games/min, plies/s, engine utilisation, queue depth, puzzles
+found/inserted) is printed every --report-every seconds.
+
+Usage:
+    DATABASE_URL=... python scripts/puzzle_pipeline.py --usernames-file players.txt
+    DATABASE_URL=... python scripts/puzzle_pipeline.py --usernames-query "SELECT ..."
+    python scripts/puzzle_pipeline.py --pgn games.pgn [--player NAME] --output puzzles.jsonl
+Common options: [--engines 4] [--depth 14] [--max-games-per-user 20] [--resume]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from io import StringIO
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlparse
+
+import chess
+import chess.pgn
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.analysis_core import derive_game_analysis, detect_puzzle_tactics, movetext_hash
+from app.config import get_settings
+from app.db.models import Puzzle
+from app.engine_evals import ensure_solution_lines, evaluate_game, new_plies
+from app.engine_service import PRIORITY_BACKGROUND, start_engine
+from app.engine_supervisor import EngineUnavailable
+from batch_utils import KeyLog, session_factory
+
+# ── Config ──
+MIN_GAME_MOVES = 10        # Skip very short games (plies)
+MIN_TACTIC_TAGS = 1        # Require at least 1 real tactic (not just 'positional')
+NON_TACTIC_THEMES = {
+    "positional", "opening", "middlegame", "endgame",
+    "blunder", "mistake", "missed_win",
+    "pawn", "knight", "bishop", "rook", "queen", "king",
+}
+CHESSCOM_TIME_CLASSES = ("rapid", "blitz", "bullet", "daily")
+CHESSCOM_HEADERS = {"User-Agent": "ChessAnalyzer/1.0 (puzzle generation)"}
+
+_DONE = object()  # queue sentinel
+
+
+# ═══════════════════════════════════════════════════════════
+# Metrics
+# ═══════════════════════════════════════════════════════════
+
+
+class PipelineMetrics:
+    def __init__(self):
+        self.start = time.monotonic()
+        self.games_queued = 0
+        self.games_skipped = 0
+        self.games_analysed = 0
+        self.games_failed = 0
+        self.plies = 0
+        self.engine_seconds = 0.0
+        self.puzzles_found = 0
+        self.puzzles_inserted = 0
+        self.fetch_errors = 0
+
+    def line(self, engines: int, queue_depth: int) -> str:
+        elapsed = max(time.monotonic() - self.start, 1e-9)
+        busy = self.engine_seconds / (elapsed * max(engines, 1)) * 100
+        return (
+            f"games {self.games_analysed:,}/{self.games_queued:,} "
+            f"({self.games_analysed / elapsed * 60:,.1f}/min, {self.games_failed} failed, "
+            f"{self.games_skipped} already done)  "
+            f"plies {self.plies / elapsed:,.0f}/s  engines {busy:.0f}% busy  "
+            f"queue {queue_depth}  puzzles {self.puzzles_found:,} found / {self.puzzles_inserted:,} new"
+        )
+
+
+async def report_metrics(metrics: PipelineMetrics, pgn_queue: asyncio.Queue, engines: int, every: float):
+    while True:
+        await asyncio.sleep(every)
+        print(f"   📈 {metrics.line(engines, pgn_queue.qsize())}", flush=True)
+
+
+# ═══════════════════════════════════════════════════════════
+# Sources
+# ═══════════════════════════════════════════════════════════
+
+
+def game_key(game: chess.pgn.Game) -> str:
+    """Stable checkpoint key: the game's URL when present, else the movetext hash."""
+    for header in ("Link", "Site"):
+        value = game.headers.get(header, "")
+        if value.startswith("http") and urlparse(value).path.strip("/"):
+            return value
+    return movetext_hash(game)
+
+
+def colors_for(game: chess.pgn.Game, player: Optional[str]) -> tuple[str, ...]:
+    """Sides whose mistakes become puzzles: the named player's, or both."""
+    if not player:
+        return ("white", "black")
+    name = player.lower()
+    return tuple(
+        color for color, header in (("white", "White"), ("black", "Black"))
+        if game.headers.get(header, "").lower() == name
+    )
+
+
+async def _enqueue(game, player, source, pgn_queue, done: KeyLog, metrics: PipelineMetrics) -> None:
+    if game is None or len(list(game.mainline_moves())) < MIN_GAME_MOVES:
+        return
+    colors = colors_for(game, player)
+    if not colors:
+        return
+    key = game_key(game)
+    if key in done:
+        metrics.games_skipped += 1
+        return
+    metrics.games_queued += 1
+    await pgn_queue.put((key, game, colors, source))
+
+
+async def produce_from_pgn_files(paths, player, pgn_queue, done, metrics) -> None:
+    for path in paths:
+        with open(path) as fh:
+            while True:
+                game = chess.pgn.read_game(fh)
+                if game is None:
+                    break
+                await _enqueue(game, player, path, pgn_queue, done, metrics)
+                await asyncio.sleep(0)
+
+
+async def _get_json(client: httpx.AsyncClient, url: str, timeout: float) -> Optional[dict]:
+    """GET with one retry after a 429."""
+    for attempt in range(2):
+        resp = await client.get(url, timeout=timeout)
+        if resp.status_code == 429 and attempt == 0:
+            print("  ⚠ Rate limited, waiting 5s...")
+            await asyncio.sleep(5)
+            continue
+        if resp.status_code != 200:
+            return None
+        return resp.json()
+    return None
+
+
+async def fetch_chesscom_user(client, username, max_games, pgn_queue, done, metrics) -> None:
+    """Stream a user's most recent games (last 3 monthly archives) into the queue."""
+    try:
+        data = await _get_json(client, f"https://api.chess.com/pub/player/{username}/games/archives", 10)
+        archives = (data or {}).get("archives", [])
+        if not archives:
+            print(f"  ⚠ No archives for {username}")
+            return
+        fetched = 0
+        for archive_url in reversed(archives[-3:]):
+            month = await _get_json(client, archive_url, 15)
+            for g in reversed((month or {}).get("games", [])):  # Most recent first
+                pgn_str = g.get("pgn")
+                if not pgn_str or g.get("time_class", "") not in CHESSCOM_TIME_CLASSES:
+                    continue
+                await _enqueue(chess.pgn.read_game(StringIO(pgn_str)), username, username, pgn_queue, done, metrics)
+                fetched += 1
+                if fetched >= max_games:
+                    return
+            await asyncio.sleep(0.3)  # Rate limiting
+    except Exception as e:
+        metrics.fetch_errors += 1
+        print(f"  ⚠ Error fetching games for {username}: {e}")
+
+
+async def produce_from_chesscom(usernames, max_games, concurrency, pgn_queue, done, metrics) -> None:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(username):
+        async with sem:
+            await fetch_chesscom_user(client, username, max_games, pgn_queue, done, metrics)
+
+    async with httpx.AsyncClient(headers=CHESSCOM_HEADERS) as client:
+        await asyncio.gather(*(one(u) for u in usernames))
+
+
+async def load_usernames(args) -> list[str]:
+    if args.usernames_file:
+        lines = Path(args.usernames_file).read_text().splitlines()
+        return [u.strip() for u in lines if u.strip() and not u.startswith("#")]
+    engine, async_session = session_factory()
+    try:
+        async with async_session() as db:
+            rows = (await db.execute(text(args.usernames_query))).fetchall()
+    finally:
+        await engine.dispose()
+    return [r[0] for r in rows if r[0]]
+
+
+# ═══════════════════════════════════════════════════════════
+# Analysis workers
+# ═══════════════════════════════════════════════════════════
+
+
+def select_puzzles(candidates: list[tuple[int, dict]]) -> list[dict]:
+    """Re-tag with the solution line and keep puzzles with a real tactic."""
+    puzzles = []
+    for _, pd in candidates:
+        if pd.get("best_move_uci"):
+            themes = detect_puzzle_tactics(pd["fen"], pd["best_move_uci"], pd["solution_line"])
+            if pd["phase"] not in themes:
+                themes.append(pd["phase"])
+            pd["themes"] = themes
+        if len([t for t in pd["themes"] if t not in NON_TACTIC_THEMES]) >= MIN_TACTIC_TAGS:
+            puzzles.append(pd)
+    return puzzles
+
+
+async def analyse_source_game(engine, game, colors, depth: int) -> tuple[list[dict], int]:
+    """All puzzles for `colors` in one game; post-move evals are shared between sides."""
+    plies = new_plies(game)
+    puzzles = []
+    for color in colors:
+        await evaluate_game(engine, game, plies, depth, color)
+        derived = derive_game_analysis(game, plies, color)
+        candidates = derived["puzzle_candidates"]
+        await ensure_solution_lines(engine, plies, candidates, depth, game_key=game)
+        puzzles.extend(select_puzzles(candidates))
+    return puzzles, len(plies)
+
+
+async def open_worker_engine(args):
+    """
+    Stockfish with the "batch" profile, --threads / --hash taking precedence.
+    Crashed or hung engines are restarted and the position retried in place.
+    With ENGINE_SERVICE_SOCKET set, searches go to the host's engine service
+    instead (its pool size, not --engines, then bounds engine processes).
+    """
+    return await start_engine(
+        "batch", pipeline="puzzles", priority=PRIORITY_BACKGROUND,
+        path=args.stockfish, threads=args.threads, hash_mb=args.hash,
+    )
+
+
+async def analysis_worker(worker_id, args, pgn_queue, out_queue, metrics) -> None:
+    engine = await open_worker_engine(args)
+    try:
+        while True:
+            item = await pgn_queue.get()
+            if item is _DONE:
+                break
+            key, game, colors, source = item
+            started = time.monotonic()
+            try:
+                puzzles, plies = await analyse_source_game(engine, game, colors, args.depth)
+            except EngineUnavailable as e:
+                metrics.games_failed += 1
+                print(f"  ⚠ Engine {worker_id} gave up on a game from {source}: {e}")
+                continue
+            except Exception as e:
+                metrics.games_failed += 1
+                print(f"  ⚠ Failed game from {source}: {e}")
+                continue
+            finally:
+                metrics.engine_seconds += time.monotonic() - started
+            metrics.games_analysed += 1
+            metrics.plies += plies
+            metrics.puzzles_found += len(puzzles)
+            await out_queue.put((key, puzzles))
+    finally:
+        await engine.close()
+
+
+# ═══════════════════════════════════════════════════════════
+# Writer
+# ═══════════════════════════════════════════════════════════
+
+
+def _puzzle_row(pd: dict) -> dict:
+    return {
+        "puzzle_key": pd["puzzle_key"],
+        "fen": pd["fen"],
+        "side_to_move": pd["side_to_move"],
+        "best_move_san": pd["best_move_san"],
+        "best_move_uci": pd.get("best_move_uci"),
+        "played_move_san": pd.get("played_move_san"),
+        "eval_loss_cp": pd["eval_loss_cp"],
+        "phase": pd["phase"],
+        "puzzle_type": pd["puzzle_type"],
+        "difficulty": "standard",
+        "move_number": pd.get("move_number"),
+        "solution_line": pd.get("solution_line", []),
+        "themes": pd.get("themes", []),
+    }
+
+
+async def _insert_puzzles(async_session, puzzles: list[dict]) -> int:
+    rows = list({pd["puzzle_key"]: _puzzle_row(pd) for pd in puzzles}.values())
+    if not rows:
+        return 0
+    async with async_session() as db:
+        result = await db.execute(
+            pg_insert(Puzzle).values(rows)
+            .on_conflict_do_nothing(index_elements=["puzzle_key"])
+            .returning(Puzzle.id)
+        )
+        inserted = len(result.fetchall())
+        await db.commit()
+    return inserted
+
+
+async def writer(args, out_queue, done: KeyLog, metrics) -> None:
+    """Flush when --insert-batch puzzles are pending or every --flush-interval seconds."""
+    async_session = None
+    db_engine = None
+    output = None
+    if args.output:
+        output = open(args.output, "a")
+    else:
+        db_engine, async_session = session_factory()
+
+    pending_keys: list[str] = []
+    pending: list[dict] = []
+    last_flush = time.monotonic()
+
+    async def flush():
+        nonlocal last_flush
+        if output is not None:
+            output.writelines(json.dumps(_puzzle_row(pd)) + "\n" for pd in pending)
+            output.flush()
+            metrics.puzzles_inserted += len(pending)
+        elif pending:
+            metrics.puzzles_inserted += await _insert_puzzles(async_session, pending)
+        done.add_many(pending_keys)
+        pending_keys.clear()
+        pending.clear()
+        last_flush = time.monotonic()
+
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(out_queue.get(), timeout=args.flush_interval)
+            except asyncio.TimeoutError:
+                item = None
+            if item is _DONE:
+                break
+            if item is not None:
+                key, puzzles = item
+                pending_keys.append(key)
+                pending.extend(puzzles)
+            if len(pending) >= args.insert_batch or (
+                pending_keys and time.monotonic() - last_flush >= args.flush_interval
+            ):
+                await flush()
+        await flush()
+    finally:
+        if output is not None:
+            output.close()
+        if db_engine is not None:
+            await db_engine.dispose()
+
+
+# ═══════════════════════════════════════════════════════════
+# Main
+# ═══════════════════════════════════════════════════════════
+
+
+async def run(args) -> None:
+    if not args.resume and args.checkpoint and Path(args.checkpoint).exists():
+        Path(args.checkpoint).unlink()
+    done = KeyLog(args.checkpoint)
+
+    metrics = PipelineMetrics()
+    pgn_queue: asyncio.Queue = asyncio.Queue(maxsize=args.engines * 4)
+    out_queue: asyncio.Queue = asyncio.Queue()
+
+    if args.pgn:
+        source_desc = f"{len(args.pgn)} PGN file(s)"
+        produce = produce_from_pgn_files(args.pgn, args.player, pgn_queue, done, metrics)
+    else:
+        usernames = await load_usernames(args)
+        source_desc = f"{len(usernames)} chess.com accounts"
+        produce = produce_from_chesscom(
+            usernames, args.max_games_per_user, args.fetch_concurrency, pgn_queue, done, metrics,
+        )
+
+    print(f"📊 Generating puzzles from {source_desc} with {args.engines} engine(s) at depth {args.depth}")
+    if args.resume:
+        print(f"   Resuming: {len(done):,} source games already done")
+    print("=" * 60)
+
+    workers = [
+        asyncio.create_task(analysis_worker(i, args, pgn_queue, out_queue, metrics))
+        for i in range(args.engines)
+    ]
+    writer_task = asyncio.create_task(writer(args, out_queue, done, metrics))
+    reporter = asyncio.create_task(report_metrics(metrics, pgn_queue, args.engines, args.report_every))
+
+    async def feed():
+        await produce
+        for _ in workers:
+            await pgn_queue.put(_DONE)
+
+    feeder = asyncio.create_task(feed())
+    try:
+        # Fails fast if a stage dies (e.g. no engine could be started)
+        await asyncio.gather(feeder, *workers)
+        await out_queue.put(_DONE)
+        await writer_task
+    finally:
+        reporter.cancel()
+        for task in (feeder, *workers, writer_task):
+            task.cancel()
+
+    print("\n" + "=" * 60)
+    print("🎉 DONE!")
+    print(f"   {metrics.line(args.engines, 0)}")
+    print(f"   Duplicates skipped: {metrics.puzzles_found - metrics.puzzles_inserted}")
+    print(f"   Fetch errors: {metrics.fetch_errors}")
+
+
+def build_parser(**defaults) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Generate tactical puzzles from games")
+    source = parser.add_mutually_exclusive_group(required="usernames_file" not in defaults)
+    source.add_argument("--usernames-file", help="chess.com usernames, one per line")
+    source.add_argument("--usernames-query", help="SQL returning chess.com usernames in the first column")
+    source.add_argument("--pgn", nargs="+", help="local PGN file(s) — no network needed")
+    parser.add_argument("--player", help="with --pgn: only this player's moves become puzzles")
+    parser.add_argument("--output", help="append puzzles to this JSONL file instead of the database")
+    parser.add_argument("--engines", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--threads", type=int, help="Stockfish threads per engine (default: batch profile)")
+    parser.add_argument("--hash", type=int, help="Stockfish hash (MB) per engine (default: batch profile)")
+    parser.add_argument("--stockfish", default=get_settings().stockfish_path)
+    parser.add_argument("--depth", type=int, default=14)
+    parser.add_argument("--max-games-per-user", type=int, default=20)
+    parser.add_argument("--fetch-concurrency", type=int, default=4)
+    parser.add_argument("--insert-batch", type=int, default=200, help="puzzles per INSERT")
+    parser.add_argument("--flush-interval", type=float, default=10.0, help="max seconds between writes")
+    parser.add_argument("--checkpoint", default="puzzle_pipeline.done", help="finished source games")
+    parser.add_argument("--resume", action="store_true", help="skip games recorded in --checkpoint")
+    parser.add_argument("--report-every", type=float, default=15.0)
+    parser.set_defaults(**defaults)
+    return parser
+
+
+def main(argv: Optional[list[str]] = None, **defaults) -> None:
+    args = build_parser(**defaults).parse_args(argv)
+    if args.pgn or args.usernames_query:
+        args.usernames_file = None
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
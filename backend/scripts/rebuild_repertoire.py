@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Recompute opening_repertoire from games + game_analysis.
+
+Imports, analyses and claimed anonymous results keep the repertoire current
+with additive upserts (app.repertoire.RepertoireDelta). Run this once after
+migration 004 to fill cpl_sum / cpl_games for existing rows, and again
+whenever the counters may have drifted (games deleted by hand, a failed
+deploy). Works user by user, one commit per user, so it can run against a
+live database.
+
+Usage:
+    DATABASE_URL=... python rebuild_repertoire.py [--user-id <uuid>]
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from sqlalchemy import text
+
+from app.repertoire import rebuild_repertoire
+from batch_utils import Progress, session_factory
+
+
+async def main(args) -> None:
+    engine, async_session = session_factory()
+    rows_written = 0
+
+    try:
+        async with async_session() as db:
+            if args.user_id:
+                user_ids = [args.user_id]
+            else:
+                user_ids = [
+                    r[0] for r in (await db.execute(
+                        text("SELECT DISTINCT user_id FROM games ORDER BY user_id")
+                    )).fetchall()
+                ]
+                print(f"📊 {len(user_ids):,} users with games")
+
+            progress = Progress("users", len(user_ids))
+            for user_id in user_ids:
+                rows_written += await rebuild_repertoire(db, str(user_id))
+                await db.commit()
+                progress.advance(1, rows=rows_written)
+
+            progress.finish(rows=rows_written)
+    finally:
+        await engine.dispose()
+
+    print(f"\n🎉 Repertoire rebuilt: {rows_written:,} rows")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild opening_repertoire from games and analyses")
+    parser.add_argument("--user-id", help="only rebuild this user's repertoire")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+"""
+Re-derive move classifications from stored evaluations — no engine needed.
+
+Everything `derive_game_analysis` needs per ply is already in
+move_evaluations (eval_before/eval_after, mate flags, fen_before,
+best_move_uci) plus games.player_elo, so changes to `move_accuracy`,
+`ELO_THRESHOLDS` or the `classify_move` rules can be applied to the whole
+table without re-running Stockfish:
+
+1. Games with an analysis are walked in keyset-paginated batches (games.id)
+   and their plies fetched in game order.
+2. cp_loss, win probability and accuracy are recomputed as NumPy arrays.
+   win_probability / move_accuracy and rounding are called once per
+   distinct input, so results are bit-identical to the online path.
+3. The player's moves (which need a board) are classified in a process
+   pool, with the stored mate distances; opponent moves use the plain
+   cp_loss bands.
+4. Changed rows are written back with one bulk UPDATE per table per batch,
+   and GameAnalysis counters/averages are recomputed.
+
+Usage:
+    DATABASE_URL=... python scripts/reclassify_moves.py [--batch-size 500] [--workers N]
+        [--checkpoint reclassify.ckpt] [--resume] [--dry-run]
+    python scripts/reclassify_moves.py --self-check
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import chess
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from sqlalchemy import text
+
+from app.analysis_core import (
+    LegalMoveSummary,
+    avg,
+    classify_blunder_subtype,
+    classify_move,
+    compute_game_accuracy,
+    move_accuracy,
+    win_probability,
+)
+from batch_utils import Checkpoint, Progress, bulk_update, count_rows, session_factory
+
+CHUNK_SIZE = 2000  # player plies per process-pool task
+
+MOVE_COLUMNS = {
+    "cp_loss": "integer",
+    "move_quality": "text",
+    "blunder_subtype": "text",
+    "win_prob_before": "float8",
+    "win_prob_after": "float8",
+    "accuracy": "float8",
+}
+
+ANALYSIS_COLUMNS = {
+    "overall_cpl": "float8",
+    "phase_opening_cpl": "float8",
+    "phase_middlegame_cpl": "float8",
+    "phase_endgame_cpl": "float8",
+    "blunders_count": "integer",
+    "mistakes_count": "integer",
+    "inaccuracies_count": "integer",
+    "best_moves_count": "integer",
+    "great_moves_count": "integer",
+    "brilliant_moves_count": "integer",
+    "missed_wins_count": "integer",
+    "accuracy": "float8",
+    "time_trouble_blunders": "integer",
+}
+
+COUNTED = {
+    "Blunder": "blunders_count",
+    "Mistake": "mistakes_count",
+    "Inaccuracy": "inaccuracies_count",
+    "Best": "best_moves_count",
+    "Great": "great_moves_count",
+    "Brilliant": "brilliant_moves_count",
+    "Missed Win": "missed_wins_count",
+}
+
+
+# ═══════════════════════════════════════════════════════════
+# Vectorized per-ply numbers
+# ═══════════════════════════════════════════════════════════
+
+
+def _map_unique(values: np.ndarray, fn) -> np.ndarray:
+    """Apply a scalar Python function once per distinct value."""
+    uniq, inverse = np.unique(values, return_inverse=True)
+    return np.array([fn(v) for v in uniq.tolist()], dtype=np.float64)[inverse]
+
+
+def _map_unique_rows(columns: list[np.ndarray], fn) -> np.ndarray:
+    """Apply `fn(*row)` once per distinct row of the given columns."""
+    uniq, inverse = np.unique(np.column_stack(columns), axis=0, return_inverse=True)
+    return np.array([fn(*row) for row in uniq.tolist()], dtype=np.float64)[inverse.reshape(-1)]
+
+
+def compute_ply_numbers(rows: list[dict]) -> dict[str, np.ndarray]:
+    """
+    cp_loss, win probabilities and accuracy for every row, matching
+    `derive_game_analysis` exactly. Rows must be in game/move order.
+    """
+    n = len(rows)
+    eval_before = np.fromiter((r["eval_before"] or 0 for r in rows), dtype=np.int64, count=n)
+    eval_after = np.fromiter((r["eval_after"] or 0 for r in rows), dtype=np.int64, count=n)
+    mate_before = np.fromiter((bool(r["is_mate_before"]) for r in rows), dtype=bool, count=n)
+    mate_after = np.fromiter((bool(r["is_mate_after"]) for r in rows), dtype=bool, count=n)
+    white = np.fromiter((r["color"] == "white" for r in rows), dtype=bool, count=n)
+
+    diff = np.where(white, eval_before - eval_after, eval_after - eval_before)
+    cp_loss = np.minimum(np.where(mate_before & mate_after, 0, np.maximum(diff, 0)), 800)
+
+    # Mate scores are stored clamped to ±1500, so the sign gives the mating side
+    wp_before = np.where(mate_before, (eval_before > 0).astype(np.float64), _map_unique(eval_before, win_probability))
+    wp_after = np.where(mate_after, (eval_after > 0).astype(np.float64), _map_unique(eval_after, win_probability))
+
+    # The curve itself stays in analysis_core.move_accuracy, so changes to it apply here
+    accuracy = _map_unique_rows(
+        [wp_before, wp_after, white.astype(np.float64)],
+        lambda before, after, is_white: move_accuracy(before, after, "white" if is_white else "black"),
+    )
+
+    return {
+        "cp_loss": cp_loss,
+        "wp_before": wp_before,
+        "wp_after": wp_after,
+        "accuracy": accuracy,
+        "wp_before_r": _map_unique(wp_before, lambda v: round(v, 4)),
+        "wp_after_r": _map_unique(wp_after, lambda v: round(v, 4)),
+        "accuracy_r": _map_unique(accuracy, lambda v: round(v, 1)),
+    }
+
+
+def _simple_qualities(cp_loss: np.ndarray) -> np.ndarray:
+    """Vectorized `_simple_quality`."""
+    return np.select(
+        [cp_loss == 0, cp_loss <= 10, cp_loss <= 25, cp_loss <= 100, cp_loss <= 300],
+        ["Best", "Excellent", "Good", "Inaccuracy", "Mistake"],
+        default="Blunder",
+    )
+
+
+# ═══════════════════════════════════════════════════════════
+# Player-move classification (process pool)
+# ═══════════════════════════════════════════════════════════
+
+
+def _mate_distance(stored: Optional[int], is_mate: bool, eval_cp: int) -> Optional[int]:
+    """Stored mate distance; rows from before it was stored only have the sign (±1500 eval)."""
+    if not is_mate:
+        return None
+    if stored is not None:
+        return stored
+    return 1 if eval_cp > 0 else -1
+
+
+def classify_chunk(items: list[tuple]) -> list[tuple[str, Optional[str]]]:
+    """
+    Worker: (fen_before, san, best_uci, cp_loss, wp_before, wp_after, color,
+    eval_before, eval_after, is_mate_before, is_mate_after, mate_before,
+    mate_after, player_elo, phase) -> (move_quality, blunder_subtype).
+    """
+    out = []
+    for (fen, san, best_uci, cp_loss, wp_before, wp_after, color, eval_before, eval_after,
+         is_mate_before, is_mate_after, mate_before, mate_after, elo, phase) in items:
+        board = chess.Board(fen)
+        move = board.parse_san(san)
+        best = chess.Move.from_uci(best_uci) if best_uci else None
+        legal_moves = LegalMoveSummary(board)
+        quality = classify_move(
+            cp_loss=cp_loss,
+            win_prob_before=wp_before,
+            win_prob_after=wp_after,
+            color=color,
+            board_before=board,
+            move=move,
+            best_move=best,
+            is_only_legal=legal_moves.is_only_legal,
+            eval_before_cp=eval_before,
+            eval_after_cp=eval_after,
+            is_mate_before=is_mate_before,
+            is_mate_after=is_mate_after,
+            mate_before=_mate_distance(mate_before, is_mate_before, eval_before),
+            mate_after=_mate_distance(mate_after, is_mate_after, eval_after),
+            player_elo=elo,
+            legal_moves=legal_moves,
+        )
+        subtype = classify_blunder_subtype(board, move, best, phase) if quality == "Blunder" else None
+        out.append((quality, subtype))
+    return out
+
+
+async def _classify_players(items: list[tuple], pool: Optional[ProcessPoolExecutor]) -> list:
+    if pool is None:
+        return classify_chunk(items)
+    loop = asyncio.get_running_loop()
+    chunks = [items[i:i + CHUNK_SIZE] for i in range(0, len(items), CHUNK_SIZE)]
+    results = await asyncio.gather(*(loop.run_in_executor(pool, classify_chunk, c) for c in chunks))
+    return [r for chunk in results for r in chunk]
+
+
+# ═══════════════════════════════════════════════════════════
+# Batch reclassification
+# ═══════════════════════════════════════════════════════════
+
+
+async def reclassify_batch(
+    games: dict[int, dict],
+    rows: list[dict],
+    pool: Optional[ProcessPoolExecutor],
+) -> tuple[list[dict], dict[int, dict]]:
+    """
+    Recompute every row of `rows` (plies of `games`, in game/move order).
+    Returns (new move values keyed by row id, new GameAnalysis values by game id).
+    """
+    if not rows:
+        return [], {}
+    nums = compute_ply_numbers(rows)
+    qualities = _simple_qualities(nums["cp_loss"]).astype(object)
+    subtypes = np.full(len(rows), None, dtype=object)
+
+    is_player = [r["color"] == games[r["game_id"]]["color"] for r in rows]
+    # Rows without a stored position can't be re-derived; keep what they have
+    player_idx = []
+    for i, r in enumerate(rows):
+        if not is_player[i]:
+            continue
+        if r["fen_before"]:
+            player_idx.append(i)
+        else:
+            qualities[i] = r["move_quality"]
+            subtypes[i] = r["blunder_subtype"]
+    items = [
+        (
+            rows[i]["fen_before"], rows[i]["san"], rows[i]["best_move_uci"],
+            int(nums["cp_loss"][i]), float(nums["wp_before"][i]), float(nums["wp_after"][i]),
+            rows[i]["color"], rows[i]["eval_before"] or 0, rows[i]["eval_after"] or 0,
+            bool(rows[i]["is_mate_before"]), bool(rows[i]["is_mate_after"]),
+            rows[i].get("mate_before"), rows[i].get("mate_after"),
+            games[rows[i]["game_id"]]["player_elo"], rows[i]["phase"],
+        )
+        for i in player_idx
+    ]
+    for i, (quality, subtype) in zip(player_idx, await _classify_players(items, pool)):
+        qualities[i] = quality
+        subtypes[i] = subtype
+
+    moves = []
+    per_game: dict[int, dict] = {}
+    for i, r in enumerate(rows):
+        moves.append({
+            "id": r["id"],
+            "cp_loss": int(nums["cp_loss"][i]),
+            "move_quality": qualities[i],
+            "blunder_subtype": subtypes[i],
+            "win_prob_before": float(nums["wp_before_r"][i]),
+            "win_prob_after": float(nums["wp_after_r"][i]),
+            "accuracy": float(nums["accuracy_r"][i]),
+        })
+        g = per_game.setdefault(r["game_id"], {
+            "losses": [], "accuracies": [], "trouble": 0,
+            "phases": {"opening": [], "middlegame": [], "endgame": []},
+            "counts": dict.fromkeys(COUNTED.values(), 0),
+        })
+        if not is_player[i]:
+            continue
+        loss = int(nums["cp_loss"][i])
+        g["losses"].append(loss)
+        g["accuracies"].append(float(nums["accuracy"][i]))
+        if r["phase"] in g["phases"]:
+            g["phases"][r["phase"]].append(loss)
+        if qualities[i] in COUNTED:
+            g["counts"][COUNTED[qualities[i]]] += 1
+        if qualities[i] == "Blunder" and r["time_remaining"] is not None and r["time_remaining"] < 30:
+            g["trouble"] += 1
+
+    analyses = {}
+    for game_id, g in per_game.items():
+        losses = g["losses"]
+        analyses[game_id] = {
+            "game_id": game_id,
+            "overall_cpl": round(sum(losses) / len(losses), 2) if losses else 0,
+            "phase_opening_cpl": avg(g["phases"]["opening"]),
+            "phase_middlegame_cpl": avg(g["phases"]["middlegame"]),
+            "phase_endgame_cpl": avg(g["phases"]["endgame"]),
+            **g["counts"],
+            "accuracy": compute_game_accuracy(g["accuracies"]),
+            "time_trouble_blunders": g["trouble"],
+        }
+    return moves, analyses
+
+
+def _changed(new_rows: list[dict], stored: dict[int, dict], key: str, columns: dict) -> list[dict]:
+    return [
+        row for row in new_rows
+        if any(stored[row[key]].get(col) != row[col] for col in columns)
+    ]
+
+
+# ═══════════════════════════════════════════════════════════
+# Database walk
+# ═══════════════════════════════════════════════════════════
+
+
+async def fetch_batch(db, after_id: int, batch_size: int) -> tuple[dict[int, dict], list[dict], dict[int, dict]]:
+    """Next `batch_size` analysed games after `after_id`, their plies and stored analyses."""
+    game_rows = (await db.execute(
+        text(
+            f"SELECT ga.game_id, g.color, g.player_elo, {', '.join('ga.' + c for c in ANALYSIS_COLUMNS)} "
+            "FROM games g "
+            "JOIN game_analysis ga ON ga.game_id = g.id "
+            "WHERE g.id > :after ORDER BY g.id LIMIT :limit"
+        ),
+        {"after": after_id, "limit": batch_size},
+    )).mappings().all()
+    if not game_rows:
+        return {}, [], {}
+
+    games = {r["game_id"]: {"color": r["color"], "player_elo": r["player_elo"]} for r in game_rows}
+    stored_analyses = {r["game_id"]: dict(r) for r in game_rows}
+    move_rows = (await db.execute(
+        text(
+            "SELECT id, game_id, move_number, color, san, fen_before, best_move_uci, phase, "
+            "eval_before, eval_after, is_mate_before, is_mate_after, mate_before, mate_after, time_remaining, "
+            "cp_loss, move_quality, blunder_subtype, win_prob_before, win_prob_after, accuracy "
+            "FROM move_evaluations WHERE game_id = ANY(:ids) ORDER BY game_id, move_number"
+        ),
+        {"ids": list(games)},
+    )).mappings().all()
+    return games, [dict(r) for r in move_rows], stored_analyses
+
+
+async def run(args) -> None:
+    engine, async_session = session_factory()
+    checkpoint = Checkpoint(args.checkpoint)
+    after_id = checkpoint.get("last_game_id", 0) if args.resume else 0
+    pool = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 1 else None
+
+    async with async_session() as db:
+        total = await count_rows(
+            db,
+            "SELECT count(*) FROM move_evaluations me JOIN game_analysis ga "
+            "ON ga.game_id = me.game_id WHERE me.game_id > :after",
+            {"after": after_id},
+        )
+        print(f"📊 {total:,} plies to reclassify" + (f" (resuming after game {after_id})" if after_id else ""))
+        progress = Progress("plies", total)
+        moves_changed = analyses_changed = 0
+
+        batch = await fetch_batch(db, after_id, args.batch_size)
+        while batch[0]:
+            games, rows, stored_analyses = batch
+            last_id = max(games)
+            # Fetch the next page while the pool classifies this one
+            work = asyncio.ensure_future(reclassify_batch(games, rows, pool))
+            next_batch = await fetch_batch(db, last_id, args.batch_size)
+            new_moves, new_analyses = await work
+
+            stored_moves = {r["id"]: r for r in rows}
+            move_updates = _changed(new_moves, stored_moves, "id", MOVE_COLUMNS)
+            analysis_updates = _changed(list(new_analyses.values()), stored_analyses, "game_id", ANALYSIS_COLUMNS)
+            moves_changed += len(move_updates)
+            analyses_changed += len(analysis_updates)
+
+            if not args.dry_run:
+                await bulk_update(db, "move_evaluations", move_updates, MOVE_COLUMNS)
+                await bulk_update(
+                    db, "game_analysis", analysis_updates, ANALYSIS_COLUMNS, key="game_id",
+                )
+                await db.commit()
+                checkpoint.save(last_game_id=last_id)
+
+            progress.advance(len(rows), moves_changed=moves_changed, analyses_changed=analyses_changed)
+            batch = next_batch
+
+        progress.finish(moves_changed=moves_changed, analyses_changed=analyses_changed)
+        if args.dry_run:
+            print("ℹ️  Dry run — nothing written")
+
+    if pool is not None:
+        pool.shutdown()
+    await engine.dispose()
+
+
+# ═══════════════════════════════════════════════════════════
+# Self-check against the online path
+# ═══════════════════════════════════════════════════════════
+
+
+async def self_check(workers: int) -> None:
+    """
+    Derive both sides of every fixture game with `derive_game_analysis`, store
+    the results as rows with the derived fields blanked, reclassify them and
+    require an exact match.
+    """
+    from app.analysis_core import derive_game_analysis
+    from benchmarks.bench_classification import load_games
+
+    games, rows, expected_moves, expected_analyses = {}, [], {}, {}
+    next_id = 1
+    for game_id, (game, plies) in enumerate(load_games(), start=1):
+        for color, elo in (("white", None), ("black", 1500)):
+            gid = game_id * 2 + (color == "black")
+            derived = derive_game_analysis(game, plies, color, elo)
+            games[gid] = {"color": color, "player_elo": elo}
+            for move in derived["moves"]:
+                rows.append({
+                    **move, "id": next_id, "game_id": gid,
+                    "move_quality": None, "blunder_subtype": None, "cp_loss": None,
+                    "win_prob_before": None, "win_prob_after": None, "accuracy": None,
+                })
+                expected_moves[next_id] = move
+                next_id += 1
+            losses = derived["player_cp_losses"]
+            expected_analyses[gid] = {
+                "overall_cpl": round(sum(losses) / len(losses), 2) if losses else 0,
+                "phase_opening_cpl": derived["phase_opening_cpl"],
+                "phase_middlegame_cpl": derived["phase_middlegame_cpl"],
+                "phase_endgame_cpl": derived["phase_endgame_cpl"],
+                **{col: derived[col.removesuffix("_count")] for col in COUNTED.values()},
+                "accuracy": derived["accuracy"],
+                "time_trouble_blunders": derived["time_trouble_blunders"],
+            }
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    new_moves, new_analyses = await reclassify_batch(games, rows, pool)
+    if pool is not None:
+        pool.shutdown()
+
+    mismatches = 0
+    for row in new_moves:
+        want = expected_moves[row["id"]]
+        for col in MOVE_COLUMNS:
+            if row[col] != want[col]:
+                mismatches += 1
+                print(f"❌ ply {row['id']} {col}: got {row[col]!r}, online {want[col]!r}")
+    for gid, got in new_analyses.items():
+        for col in ANALYSIS_COLUMNS:
+            if got[col] != expected_analyses[gid][col]:
+                mismatches += 1
+                print(f"❌ game {gid} {col}: got {got[col]!r}, online {expected_analyses[gid][col]!r}")
+
+    if mismatches:
+        print(f"❌ {mismatches} mismatches over {len(rows):,} plies")
+        sys.exit(1)
+    print(f"✅ {len(rows):,} plies / {len(games)} game sides match the online path")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500, help="games per batch")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--checkpoint", default="reclassify_moves.ckpt")
+    parser.add_argument("--resume", action="store_true", help="continue after the checkpointed game")
+    parser.add_argument("--dry-run", action="store_true", help="report changes without writing")
+    parser.add_argument("--self-check", action="store_true", help="compare against derive_game_analysis on fixtures")
+    args = parser.parse_args()
+
+    if args.self_check:
+        asyncio.run(self_check(args.workers))
+    else:
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
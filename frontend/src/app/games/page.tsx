@@ -229,6 +229,11 @@ export default function GamesPage() {
             total: event.total,
             currentLabel: `Analyzing game 1 of ${event.total}...`,
           }));
+        } else if (event.type === "queued") {
+          setAnalyseAllProgress((prev) => ({
+            ...prev,
+            currentLabel: `Waiting for a free engine (position ${event.position} in queue)...`,
+          }));
         } else if (event.type === "progress") {
           setAnalyseAllProgress((prev) => ({
             ...prev,
@@ -74,6 +74,7 @@ export default function HomePage() {
   // Progress
   const [progressTotal, setProgressTotal] = useState(0);
   const [progressDone, setProgressDone] = useState(0);
+  const [queuePosition, setQueuePosition] = useState(0);
 
   // Results & step — start with defaults, hydrate from sessionStorage in useEffect
   const [results, setResults] = useState<AnonAnalysisResults | null>(null);
@@ -174,6 +175,7 @@ export default function HomePage() {
     setStep("analyzing");
     setProgressDone(0);
     setProgressTotal(0);
+    setQueuePosition(0);
 
     try {
       const finalResults = await startAnonymousAnalysis(
@@ -186,9 +188,14 @@ export default function HomePage() {
         (event: AnonProgressEvent) => {
           if (event.type === "start") {
             setProgressTotal(event.total);
+          } else if (event.type === "queued") {
+            setQueuePosition(event.position);
           } else if (event.type === "progress") {
+            setQueuePosition(0);
             setProgressDone(event.completed);
             setProgressTotal(event.total);
+          } else if (event.type === "game_error") {
+            setProgressDone(event.game_index + 1);
           } else if (event.type === "error") {
             setError(event.message);
             setStep("input");
@@ -264,7 +271,11 @@ export default function HomePage() {
 
       {/* Step: Analyzing */}
       {step === "analyzing" && (
-        <AnalyzingProgress total={progressTotal} done={progressDone} />
+        <AnalyzingProgress
+          total={progressTotal}
+          done={progressDone}
+          queuePosition={queuePosition}
+        />
       )}
 
       {/* Step: Results locked (need sign-in) */}
@@ -411,7 +422,15 @@ function AnalysisInput({
 // Analyzing Progress
 // ═══════════════════════════════════════════════════════════
 
-function AnalyzingProgress({ total, done }: { total: number; done: number }) {
+function AnalyzingProgress({
+  total,
+  done,
+  queuePosition,
+}: {
+  total: number;
+  done: number;
+  queuePosition: number;
+}) {
   const pct = total > 0 ? Math.round((done / total) * 100) : 0;
 
   return (
@@ -423,7 +442,11 @@ function AnalyzingProgress({ total, done }: { total: number; done: number }) {
             Analyzing your games...
           </h2>
           <p className="text-gray-400 text-sm">
-            {total > 0 ? `Game ${done} of ${total}` : "Fetching games..."}
+            {queuePosition > 0
+              ? `Waiting for a free engine (position ${queuePosition} in queue)`
+              : total > 0
+                ? `Game ${done} of ${total}`
+                : "Fetching games..."}
           </p>
         </div>
 
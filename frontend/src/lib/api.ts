@@ -165,6 +165,12 @@ export interface JobStatus {
   total_games: number;
   games_completed: number;
   error: string | null;
+  priority_class?: "interactive" | "batch" | "background" | null;
+  queue_wait_s?: number | null;
+  queue_wait_by_class?: Record<
+    string,
+    { jobs: number; p50_s: number | null; p95_s: number | null; waiting: number }
+  > | null;
 }
 
 export interface InsightsOverview {
@@ -370,6 +376,7 @@ export interface StreakData {
 
 export type AnalysisProgressEvent =
   | { type: "start"; total: number }
+  | { type: "queued"; position: number }
   | {
       type: "progress";
       completed: number;
@@ -1189,6 +1196,8 @@ export interface AnonGameAnalysis {
     move_number: number;
     themes: string[];
   }[];
+  cache_key?: string | null;
+  pgn?: string | null;
 }
 
 export interface AnonAnalysisResults {
@@ -1203,7 +1212,9 @@ export interface AnonAnalysisResults {
 
 export type AnonProgressEvent =
   | { type: "start"; total: number }
+  | { type: "queued"; position: number }
   | { type: "progress"; completed: number; total: number; game_cpl: number }
+  | { type: "game_error"; game_index: number; message: string }
   | { type: "complete"; results: AnonAnalysisResults }
   | { type: "error"; message: string };
 
@@ -1213,7 +1224,7 @@ export type AnonProgressEvent =
  */
 export async function claimAnonymousResults(
   results: AnonAnalysisResults
-): Promise<{ imported: number; total_submitted: number }> {
+): Promise<{ imported: number; skipped: number; total_submitted: number }> {
   return fetchAPI("/anonymous/claim-results", {
     method: "POST",
     body: JSON.stringify({